@@ -0,0 +1,103 @@
+"""Micro-benchmark of the response decode paths used by App._request.
+
+Compares decoding a large list response from text vs. bytes with each
+available JSON decoder, and the cost of turning the result into Pydantic
+outputs, __slots__ records or passing the raw bytes through.
+
+    python benchmarks/bench_decode.py [--items 2000] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from inference import JSON_DECODERS, ChannelRecord, GetChannelOutput, MemberRecord  # noqa: E402
+
+
+def make_channels(count: int) -> list:
+    return [
+        {
+            "id": str(10**17 + i),
+            "guild_id": str(10**17),
+            "name": f"channel-{i}",
+            "type": i % 3,
+            "position": i,
+            "parent_id": str(10**17 + i // 50),
+            "topic": "A reasonably long channel topic " * 3,
+            "nsfw": False,
+            "rate_limit_per_user": 0,
+            "permission_overwrites": [
+                {"id": str(10**17 + j), "type": 0, "allow": "1024", "deny": "2048"} for j in range(4)
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def make_members(count: int) -> list:
+    return [
+        {
+            "user": {"id": str(10**17 + i), "username": f"user{i}", "avatar": None, "global_name": None},
+            "nick": None if i % 4 else f"nick{i}",
+            "roles": [str(10**17 + r) for r in range(i % 5)],
+            "joined_at": "2024-01-01T00:00:00.000000+00:00",
+            "deaf": False,
+            "mute": False,
+            "flags": 0,
+        }
+        for i in range(count)
+    ]
+
+
+def bench(name: str, func, repeat: int, size: int):
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print(f"  {name:<34} {best * 1000:9.3f} ms   {size / best / 1e6:8.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for label, payload, record in (
+        ("channels", make_channels(args.items), ChannelRecord),
+        ("members", make_members(args.items), MemberRecord),
+    ):
+        body = json.dumps(payload).encode()
+        size = len(body)
+        print(f"{label}: {args.items} items, {size / 1024:.0f} KiB")
+
+        bench("text + json.loads (baseline)", lambda: json.loads(body.decode()), args.repeat, size)
+        for name, decode in JSON_DECODERS.items():
+            bench(f"bytes + {name}", lambda decode=decode: decode(body), args.repeat, size)
+        bench("raw passthrough", lambda: body.decode(), args.repeat, size)
+
+        decoded = json.loads(body)
+        if label == "channels":
+            bench(
+                "Pydantic output per item",
+                lambda: [
+                    GetChannelOutput(
+                        id=c.get("id", ""),
+                        name=c.get("name", ""),
+                        type=c.get("type", 0),
+                        position=c.get("position"),
+                        topic=c.get("topic"),
+                        nsfw=c.get("nsfw"),
+                    )
+                    for c in decoded
+                ],
+                args.repeat,
+                size,
+            )
+        bench(f"{record.__name__} per item", lambda: [record.from_json(c) for c in decoded], args.repeat, size)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Offline load benchmark for inference.App against the Discord simulator.
+
+Measures throughput and p50/p99 latency for single calls, bulk operations
+and enumerations. Run with --json to save results and --compare to flag
+regressions against a saved run:
+
+    python benchmarks/bench_load.py --json bench.json
+    python benchmarks/bench_load.py --compare bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import inference  # noqa: E402
+from simulator import DiscordSimulator  # noqa: E402
+
+
+class Metadata:
+    def log(self, message: str):
+        pass
+
+
+class TimedApp(inference.App):
+    """App that records the latency and failures of every HTTP call."""
+
+    def __init__(self):
+        super().__init__()
+        self.latencies = []
+        self.errors = 0
+
+    async def _request(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super()._request(*args, **kwargs)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def make_app(simulator: DiscordSimulator) -> TimedApp:
+    os.environ["DISCORD_API_BASE"] = simulator.url
+    os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+    app = TimedApp()
+    await app.setup(Metadata())
+    return app
+
+
+async def scenario_get_channel(args, simulator, guild_id):
+    """Channel lookups with the cache bypassed; calls either reach the network
+    or join an identical GET already in flight."""
+    app = await make_app(simulator)
+    channels = [c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id]
+    calls = [inference.GetChannelInput(channel_id=channels[i % len(channels)]) for i in range(args.calls)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def call(input_data):
+        async with semaphore:
+            app.cache.invalidate("channel", input_data.channel_id)
+            await app.get_channel(input_data, Metadata())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(c) for c in calls), return_exceptions=True)
+    return app, len(calls), time.perf_counter() - started
+
+
+async def scenario_send_message(args, simulator, guild_id):
+    app = await make_app(simulator)
+    channels = [c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def call(i):
+        async with semaphore:
+            await app.send_message(
+                inference.SendMessageInput(channel_id=channels[i % len(channels)], content=f"bench {i}"), Metadata()
+            )
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(args.calls)), return_exceptions=True)
+    return app, args.calls, time.perf_counter() - started
+
+
+async def scenario_status_edits(args, simulator, guild_id):
+    """Rapid coalesced edits of one status message; most merge into the next
+    PATCH instead of queueing behind the channel's bucket."""
+    app = await make_app(simulator)
+    channel_id = next(c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id)
+    message_id = simulator.add_messages(channel_id, 1)[0]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def call(i):
+        async with semaphore:
+            await app.edit_message(
+                inference.EditMessageInput(
+                    channel_id=channel_id, message_id=message_id, content=f"progress {i}", coalesce=True
+                ),
+                Metadata(),
+            )
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(args.calls)), return_exceptions=True)
+    return app, args.calls, time.perf_counter() - started
+
+
+async def scenario_bulk_add_roles(args, simulator, guild_id):
+    app = await make_app(simulator)
+    members = list(simulator.members[guild_id])
+    roles = [r for r in simulator.roles[guild_id] if r != guild_id]
+    assignments = [
+        {"user_id": members[i % len(members)], "role_id": roles[i % len(roles)]} for i in range(args.calls)
+    ]
+    started = time.perf_counter()
+    await app.bulk_add_roles(
+        inference.BulkAddRolesInput(guild_id=guild_id, assignments=assignments, concurrency=args.concurrency),
+        Metadata(),
+    )
+    return app, len(assignments), time.perf_counter() - started
+
+
+async def scenario_iter_members(args, simulator, guild_id):
+    app = await make_app(simulator)
+    count = 0
+    started = time.perf_counter()
+    async for _ in app.iter_members(guild_id):
+        count += 1
+    return app, count, time.perf_counter() - started
+
+
+SCENARIOS = {
+    "get_channel": scenario_get_channel,
+    "send_message": scenario_send_message,
+    "status_edits": scenario_status_edits,
+    "bulk_add_roles": scenario_bulk_add_roles,
+    "iter_members": scenario_iter_members,
+}
+
+
+async def run(args) -> dict:
+    results = {}
+    for name in args.scenarios:
+        simulator = DiscordSimulator(
+            latency=args.latency,
+            jitter=args.jitter,
+            default_limit=(args.bucket_limit, args.bucket_window) if args.bucket_limit else None,
+            global_limit=args.global_limit or None,
+            error_rate=args.error_rate,
+        )
+        guild_id = simulator.add_guild(channels=20, roles=20, members=args.members)
+        await simulator.start()
+        try:
+            app, items, elapsed = await SCENARIOS[name](args, simulator, guild_id)
+            await app.unload()
+        finally:
+            await simulator.stop()
+        results[name] = {
+            "items": items,
+            "requests": simulator.requests,
+            "seconds": round(elapsed, 4),
+            "items_per_second": round(items / elapsed, 1) if elapsed else 0.0,
+            "requests_per_second": round(simulator.requests / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(app.latencies, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(app.latencies, 0.99) * 1000, 3),
+            "rate_limited": simulator.rate_limited,
+            "errors": app.errors,
+        }
+    return results
+
+
+def report(results: dict, baseline: dict = None, tolerance: float = 0.2) -> bool:
+    regressed = False
+    print(f"{'scenario':<16} {'items':>7} {'reqs':>7} {'items/s':>10} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'429s':>5} {'errors':>6}")
+    for name, r in results.items():
+        line = (f"{name:<16} {r['items']:>7} {r['requests']:>7} {r['items_per_second']:>10.1f} "
+                f"{r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['rate_limited']:>5} {r['errors']:>6}")
+        if baseline and name in baseline:
+            before = baseline[name]["items_per_second"]
+            change = (r["items_per_second"] - before) / before if before else 0.0
+            line += f"   {change:+.0%} vs baseline"
+            if change < -tolerance:
+                line += "  REGRESSION"
+                regressed = True
+        print(line)
+    return not regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.005, help="Simulated server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--bucket-limit", type=int, default=0, help="Per-bucket requests per window (0 disables)")
+    parser.add_argument("--bucket-window", type=float, default=1.0)
+    parser.add_argument("--global-limit", type=int, default=0, help="Global requests per second (0 disables)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Compare against results saved with --json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed throughput drop before failing")
+    args = parser.parse_args()
+
+    # Without a simulated global limit, lift the app's own so it does not
+    # dominate every scenario
+    TimedApp.GLOBAL_RATE_LIMIT = args.global_limit or 10**9
+
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    ok = report(results, baseline, args.tolerance)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
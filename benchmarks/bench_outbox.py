@@ -0,0 +1,93 @@
+"""Moderation latency during a message burst, inline vs. through the outbox.
+
+Starts an announcement burst against the Discord simulator, then bans a
+few users and reports how long the bans took with mutations sent inline
+and with the prioritized outbox:
+
+    python benchmarks/bench_outbox.py --messages 300 --bans 5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import inference  # noqa: E402
+from simulator import DiscordSimulator  # noqa: E402
+
+
+class Metadata:
+    def log(self, message: str):
+        pass
+
+
+async def run_once(args, outbox_path: str = None) -> dict:
+    simulator = DiscordSimulator(
+        latency=args.latency, global_limit=args.global_limit,
+        rate_limits={"POST /channels/{channel_id}/messages": (5, 1.0)},
+    )
+    guild_id = simulator.add_guild(channels=20, roles=2, members=args.bans)
+    channels = [c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id]
+    await simulator.start()
+    os.environ["DISCORD_API_BASE"] = simulator.url
+    os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+    if outbox_path:
+        os.environ["DISCORD_OUTBOX"] = outbox_path
+    app = inference.App()
+    try:
+        await app.setup(Metadata())
+        burst = [
+            asyncio.ensure_future(app.send_message(
+                inference.SendMessageInput(channel_id=channels[i % len(channels)], content=f"announcement {i}"),
+                Metadata(),
+            ))
+            for i in range(args.messages)
+        ]
+        await asyncio.sleep(args.ban_after)
+        started = time.perf_counter()
+
+        async def ban(user_id):
+            await app.ban_user(inference.BanUserInput(guild_id=guild_id, user_id=user_id), Metadata())
+            return time.perf_counter() - started
+
+        latencies = await asyncio.gather(*(ban(user_id) for user_id in list(simulator.members[guild_id])))
+        await asyncio.gather(*burst, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        await app.unload()
+    finally:
+        await simulator.stop()
+        os.environ.pop("DISCORD_OUTBOX", None)
+    return {
+        "mode": "outbox" if outbox_path else "inline",
+        "ban_max_ms": round(max(latencies) * 1000, 1),
+        "ban_mean_ms": round(sum(latencies) / len(latencies) * 1000, 1),
+        "burst_seconds": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--bans", type=int, default=5)
+    parser.add_argument("--ban-after", type=float, default=0.5, help="Seconds into the burst the bans start")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated server latency in seconds")
+    parser.add_argument("--global-limit", type=int, default=50, help="Global requests per second")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = [
+            asyncio.run(run_once(args)),
+            asyncio.run(run_once(args, os.path.join(directory, "outbox.db"))),
+        ]
+    print(f"{'mode':<8} {'ban max ms':>11} {'ban mean ms':>12} {'burst s':>8}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['ban_max_ms']:>11.1f} {r['ban_mean_ms']:>12.1f} {r['burst_seconds']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
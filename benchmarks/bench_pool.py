@@ -0,0 +1,90 @@
+"""Throughput benchmark for pool mode (one worker process per bot token).
+
+Sends messages across several guilds with 1, 2 and 4 tokens against the
+Discord simulator, whose global limit applies per token, and reports
+messages per second for each pool size:
+
+    python benchmarks/bench_pool.py --guilds 32 --calls 600 --global-limit 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import inference  # noqa: E402
+from simulator import DiscordSimulator  # noqa: E402
+
+
+class Metadata:
+    def log(self, message: str):
+        pass
+
+
+async def run_once(args, workers: int) -> dict:
+    simulator = DiscordSimulator(latency=args.latency, jitter=args.jitter, global_limit=args.global_limit)
+    guild_ids = [simulator.add_guild(name=f"Guild {i}", channels=2, roles=2, members=10) for i in range(args.guilds)]
+    channels = [c for c in simulator.channels if simulator.channels[c]["guild_id"] in guild_ids]
+    await simulator.start()
+    os.environ["DISCORD_API_BASE"] = simulator.url
+    os.environ.pop("DISCORD_BOT_TOKEN", None)
+    os.environ["DISCORD_BOT_TOKENS"] = ",".join(f"bench-token-{i}" for i in range(workers))
+    os.environ.setdefault("DISCORD_WEBHOOK_VAULT_KEY", "benchmark")
+    app = inference.App()
+    try:
+        await app.setup(Metadata())
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def call(i):
+            async with semaphore:
+                await app.send_message(
+                    inference.SendMessageInput(channel_id=channels[i % len(channels)], content=f"bench {i}"),
+                    Metadata(),
+                )
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(call(i) for i in range(args.calls)), return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        await app.unload()
+    finally:
+        await simulator.stop()
+        os.environ.pop("DISCORD_BOT_TOKENS", None)
+    return {
+        "workers": workers,
+        "calls": args.calls,
+        "seconds": round(elapsed, 4),
+        "calls_per_second": round(args.calls / elapsed, 1) if elapsed else 0.0,
+        "rate_limited": simulator.rate_limited,
+        "errors": sum(isinstance(outcome, Exception) for outcome in outcomes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--guilds", type=int, default=32)
+    parser.add_argument("--calls", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005, help="Simulated server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--global-limit", type=int, default=50, help="Global requests per second per token")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = [asyncio.run(run_once(args, workers)) for workers in args.workers]
+    print(f"{'workers':>7} {'calls':>6} {'seconds':>8} {'calls/s':>9} {'429s':>5} {'errors':>6}")
+    for r in results:
+        print(f"{r['workers']:>7} {r['calls']:>6} {r['seconds']:>8.3f} {r['calls_per_second']:>9.1f} "
+              f"{r['rate_limited']:>5} {r['errors']:>6}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
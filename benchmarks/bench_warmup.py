@@ -0,0 +1,103 @@
+"""Cold-start benchmark for the persistent disk cache.
+
+Runs a fresh App twice against the Discord simulator, first with an empty
+disk cache and then warmed from the file the first run left behind, and
+reports setup time and the latency of the first lookups:
+
+    python benchmarks/bench_warmup.py --channels 200 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import inference  # noqa: E402
+from simulator import DiscordSimulator  # noqa: E402
+
+
+class Metadata:
+    def log(self, message: str):
+        pass
+
+
+async def first_calls(app: inference.App, guild_id: str, channel_ids: list) -> dict:
+    """Time the first lookups an agent typically makes, in milliseconds."""
+    timings = {}
+    calls = {
+        "get_guild": lambda: app.get_guild(inference.GetGuildInput(guild_id=guild_id), Metadata()),
+        "list_channels": lambda: app.list_channels(inference.ListChannelsInput(guild_id=guild_id), Metadata()),
+        "list_roles": lambda: app.list_roles(inference.ListRolesInput(guild_id=guild_id), Metadata()),
+        "get_channel": lambda: app.get_channel(inference.GetChannelInput(channel_id=channel_ids[-1]), Metadata()),
+    }
+    for name, call in calls.items():
+        started = time.perf_counter()
+        await call()
+        timings[name] = round((time.perf_counter() - started) * 1000, 3)
+    return timings
+
+
+async def run_once(simulator: DiscordSimulator, guild_id: str, channel_ids: list) -> dict:
+    app = inference.App()
+    started = time.perf_counter()
+    await app.setup(Metadata())
+    setup_ms = round((time.perf_counter() - started) * 1000, 3)
+    before = simulator.requests
+    timings = await first_calls(app, guild_id, channel_ids)
+    result = {
+        "setup_ms": setup_ms,
+        "warmed_entries": app.disk_cache.loaded if app.disk_cache else 0,
+        "requests": simulator.requests - before,
+        **timings,
+    }
+    await app.unload()
+    return result
+
+
+async def run(args) -> dict:
+    simulator = DiscordSimulator(latency=args.latency)
+    guild_id = simulator.add_guild(channels=args.channels, roles=args.roles, members=10)
+    channel_ids = [c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id]
+    await simulator.start()
+    os.environ["DISCORD_API_BASE"] = simulator.url
+    os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            os.environ.pop("DISCORD_DISK_CACHE", None)
+            results["no_disk_cache"] = await run_once(simulator, guild_id, channel_ids)
+            os.environ["DISCORD_DISK_CACHE"] = os.path.join(directory, "cache.db")
+            results["cold"] = await run_once(simulator, guild_id, channel_ids)
+            results["warm"] = await run_once(simulator, guild_id, channel_ids)
+        finally:
+            os.environ.pop("DISCORD_DISK_CACHE", None)
+            await simulator.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=200)
+    parser.add_argument("--roles", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated server latency in seconds")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    columns = list(next(iter(results.values())))
+    print(f"{'run':<14}" + "".join(f"{c:>15}" for c in columns))
+    for name, r in results.items():
+        print(f"{name:<14}" + "".join(f"{r[c]:>15}" for c in columns))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
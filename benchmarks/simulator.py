@@ -0,0 +1,748 @@
+"""In-process fake of the Discord REST endpoints used by inference.App.
+
+Keeps guild/channel/role/member/ban/message/webhook state in memory and
+can add latency, enforce per-bucket and global rate limits with real
+X-RateLimit-* headers, and inject 5xx errors or dropped connections.
+A ``/gateway`` WebSocket speaks enough of the Gateway protocol (identify,
+resume, heartbeats, zlib-stream) to dispatch the simulator's own changes
+and replay recorded event streams.
+
+    python benchmarks/simulator.py --port 8080 --members 10000
+    DISCORD_API_BASE=http://127.0.0.1:8080 DISCORD_BOT_TOKEN=x ...
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import zlib
+from urllib.parse import unquote
+
+from aiohttp import web
+
+DISCORD_EPOCH_MS = 1420070400000
+BULK_DELETE_MAX_AGE = 14 * 24 * 3600
+
+
+class Snowflakes:
+    """Monotonic snowflake generator; backdated IDs keep their timestamp."""
+
+    def __init__(self):
+        self._last = 0
+        self._sequence = 0
+
+    def next(self, at: float = None) -> str:
+        if at is not None:
+            # e.g. old messages: the low bits keep them unique
+            self._sequence = (self._sequence + 1) & 0x3FFFFF
+            return str((int(at * 1000) - DISCORD_EPOCH_MS) << 22 | self._sequence)
+        value = int(time.time() * 1000 - DISCORD_EPOCH_MS) << 22
+        self._last = max(value, self._last + 1)
+        return str(self._last)
+
+
+class BucketLimit:
+    __slots__ = ("remaining", "reset_at")
+
+    def __init__(self, limit: int, window: float):
+        self.remaining = limit
+        self.reset_at = time.monotonic() + window
+
+
+class GatewaySession:
+    """A Gateway session; outlives its connection so it can be resumed."""
+
+    BACKLOG = 1000
+
+    def __init__(self, session_id: str, intents: int):
+        self.id = session_id
+        self.intents = intents
+        self.seq = 0
+        self.backlog = []
+        self.ws = None
+        self.send = None
+
+    async def dispatch(self, event: str, data: dict):
+        self.seq += 1
+        payload = {"op": 0, "t": event, "s": self.seq, "d": data}
+        self.backlog = self.backlog[-self.BACKLOG + 1:] + [payload]
+        if self.send is not None:
+            try:
+                await self.send(payload)
+            except ConnectionResetError:
+                self.send = None
+
+
+class DiscordSimulator:
+    """Stateful Discord REST fake.
+
+    ``latency`` and ``jitter`` are seconds added to every response.
+    ``rate_limits`` maps route templates (``"POST /channels/{channel_id}/messages"``)
+    to ``(limit, window)``; routes not listed use ``default_limit``, and
+    ``None`` disables bucket limits entirely. ``global_limit`` requests per
+    second are allowed per token. ``error_rate`` and ``reset_rate`` are the
+    fractions of requests answered with a 500 or a dropped connection.
+    ``gateway_events`` are ``{"t": ..., "d": ...}`` dispatches replayed to
+    every new Gateway session after its READY and GUILD_CREATEs;
+    ``gateway_frame_size`` splits each zlib-stream message into WebSocket
+    frames of at most that many bytes.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limits: dict = None,
+        default_limit: tuple = None,
+        global_limit: int = None,
+        error_rate: float = 0.0,
+        reset_rate: float = 0.0,
+        seed: int = 0,
+        gateway_events: list = None,
+        heartbeat_interval: float = 41.25,
+        gateway_frame_size: int = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limits = rate_limits or {}
+        self.default_limit = default_limit
+        self.global_limit = global_limit
+        self.error_rate = error_rate
+        self.reset_rate = reset_rate
+        self.random = random.Random(seed)
+        self.ids = Snowflakes()
+        # The user behind every token; add it to a guild with add_member(user=...)
+        self.bot_user = {"id": self.ids.next(), "username": "simulator-bot", "bot": True}
+
+        self.guilds = {}
+        self.channels = {}
+        self.roles = {}  # guild_id -> {role_id: role}
+        self.members = {}  # guild_id -> {user_id: member}
+        self.bans = {}  # guild_id -> {user_id: ban}
+        self.messages = {}  # channel_id -> {message_id: message}
+        self.webhooks = {}
+        self.audit_log = []  # (action, guild_id, target_id, reason)
+        self.gateway_events = list(gateway_events or [])
+        self.heartbeat_interval = heartbeat_interval
+        self.gateway_frame_size = gateway_frame_size
+        self.gateway_sessions = {}
+        self.gateway_connections = 0
+
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors_injected = 0
+        self.route_counts = {}
+        self.token_routes = {}  # Authorization header -> {(route, major): requests}
+        self.scripted = {}  # route -> [(status, body, headers)] answered before anything else
+        self._buckets = {}
+        self._global = {}
+
+        self.runner = None
+        self.url = None
+        self.gateway_url = None
+
+    # ------------------------------------------------------------------
+    # Fixtures
+    # ------------------------------------------------------------------
+
+    def add_guild(self, name: str = "Guild", channels: int = 10, roles: int = 10, members: int = 100) -> str:
+        guild_id = self.ids.next()
+        self.guilds[guild_id] = {"id": guild_id, "name": name, "owner_id": "0", "icon": None,
+                                 "banner": None, "description": None}
+        self.roles[guild_id] = {guild_id: self._role(guild_id, "@everyone", 0, guild_id)}
+        self.members[guild_id] = {}
+        self.bans[guild_id] = {}
+        for i in range(roles):
+            role_id = self.ids.next()
+            self.roles[guild_id][role_id] = self._role(role_id, f"role-{i}", i + 1, guild_id)
+        for i in range(channels):
+            self._create_channel(guild_id, {"name": f"channel-{i}", "type": 0})
+        role_ids = [r for r in self.roles[guild_id] if r != guild_id]
+        for i in range(members):
+            self.add_member(guild_id, roles=role_ids[: i % 3], username=f"user{i}")
+        return guild_id
+
+    def add_member(self, guild_id: str, roles: list = (), username: str = None, user: dict = None) -> str:
+        user_id = user["id"] if user else self.ids.next()
+        self.members[guild_id][user_id] = {
+            "user": user or {"id": user_id, "username": username or f"user{user_id[-6:]}"},
+            "nick": None,
+            "roles": list(roles),
+            "joined_at": time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime()),
+        }
+        return user_id
+
+    def add_messages(self, channel_id: str, count: int, age: float = 0.0) -> list:
+        ids = []
+        start = time.time() - age
+        for i in range(count):
+            message_id = self.ids.next(start + i * 0.001)
+            self.messages[channel_id][message_id] = {
+                "id": message_id, "channel_id": channel_id, "content": f"message {i}",
+                "author": {"id": "1" * 18},
+            }
+            ids.append(message_id)
+        return ids
+
+    def script(self, route: str, status: int, body: dict = None, headers: dict = None, count: int = 1):
+        """Answer the next ``count`` requests on ``route`` with this response,
+        ahead of rate limits and handlers."""
+        self.scripted.setdefault(route, []).extend([(status, body or {}, headers or {})] * count)
+
+    def script_rate_limit(self, route: str, retry_after: float, scope: str = "user", count: int = 1):
+        """Answer the next ``count`` requests on ``route`` with a 429 of ``scope``:
+        ``"user"`` (the route's own bucket, with bucket headers), ``"shared"`` or ``"global"``."""
+        headers = {"Retry-After": f"{retry_after:.3f}", "X-RateLimit-Scope": scope}
+        if scope == "global":
+            headers["X-RateLimit-Global"] = "true"
+        elif scope == "user":
+            headers.update({"X-RateLimit-Limit": "5", "X-RateLimit-Remaining": "0",
+                            "X-RateLimit-Reset-After": f"{retry_after:.3f}",
+                            "X-RateLimit-Bucket": hashlib.md5(route.encode()).hexdigest()[:16]})
+        body = {"message": "You are being rate limited.", "retry_after": retry_after, "global": scope == "global"}
+        self.script(route, 429, body, headers, count)
+
+    def _role(self, role_id, name, position, guild_id, permissions="0", color=0):
+        return {"id": role_id, "name": name, "position": position, "permissions": permissions,
+                "color": color, "managed": False, "guild_id": guild_id}
+
+    def _create_channel(self, guild_id, body):
+        channel_id = self.ids.next()
+        position = body.get("position")
+        if position is None:
+            position = len([c for c in self.channels.values() if c.get("guild_id") == guild_id])
+        channel = {"id": channel_id, "guild_id": guild_id, "name": body["name"], "type": body.get("type", 0),
+                   "position": position, "parent_id": body.get("parent_id"), "topic": body.get("topic"),
+                   "nsfw": body.get("nsfw", False), "rate_limit_per_user": body.get("rate_limit_per_user", 0),
+                   "permission_overwrites": body.get("permission_overwrites", [])}
+        self.channels[channel_id] = channel
+        self.messages[channel_id] = {}
+        return channel
+
+    # ------------------------------------------------------------------
+    # Server
+    # ------------------------------------------------------------------
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        r = app.router
+        r.add_get("/guilds/{guild_id}", self.get_guild)
+        r.add_get("/guilds/{guild_id}/channels", self.list_channels)
+        r.add_post("/guilds/{guild_id}/channels", self.create_channel)
+        r.add_patch("/guilds/{guild_id}/channels", self.move_channels)
+        r.add_get("/guilds/{guild_id}/roles", self.list_roles)
+        r.add_post("/guilds/{guild_id}/roles", self.create_role)
+        r.add_patch("/guilds/{guild_id}/roles", self.move_roles)
+        r.add_patch("/guilds/{guild_id}/roles/{role_id}", self.modify_role)
+        r.add_delete("/guilds/{guild_id}/roles/{role_id}", self.delete_role)
+        r.add_get("/guilds/{guild_id}/members", self.list_members)
+        r.add_get("/guilds/{guild_id}/members/{user_id}", self.get_member)
+        r.add_patch("/guilds/{guild_id}/members/{user_id}", self.modify_member)
+        r.add_delete("/guilds/{guild_id}/members/{user_id}", self.kick_member)
+        r.add_put("/guilds/{guild_id}/members/{user_id}/roles/{role_id}", self.add_member_role)
+        r.add_delete("/guilds/{guild_id}/members/{user_id}/roles/{role_id}", self.remove_member_role)
+        r.add_get("/guilds/{guild_id}/bans", self.list_bans)
+        r.add_put("/guilds/{guild_id}/bans/{user_id}", self.ban)
+        r.add_post("/guilds/{guild_id}/bulk-ban", self.bulk_ban)
+        r.add_delete("/guilds/{guild_id}/bans/{user_id}", self.unban)
+        r.add_get("/channels/{channel_id}", self.get_channel)
+        r.add_patch("/channels/{channel_id}", self.modify_channel)
+        r.add_delete("/channels/{channel_id}", self.delete_channel)
+        r.add_get("/channels/{channel_id}/messages", self.list_messages)
+        r.add_post("/channels/{channel_id}/messages", self.create_message)
+        r.add_post("/channels/{channel_id}/messages/bulk-delete", self.bulk_delete)
+        r.add_patch("/channels/{channel_id}/messages/{message_id}", self.edit_message)
+        r.add_delete("/channels/{channel_id}/messages/{message_id}", self.delete_message)
+        r.add_post("/channels/{channel_id}/webhooks", self.create_webhook)
+        r.add_post("/webhooks/{webhook_id}/{token}", self.execute_webhook)
+        r.add_get("/users/@me", self.get_current_user)
+        r.add_get("/gateway/bot", self.get_gateway)
+        r.add_get("/gateway", self.gateway)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.runner = web.AppRunner(self.make_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        self.gateway_url = f"ws://{host}:{port}/gateway"
+        return self.url
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    @staticmethod
+    def route_of(request: web.Request) -> tuple:
+        """Route template and major parameter, mirroring inference.route_key."""
+        resource = request.match_info.route.resource
+        template = resource.canonical if resource else request.path
+        info = request.match_info
+        major = info.get("channel_id") or info.get("guild_id") or info.get("webhook_id") or ""
+        return f"{request.method} {template}", major
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.requests += 1
+        route, major = self.route_of(request)
+        self.route_counts[route] = self.route_counts.get(route, 0) + 1
+        token = request.headers.get("Authorization", "")
+        routes = self.token_routes.setdefault(token, {})
+        routes[route, major] = routes.get((route, major), 0) + 1
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.random.random() * self.jitter)
+
+        if self.reset_rate and self.random.random() < self.reset_rate:
+            self.errors_injected += 1
+            request.transport.close()
+            raise web.HTTPInternalServerError()
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors_injected += 1
+            return web.json_response({"message": "Internal Server Error", "code": 0}, status=500)
+
+        scripted = self.scripted.get(route)
+        if scripted:
+            status, body, headers = scripted.pop(0)
+            if status == 429:
+                self.rate_limited += 1
+            return web.json_response(body, status=status, headers=headers)
+
+        now = time.monotonic()
+        if self.global_limit and token and not route.startswith("POST /webhooks"):
+            window_end, count = self._global.get(token, (0.0, 0))
+            if now >= window_end:
+                window_end, count = now + 1.0, 0
+            if count >= self.global_limit:
+                self.rate_limited += 1
+                return web.json_response(
+                    {"message": "You are being rate limited.", "retry_after": window_end - now, "global": True},
+                    status=429, headers={"X-RateLimit-Global": "true", "X-RateLimit-Scope": "global",
+                                         "Retry-After": f"{window_end - now:.3f}"})
+            self._global[token] = (window_end, count + 1)
+
+        limit = self.rate_limits.get(route, self.default_limit)
+        headers = {}
+        if limit:
+            per, window = limit
+            bucket_hash = hashlib.md5(route.encode()).hexdigest()[:16]
+            key = (token, bucket_hash, major)
+            bucket = self._buckets.get(key)
+            if bucket is None or now >= bucket.reset_at:
+                bucket = self._buckets[key] = BucketLimit(per, window)
+            reset_after = f"{bucket.reset_at - now:.3f}"
+            if bucket.remaining <= 0:
+                self.rate_limited += 1
+                return web.json_response(
+                    {"message": "You are being rate limited.", "retry_after": bucket.reset_at - now, "global": False},
+                    status=429, headers={"X-RateLimit-Limit": str(per), "X-RateLimit-Remaining": "0",
+                                         "X-RateLimit-Reset-After": reset_after, "X-RateLimit-Bucket": bucket_hash,
+                                         "X-RateLimit-Scope": "user"})
+            bucket.remaining -= 1
+            headers = {"X-RateLimit-Limit": str(per), "X-RateLimit-Remaining": str(bucket.remaining),
+                       "X-RateLimit-Reset-After": reset_after, "X-RateLimit-Bucket": bucket_hash}
+
+        response = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    # ------------------------------------------------------------------
+    # Gateway
+    # ------------------------------------------------------------------
+
+    def load_gateway_events(self, path: str):
+        """Append recorded dispatches from an NDJSON file (one ``{"t", "d"}`` per line)."""
+        with open(path) as f:
+            self.gateway_events.extend(json.loads(line) for line in f if line.strip())
+
+    async def dispatch(self, event: str, data: dict, intent: int = 1):
+        """Send an event to every session that requested ``intent``."""
+        for session in self.gateway_sessions.values():
+            if session.intents & intent:
+                await session.dispatch(event, data)
+
+    async def drop_gateway(self, code: int = 4000):
+        """Close every Gateway connection, keeping the sessions resumable."""
+        for session in self.gateway_sessions.values():
+            if session.ws is not None:
+                await session.ws.close(code=code)
+
+    def _guild_create(self, guild_id: str, intents: int) -> dict:
+        members = self.members[guild_id]
+        if intents & 2:
+            listed = list(members.values())
+        else:
+            # Like Discord, the bot's own member is sent without the members intent
+            listed = [members[self.bot_user["id"]]] if self.bot_user["id"] in members else []
+        return {
+            **self.guilds[guild_id],
+            "member_count": len(members),
+            "channels": [c for c in self.channels.values() if c.get("guild_id") == guild_id],
+            "roles": list(self.roles[guild_id].values()),
+            "members": listed,
+        }
+
+    async def get_gateway(self, request):
+        return web.json_response({"url": self.gateway_url, "shards": 1, "session_start_limit": {
+            "total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 1}})
+
+    async def gateway(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.gateway_connections += 1
+        compressor = zlib.compressobj() if request.query.get("compress") == "zlib-stream" else None
+
+        async def send(payload):
+            data = json.dumps(payload).encode()
+            if compressor is None:
+                await ws.send_str(data.decode())
+            else:
+                data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                size = self.gateway_frame_size or len(data)
+                for start in range(0, len(data), size):
+                    await ws.send_bytes(data[start:start + size])
+
+        session = None
+        await send({"op": 10, "d": {"heartbeat_interval": int(self.heartbeat_interval * 1000)}})
+        async for message in ws:
+            if message.type != web.WSMsgType.TEXT:
+                break
+            payload = json.loads(message.data)
+            op, data = payload.get("op"), payload.get("d")
+            if op == 1:
+                await send({"op": 11})
+            elif op == 2:
+                session = GatewaySession(self.ids.next(), data.get("intents", 0))
+                session.ws, session.send = ws, send
+                self.gateway_sessions[session.id] = session
+                await session.dispatch("READY", {
+                    "v": 10, "session_id": session.id, "resume_gateway_url": self.gateway_url,
+                    "user": {"id": "0", "username": "simulator", "bot": True},
+                    "guilds": [{"id": g, "unavailable": True} for g in self.guilds],
+                })
+                for guild_id in self.guilds:
+                    await session.dispatch("GUILD_CREATE", self._guild_create(guild_id, session.intents))
+                for event in self.gateway_events:
+                    await session.dispatch(event["t"], event["d"])
+            elif op == 6:
+                session = self.gateway_sessions.get(data.get("session_id"))
+                if session is None:
+                    await send({"op": 9, "d": False})
+                    continue
+                session.ws, session.send = ws, send
+                for missed in session.backlog:
+                    if missed["s"] > (data.get("seq") or 0):
+                        await send(missed)
+                await session.dispatch("RESUMED", {})
+        if session is not None and session.ws is ws:
+            session.ws = session.send = None
+        return ws
+
+    # ------------------------------------------------------------------
+    # Handlers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _not_found(what: str, code: int):
+        return web.json_response({"message": f"Unknown {what}", "code": code}, status=404)
+
+    @staticmethod
+    def _page(items: list, request: web.Request, key, max_limit: int, ascending: bool = False) -> list:
+        """Cursor pagination; member and ban lists page forwards from 0 by default."""
+        limit = min(int(request.query.get("limit", 50)), max_limit)
+        if "after" in request.query or ascending:
+            after = int(request.query.get("after", 0))
+            items = [i for i in items if int(key(i)) > after]
+            return sorted(items, key=lambda i: int(key(i)))[:limit]
+        items = sorted(items, key=lambda i: int(key(i)), reverse=True)
+        if "before" in request.query:
+            before = int(request.query["before"])
+            items = [i for i in items if int(key(i)) < before]
+        return items[:limit]
+
+    async def get_current_user(self, request):
+        return web.json_response(self.bot_user)
+
+    async def get_guild(self, request):
+        guild = self.guilds.get(request.match_info["guild_id"])
+        if guild is None:
+            return self._not_found("Guild", 10004)
+        return web.json_response({**guild, "approximate_member_count": len(self.members[guild["id"]])})
+
+    async def list_channels(self, request):
+        guild_id = request.match_info["guild_id"]
+        return web.json_response([c for c in self.channels.values() if c.get("guild_id") == guild_id])
+
+    async def create_channel(self, request):
+        guild_id = request.match_info["guild_id"]
+        if guild_id not in self.guilds:
+            return self._not_found("Guild", 10004)
+        channel = self._create_channel(guild_id, await request.json())
+        await self.dispatch("CHANNEL_CREATE", channel)
+        return web.json_response(channel, status=201)
+
+    async def get_channel(self, request):
+        channel = self.channels.get(request.match_info["channel_id"])
+        if channel is None:
+            return self._not_found("Channel", 10003)
+        return web.json_response(channel)
+
+    async def list_roles(self, request):
+        return web.json_response(list(self.roles.get(request.match_info["guild_id"], {}).values()))
+
+    async def create_role(self, request):
+        guild_id = request.match_info["guild_id"]
+        body = await request.json()
+        role_id = self.ids.next()
+        role = self._role(role_id, body.get("name", "new role"), len(self.roles[guild_id]), guild_id,
+                          str(body.get("permissions") or "0"), body.get("color") or 0)
+        role.update(hoist=bool(body.get("hoist")), mentionable=bool(body.get("mentionable")))
+        self.roles[guild_id][role_id] = role
+        await self.dispatch("GUILD_ROLE_CREATE", {"guild_id": guild_id, "role": role})
+        return web.json_response(role)
+
+    async def modify_role(self, request):
+        guild_id = request.match_info["guild_id"]
+        role = self.roles.get(guild_id, {}).get(request.match_info["role_id"])
+        if role is None:
+            return self._not_found("Role", 10011)
+        role.update(await request.json())
+        await self.dispatch("GUILD_ROLE_UPDATE", {"guild_id": guild_id, "role": role})
+        return web.json_response(role)
+
+    async def delete_role(self, request):
+        guild_id, role_id = request.match_info["guild_id"], request.match_info["role_id"]
+        if role_id == guild_id or self.roles.get(guild_id, {}).pop(role_id, None) is None:
+            return self._not_found("Role", 10011)
+        for member in self.members[guild_id].values():
+            member["roles"] = [r for r in member["roles"] if r != role_id]
+        await self.dispatch("GUILD_ROLE_DELETE", {"guild_id": guild_id, "role_id": role_id})
+        return web.Response(status=204)
+
+    async def move_roles(self, request):
+        guild_id = request.match_info["guild_id"]
+        roles = self.roles.get(guild_id, {})
+        for move in await request.json():
+            if move["id"] not in roles:
+                return self._not_found("Role", 10011)
+            roles[move["id"]]["position"] = move["position"]
+            await self.dispatch("GUILD_ROLE_UPDATE", {"guild_id": guild_id, "role": roles[move["id"]]})
+        return web.json_response(list(roles.values()))
+
+    async def modify_channel(self, request):
+        channel = self.channels.get(request.match_info["channel_id"])
+        if channel is None:
+            return self._not_found("Channel", 10003)
+        channel.update(await request.json())
+        await self.dispatch("CHANNEL_UPDATE", channel)
+        return web.json_response(channel)
+
+    async def delete_channel(self, request):
+        channel = self.channels.pop(request.match_info["channel_id"], None)
+        if channel is None:
+            return self._not_found("Channel", 10003)
+        self.messages.pop(channel["id"], None)
+        await self.dispatch("CHANNEL_DELETE", channel)
+        return web.json_response(channel)
+
+    async def move_channels(self, request):
+        for move in await request.json():
+            channel = self.channels.get(move["id"])
+            if channel is None or channel.get("guild_id") != request.match_info["guild_id"]:
+                return self._not_found("Channel", 10003)
+            channel["position"] = move["position"]
+            if "parent_id" in move:
+                channel["parent_id"] = move["parent_id"]
+            await self.dispatch("CHANNEL_UPDATE", channel)
+        return web.Response(status=204)
+
+    def _member(self, request):
+        return self.members.get(request.match_info["guild_id"], {}).get(request.match_info["user_id"])
+
+    async def _member_updated(self, request, member):
+        await self.dispatch("GUILD_MEMBER_UPDATE", {**member, "guild_id": request.match_info["guild_id"]}, intent=2)
+
+    async def list_members(self, request):
+        members = list(self.members.get(request.match_info["guild_id"], {}).values())
+        return web.json_response(self._page(members, request, lambda m: m["user"]["id"], 1000, ascending=True))
+
+    async def get_member(self, request):
+        member = self._member(request)
+        return web.json_response(member) if member else self._not_found("Member", 10007)
+
+    async def modify_member(self, request):
+        member = self._member(request)
+        if member is None:
+            return self._not_found("Member", 10007)
+        member.update(await request.json())
+        await self._member_updated(request, member)
+        return web.json_response(member)
+
+    async def kick_member(self, request):
+        guild_id = request.match_info["guild_id"]
+        member = self.members.get(guild_id, {}).pop(request.match_info["user_id"], None)
+        if member is None:
+            return self._not_found("Member", 10007)
+        self._audit(request, "kick", request.match_info["user_id"])
+        await self.dispatch("GUILD_MEMBER_REMOVE", {"guild_id": guild_id, "user": member["user"]}, intent=2)
+        return web.Response(status=204)
+
+    async def add_member_role(self, request):
+        member = self._member(request)
+        if member is None:
+            return self._not_found("Member", 10007)
+        if request.match_info["role_id"] not in self.roles[request.match_info["guild_id"]]:
+            return self._not_found("Role", 10011)
+        if request.match_info["role_id"] not in member["roles"]:
+            member["roles"].append(request.match_info["role_id"])
+            await self._member_updated(request, member)
+        return web.Response(status=204)
+
+    async def remove_member_role(self, request):
+        member = self._member(request)
+        if member is None:
+            return self._not_found("Member", 10007)
+        role_id = request.match_info["role_id"]
+        member["roles"] = [r for r in member["roles"] if r != role_id]
+        await self._member_updated(request, member)
+        return web.Response(status=204)
+
+    async def list_bans(self, request):
+        bans = list(self.bans.get(request.match_info["guild_id"], {}).values())
+        return web.json_response(self._page(bans, request, lambda b: b["user"]["id"], 1000, ascending=True))
+
+    def _audit(self, request, action: str, target_id: str) -> str:
+        reason = request.headers.get("X-Audit-Log-Reason")
+        reason = unquote(reason) if reason else None
+        self.audit_log.append((action, request.match_info["guild_id"], target_id, reason))
+        return reason
+
+    async def _ban(self, request, guild_id: str, user_id: str):
+        if self.members.get(guild_id, {}).pop(user_id, None) is not None:
+            await self.dispatch("GUILD_MEMBER_REMOVE", {"guild_id": guild_id, "user": {"id": user_id}}, intent=2)
+        self.bans[guild_id][user_id] = {"user": {"id": user_id}, "reason": self._audit(request, "ban", user_id)}
+
+    async def ban(self, request):
+        guild_id, user_id = request.match_info["guild_id"], request.match_info["user_id"]
+        await self._ban(request, guild_id, user_id)
+        return web.Response(status=204)
+
+    async def bulk_ban(self, request):
+        guild_id = request.match_info["guild_id"]
+        if guild_id not in self.guilds:
+            return self._not_found("Guild", 10004)
+        body = await request.json()
+        user_ids = body.get("user_ids", [])
+        if not 1 <= len(user_ids) <= 200 or not 0 <= body.get("delete_message_seconds", 0) <= 604800:
+            return web.json_response({"message": "Invalid Form Body", "code": 50035}, status=400)
+        banned, failed = [], []
+        for user_id in user_ids:
+            if user_id in self.bans[guild_id]:
+                failed.append(user_id)
+            else:
+                await self._ban(request, guild_id, user_id)
+                banned.append(user_id)
+        if not banned:
+            return web.json_response({"message": "Failed to ban users", "code": 500000}, status=400)
+        return web.json_response({"banned_users": banned, "failed_users": failed})
+
+    async def unban(self, request):
+        ban = self.bans.get(request.match_info["guild_id"], {}).pop(request.match_info["user_id"], None)
+        return web.Response(status=204) if ban else self._not_found("Ban", 10026)
+
+    async def list_messages(self, request):
+        messages = self.messages.get(request.match_info["channel_id"])
+        if messages is None:
+            return self._not_found("Channel", 10003)
+        page = self._page(list(messages.values()), request, lambda m: m["id"], 100)
+        if "after" in request.query:
+            page.reverse()  # Discord returns newest first either way
+        return web.json_response(page)
+
+    async def create_message(self, request):
+        channel_id = request.match_info["channel_id"]
+        if channel_id not in self.messages:
+            return self._not_found("Channel", 10003)
+        body = await request.json()
+        message_id = self.ids.next()
+        message = {"id": message_id, "channel_id": channel_id, "content": body.get("content", ""),
+                   "author": {"id": "0"}}
+        self.messages[channel_id][message_id] = message
+        return web.json_response(message)
+
+    async def edit_message(self, request):
+        message = self.messages.get(request.match_info["channel_id"], {}).get(request.match_info["message_id"])
+        if message is None:
+            return self._not_found("Message", 10008)
+        message.update(await request.json())
+        return web.json_response(message)
+
+    async def delete_message(self, request):
+        message = self.messages.get(request.match_info["channel_id"], {}).pop(request.match_info["message_id"], None)
+        return web.Response(status=204) if message else self._not_found("Message", 10008)
+
+    async def bulk_delete(self, request):
+        channel = self.messages.get(request.match_info["channel_id"])
+        if channel is None:
+            return self._not_found("Channel", 10003)
+        ids = (await request.json()).get("messages", [])
+        if not 2 <= len(ids) <= 100:
+            return web.json_response({"message": "Invalid Form Body", "code": 50035}, status=400)
+        cutoff = time.time() - BULK_DELETE_MAX_AGE
+        for message_id in ids:
+            if ((int(message_id) >> 22) + DISCORD_EPOCH_MS) / 1000 < cutoff:
+                return web.json_response({"message": "You can only bulk delete messages that are under 14 days old.",
+                                          "code": 50034}, status=400)
+        for message_id in ids:
+            channel.pop(message_id, None)
+        return web.Response(status=204)
+
+    async def create_webhook(self, request):
+        channel_id = request.match_info["channel_id"]
+        body = await request.json()
+        webhook_id = self.ids.next()
+        webhook = {"id": webhook_id, "channel_id": channel_id, "name": body.get("name"),
+                   "token": hashlib.sha256(webhook_id.encode()).hexdigest()}
+        self.webhooks[webhook_id] = webhook
+        return web.json_response(webhook)
+
+    async def execute_webhook(self, request):
+        webhook = self.webhooks.get(request.match_info["webhook_id"])
+        if webhook is None or webhook["token"] != request.match_info["token"]:
+            return self._not_found("Webhook", 10015)
+        body = await request.json()
+        message_id = self.ids.next()
+        self.messages.setdefault(webhook["channel_id"], {})[message_id] = {
+            "id": message_id, "channel_id": webhook["channel_id"], "content": body.get("content", ""),
+            "author": {"id": webhook["id"]}, "webhook_id": webhook["id"],
+        }
+        if request.query.get("wait") == "true":
+            return web.json_response(self.messages[webhook["channel_id"]][message_id])
+        return web.Response(status=204)
+
+
+async def _serve(args):
+    simulator = DiscordSimulator(latency=args.latency, default_limit=(args.limit, args.window) if args.limit else None,
+                                 global_limit=args.global_limit)
+    if args.gateway_events:
+        simulator.load_gateway_events(args.gateway_events)
+    guild_id = simulator.add_guild(members=args.members)
+    url = await simulator.start(port=args.port)
+    print(f"Discord simulator on {url} (guild {guild_id})")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Discord REST simulator")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--limit", type=int, default=0, help="Requests per bucket window (0 disables)")
+    parser.add_argument("--window", type=float, default=1.0)
+    parser.add_argument("--global-limit", type=int, default=50)
+    parser.add_argument("--gateway-events", help="NDJSON file of recorded Gateway dispatches to replay")
+    asyncio.run(_serve(parser.parse_args()))
@@ -1,8 +1,42 @@
 from inferencesh import BaseApp, BaseAppInput, BaseAppOutput, File
-from pydantic import Field
-from typing import Optional
+from pydantic import BaseModel, Field
+from types import SimpleNamespace, UnionType
+from typing import (
+    AsyncIterator, Callable, Iterable, Iterator, Literal, Optional, Union, get_args, get_origin, get_type_hints,
+)
 import aiohttp
+import asyncio
+import bisect
+import builtins
+import contextvars
+import fnmatch
+import hashlib
+import hmac
+import json
+import multiprocessing
 import os
+import random
+import re
+import sqlite3
+import string
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
 
 # ============================================================================
 # Input Schemas
@@ -22,22 +56,83 @@ class EditMessageInput(BaseAppInput):
     channel_id: str = Field(description="Discord channel ID")
     message_id: str = Field(description="Message ID to edit")
     content: str = Field(description="New message content")
+    coalesce: bool = Field(default=False, description="Merge with other pending edits of this message; only the latest content is sent")
+    max_staleness: Optional[float] = Field(default=None, ge=0, le=60, description="With coalesce, seconds this edit may be held back to merge with later ones")
 
 
 class EditMessageOutput(BaseAppOutput):
     message_id: str = Field(description="Edited message ID")
     updated: bool = Field(description="Whether message was updated")
+    content: Optional[str] = Field(default=None, description="Content actually sent, which a later coalesced edit may have replaced")
+    superseded: bool = Field(default=False, description="Whether a later coalesced edit was sent in place of this one")
 
 
 class DeleteMessageInput(BaseAppInput):
     channel_id: str = Field(description="Discord channel ID")
     message_id: str = Field(description="Message ID to delete")
+    preflight: bool = Field(default=False, description="Check the bot's permissions locally first and fail without calling Discord")
 
 
 class DeleteMessageOutput(BaseAppOutput):
     deleted: bool = Field(description="Whether message was deleted")
 
 
+class PurgeMessagesInput(BaseAppInput):
+    channel_id: str = Field(description="Discord channel ID")
+    author_id: Optional[str] = Field(default=None, description="Only messages by this user ID")
+    after: Optional[str] = Field(default=None, description="Only messages newer than this ISO 8601 time or message ID")
+    before: Optional[str] = Field(default=None, description="Only messages older than this ISO 8601 time or message ID")
+    content_pattern: Optional[str] = Field(default=None, description="Only messages whose content matches this regex")
+    limit: Optional[int] = Field(default=None, ge=1, description="Maximum number of messages to delete")
+
+
+class PurgeMessagesOutput(BaseAppOutput):
+    scanned: int = Field(description="Messages read from history")
+    matched: int = Field(description="Messages matching the filters")
+    bulk_deleted: int = Field(description="Messages removed via bulk-delete")
+    single_deleted: int = Field(description="Messages removed one by one (older than 14 days, or a lone newer one)")
+    failed: int = Field(description="Matched messages that could not be deleted")
+    elapsed_seconds: float
+
+
+class BroadcastMessageInput(BaseAppInput):
+    content: str = Field(
+        description="Message template; {channel_id}, {channel_name}, {guild_id} and keys from variables are substituted"
+    )
+    channel_ids: list[str] = Field(default_factory=list, description="Channels to send to")
+    guild_ids: list[str] = Field(default_factory=list, description="Guilds whose text channels are added")
+    channel_name_pattern: Optional[str] = Field(
+        default=None, description="Glob filter on channel names for guild_ids, e.g. 'announce*'"
+    )
+    variables: dict = Field(default_factory=dict, description="Template values shared by all channels")
+    channel_variables: dict = Field(
+        default_factory=dict, description="Per-channel template values: {channel_id: {key: value}}"
+    )
+    concurrency: int = Field(default=20, ge=1, le=100, description="Channels sent to at the same time")
+
+
+class BroadcastMessageOutput(BaseAppOutput):
+    messages: dict = Field(description="Channel ID -> sent message ID")
+    failed: dict = Field(description="Channel ID -> error for channels that failed")
+    elapsed_seconds: float
+
+
+class EditBroadcastInput(BaseAppInput):
+    messages: dict = Field(description="Channel ID -> message ID, as returned by broadcast_message")
+    content: str = Field(description="New message template, with the same substitutions as broadcast_message")
+    variables: dict = Field(default_factory=dict, description="Template values shared by all channels")
+    channel_variables: dict = Field(
+        default_factory=dict, description="Per-channel template values: {channel_id: {key: value}}"
+    )
+    concurrency: int = Field(default=20, ge=1, le=100, description="Messages edited at the same time")
+
+
+class EditBroadcastOutput(BaseAppOutput):
+    edited: list[str] = Field(description="Channel IDs whose copy was edited")
+    failed: dict = Field(description="Channel ID -> error for copies that failed")
+    elapsed_seconds: float
+
+
 class GetChannelInput(BaseAppInput):
     channel_id: str = Field(description="Discord channel ID")
 
@@ -49,20 +144,27 @@ class GetChannelOutput(BaseAppOutput):
     position: Optional[int] = None
     topic: Optional[str] = None
     nsfw: Optional[bool] = None
+    guild_id: Optional[str] = None
 
 
 class ListChannelsInput(BaseAppInput):
     guild_id: str = Field(description="Discord guild (server) ID")
+    format: Literal["full", "compact", "raw"] = Field(
+        default="full",
+        description="full: Discord objects; compact: id/name/type/position/parent only; raw: undecoded JSON text"
+    )
 
 
 class ListChannelsOutput(BaseAppOutput):
-    channels: list = Field(description="List of channels in the guild")
+    channels: list = Field(default_factory=list, description="List of channels in the guild")
+    raw: Optional[str] = Field(default=None, description="JSON array as returned by Discord (format=raw)")
 
 
 class CreateChannelInput(BaseAppInput):
     guild_id: str = Field(description="Discord guild ID")
     name: str = Field(description="Channel name")
     channel_type: str = Field(default="text", description="Channel type: text, voice, category")
+    preflight: bool = Field(default=False, description="Check the bot's permissions locally first and fail without calling Discord")
 
 
 class CreateChannelOutput(BaseAppOutput):
@@ -84,12 +186,43 @@ class GetGuildOutput(BaseAppOutput):
     approximate_member_count: Optional[int] = None
 
 
+class SnapshotGuildInput(BaseAppInput):
+    guild_id: str = Field(description="Discord guild ID")
+
+
+class SnapshotGuildOutput(BaseAppOutput):
+    file: File = Field(description="JSON snapshot of roles, channels and permission overwrites")
+    roles: int
+    channels: int
+    overwrites: int
+
+
+class ApplyGuildPlanInput(BaseAppInput):
+    guild_id: str = Field(description="Discord guild ID to bring in line with the snapshot")
+    snapshot: File = Field(description="Snapshot file written by snapshot_guild")
+    delete_missing: bool = Field(default=False, description="Delete channels and roles that are not in the snapshot")
+    dry_run: bool = Field(default=False, description="Only compute and return the plan")
+    concurrency: int = Field(default=5, ge=1, le=20, description="Operations of one stage run at the same time")
+
+
+class ApplyGuildPlanOutput(BaseAppOutput):
+    operations: list[dict] = Field(description="Planned operations in execution order, with status and error")
+    applied: int
+    failed: int
+    elapsed_seconds: float
+
+
 class ListRolesInput(BaseAppInput):
     guild_id: str = Field(description="Discord guild ID")
+    format: Literal["full", "compact", "raw"] = Field(
+        default="full",
+        description="full: Discord objects; compact: id/name/position/permissions/color only; raw: undecoded JSON text"
+    )
 
 
 class ListRolesOutput(BaseAppOutput):
-    roles: list = Field(description="List of roles in the guild")
+    roles: list = Field(default_factory=list, description="List of roles in the guild")
+    raw: Optional[str] = Field(default=None, description="JSON array as returned by Discord (format=raw)")
 
 
 class CreateRoleInput(BaseAppInput):
@@ -108,6 +241,7 @@ class AddRoleInput(BaseAppInput):
     guild_id: str = Field(description="Discord guild ID")
     user_id: str = Field(description="User ID to assign role")
     role_id: str = Field(description="Role ID to assign")
+    preflight: bool = Field(default=False, description="Check the bot's permissions locally first and fail without calling Discord")
 
 
 class AddRoleOutput(BaseAppOutput):
@@ -120,6 +254,7 @@ class RemoveRoleInput(BaseAppInput):
     guild_id: str = Field(description="Discord guild ID")
     user_id: str = Field(description="User ID")
     role_id: str = Field(description="Role ID to remove")
+    preflight: bool = Field(default=False, description="Check the bot's permissions locally first and fail without calling Discord")
 
 
 class RemoveRoleOutput(BaseAppOutput):
@@ -128,6 +263,49 @@ class RemoveRoleOutput(BaseAppOutput):
     success: bool
 
 
+class RoleAssignment(BaseModel):
+    user_id: str = Field(description="User ID")
+    role_id: str = Field(description="Role ID")
+
+
+class RoleAssignmentResult(BaseModel):
+    user_id: str
+    role_id: str
+    success: bool
+    skipped: bool = Field(default=False, description="Already done in a previous run (from checkpoint)")
+    error: Optional[str] = None
+
+
+class BulkAddRolesInput(BaseAppInput):
+    guild_id: str = Field(description="Discord guild ID")
+    assignments: list[RoleAssignment] = Field(description="User/role pairs to assign")
+    concurrency: int = Field(default=10, ge=1, le=100, description="Members processed at the same time")
+    checkpoint_path: Optional[str] = Field(default=None, description="Checkpoint file; rerun with the same path to resume")
+    preflight: bool = Field(default=False, description="Check the bot's permissions locally before each assignment and fail it without calling Discord")
+
+
+class BulkAddRolesOutput(BaseAppOutput):
+    results: list[RoleAssignmentResult]
+    succeeded: int
+    failed: int
+    skipped: int
+
+
+class BulkRemoveRolesInput(BaseAppInput):
+    guild_id: str = Field(description="Discord guild ID")
+    assignments: list[RoleAssignment] = Field(description="User/role pairs to remove")
+    concurrency: int = Field(default=10, ge=1, le=100, description="Members processed at the same time")
+    checkpoint_path: Optional[str] = Field(default=None, description="Checkpoint file; rerun with the same path to resume")
+    preflight: bool = Field(default=False, description="Check the bot's permissions locally before each removal and fail it without calling Discord")
+
+
+class BulkRemoveRolesOutput(BaseAppOutput):
+    results: list[RoleAssignmentResult]
+    succeeded: int
+    failed: int
+    skipped: int
+
+
 class GetMemberInput(BaseAppInput):
     guild_id: str = Field(description="Discord guild ID")
     user_id: str = Field(description="User ID")
@@ -140,15 +318,51 @@ class GetMemberOutput(BaseAppOutput):
     joined_at: Optional[str] = None
 
 
+class GetPermissionsInput(BaseAppInput):
+    guild_id: str = Field(description="Discord guild ID")
+    user_ids: list[str] = Field(default_factory=list, description="Members to check; empty for the bot itself")
+    channel_ids: list[str] = Field(default_factory=list, description="Channels to check; empty for every channel in the guild")
+    format: Literal["names", "bits"] = Field(default="names", description="Flag names, or the bitfield as a decimal string")
+
+
+class GetPermissionsOutput(BaseAppOutput):
+    guild: dict = Field(description="User ID -> guild-wide permissions")
+    channels: dict = Field(description="User ID -> channel ID -> permissions in that channel")
+
+
+class SearchMembersInput(BaseAppInput):
+    guild_id: str = Field(description="Discord guild ID")
+    name: Optional[str] = Field(default=None, description="Case-insensitive glob on username, display name or nick; without wildcards, names starting with it")
+    all_roles: list[str] = Field(default_factory=list, description="Only members with every one of these role IDs")
+    any_roles: list[str] = Field(default_factory=list, description="Only members with at least one of these role IDs")
+    exclude_roles: list[str] = Field(default_factory=list, description="Skip members with any of these role IDs")
+    no_roles: bool = Field(default=False, description="Only members without any role")
+    joined_after: Optional[str] = Field(default=None, description="Only members who joined after this ISO 8601 time or snowflake")
+    joined_before: Optional[str] = Field(default=None, description="Only members who joined before this ISO 8601 time or snowflake")
+    include_bots: bool = Field(default=True, description="Also match bot accounts")
+    limit: int = Field(default=100, ge=1, le=1000, description="Maximum members returned")
+    refresh: bool = Field(default=False, description="Rebuild the member index from the API first")
+
+
+class SearchMembersOutput(BaseAppOutput):
+    members: list[dict] = Field(description="Matching members: user_id, username, global_name, nick, bot, roles, joined_at")
+    total: int = Field(description="Number of matches, including those past the limit")
+    indexed: int = Field(description="Members in the guild's index")
+    index_age_seconds: float
+
+
 class SetNicknameInput(BaseAppInput):
     guild_id: str = Field(description="Discord guild ID")
     user_id: str = Field(description="User ID")
     nick: str = Field(description="New nickname (empty to reset)")
+    coalesce: bool = Field(default=False, description="Merge with other pending nickname changes of this member; only the latest is sent")
+    max_staleness: Optional[float] = Field(default=None, ge=0, le=60, description="With coalesce, seconds this change may be held back to merge with later ones")
 
 
 class SetNicknameOutput(BaseAppOutput):
     user_id: str
     nick: Optional[str]
+    superseded: bool = Field(default=False, description="Whether a later coalesced change was sent in place of this one")
 
 
 class BanUserInput(BaseAppInput):
@@ -156,6 +370,7 @@ class BanUserInput(BaseAppInput):
     user_id: str = Field(description="User ID to ban")
     reason: Optional[str] = Field(default=None, description="Ban reason")
     delete_messages_days: Optional[int] = Field(default=0, description="Days of messages to delete (0-7)")
+    preflight: bool = Field(default=False, description="Check the bot's permissions locally first and fail without calling Discord")
 
 
 class BanUserOutput(BaseAppOutput):
@@ -177,6 +392,7 @@ class KickUserInput(BaseAppInput):
     guild_id: str = Field(description="Discord guild ID")
     user_id: str = Field(description="User ID to kick")
     reason: Optional[str] = Field(default=None, description="Kick reason")
+    preflight: bool = Field(default=False, description="Check the bot's permissions locally first and fail without calling Discord")
 
 
 class KickUserOutput(BaseAppOutput):
@@ -184,6 +400,185 @@ class KickUserOutput(BaseAppOutput):
     kicked: bool
 
 
+class MemberFilter(BaseModel):
+    joined_after: Optional[str] = Field(default=None, description="Only members who joined after this ISO 8601 time or snowflake")
+    joined_before: Optional[str] = Field(default=None, description="Only members who joined before this ISO 8601 time or snowflake")
+    no_roles: bool = Field(default=False, description="Only members without any role")
+    name_pattern: Optional[str] = Field(default=None, description="Case-insensitive glob on username, display name or nick, e.g. 'spam*'")
+    include_bots: bool = Field(default=False, description="Also match bot accounts")
+    limit: Optional[int] = Field(default=None, ge=1, description="Stop after this many matches")
+
+
+class MassBanInput(BaseAppInput):
+    guild_id: str = Field(description="Discord guild ID")
+    user_ids: list[str] = Field(default_factory=list, description="User IDs to ban")
+    filter: Optional[MemberFilter] = Field(default=None, description="Also ban current members matching this filter")
+    reason: Optional[str] = Field(default=None, max_length=512, description="Audit log reason")
+    delete_message_seconds: int = Field(default=0, ge=0, le=604800, description="Delete this many seconds of their messages")
+    dry_run: bool = Field(default=False, description="Only list the users that would be banned")
+
+
+class MassBanOutput(BaseAppOutput):
+    matched: int = Field(description="Users selected by user_ids and the filter")
+    banned: list[str] = Field(description="User IDs banned")
+    failed: dict[str, str] = Field(description="User ID -> reason, for users that could not be banned")
+    selected: list[str] = Field(default_factory=list, description="User IDs that would be banned (dry runs only)")
+    elapsed_seconds: float
+
+
+class MassKickInput(BaseAppInput):
+    guild_id: str = Field(description="Discord guild ID")
+    user_ids: list[str] = Field(default_factory=list, description="User IDs to kick")
+    filter: Optional[MemberFilter] = Field(default=None, description="Also kick current members matching this filter")
+    reason: Optional[str] = Field(default=None, max_length=512, description="Audit log reason")
+    dry_run: bool = Field(default=False, description="Only list the users that would be kicked")
+
+
+class MassKickOutput(BaseAppOutput):
+    matched: int = Field(description="Users selected by user_ids and the filter")
+    kicked: list[str] = Field(description="User IDs kicked")
+    failed: dict[str, str] = Field(description="User ID -> reason, for users that could not be kicked")
+    selected: list[str] = Field(default_factory=list, description="User IDs that would be kicked (dry runs only)")
+    elapsed_seconds: float
+
+
+class EnqueueInput(BaseAppInput):
+    operation: str = Field(description="Entry point to queue, e.g. ban_user or send_message")
+    input: dict = Field(description="Its input, as it would be passed directly")
+    dedup_key: Optional[str] = Field(default=None, description="Queue nothing if an item with this key is queued, being sent or done")
+    wait: bool = Field(default=False, description="Wait until the item is sent and return its result")
+
+
+class EnqueueOutput(BaseAppOutput):
+    item_id: int
+    deduplicated: bool = Field(description="Whether an existing item with the same dedup_key was returned")
+    state: str = Field(description="queued, sending, done, failed or uncertain")
+    result: Optional[dict] = Field(default=None, description="The operation's output, once done")
+    error: Optional[str] = None
+
+
+class OutboxStatusInput(BaseAppInput):
+    item_ids: list[int] = Field(default_factory=list, description="Items to report in detail")
+
+
+class OutboxStatusOutput(BaseAppOutput):
+    counts: dict = Field(description="Lane -> state -> number of items")
+    active: dict = Field(description="Lane -> request slots taken by the items being sent now")
+    items: list[dict] = Field(default_factory=list, description="The requested items")
+
+
+class GetStatsInput(BaseAppInput):
+    reset: bool = Field(default=False, description="Reset counters after reading them")
+
+
+class GetStatsOutput(BaseAppOutput):
+    cache: dict = Field(description="Lookup cache size and hit/miss counters per resource type")
+    pool: dict = Field(description="Connection pool usage: in-flight, idle, reuse and queue wait time")
+    coalescing: dict = Field(default_factory=dict, description="GETs sent vs. joined while an identical one was in flight")
+    gateway: dict = Field(default_factory=dict, description="Gateway connection state; empty when not enabled")
+
+
+class ExportMetricsInput(BaseAppInput):
+    format: Literal["json", "prometheus"] = Field(default="json", description="Snapshot as JSON or Prometheus text")
+    reset: bool = Field(default=False, description="Reset metrics after exporting them")
+
+
+class ExportMetricsOutput(BaseAppOutput):
+    metrics: Optional[dict] = Field(default=None, description="Per-route counters and latency percentiles (json)")
+    text: Optional[str] = Field(default=None, description="Prometheus text exposition (prometheus)")
+
+
+class ExportMembersInput(BaseAppInput):
+    guild_id: str = Field(description="Discord guild ID")
+    limit: Optional[int] = Field(default=None, ge=1, description="Stop after this many members")
+
+
+class ExportMembersOutput(BaseAppOutput):
+    file: File = Field(description="NDJSON file with one member object per line")
+    count: int = Field(description="Number of members written")
+
+
+class ExportBansInput(BaseAppInput):
+    guild_id: str = Field(description="Discord guild ID")
+    limit: Optional[int] = Field(default=None, ge=1, description="Stop after this many bans")
+
+
+class ExportBansOutput(BaseAppOutput):
+    file: File = Field(description="NDJSON file with one ban object per line")
+    count: int = Field(description="Number of bans written")
+
+
+class ExportMessagesInput(BaseAppInput):
+    channel_id: str = Field(description="Discord channel ID")
+    before: Optional[str] = Field(default=None, description="Only messages older than this message ID")
+    after: Optional[str] = Field(default=None, description="Only messages newer than this message ID")
+    limit: Optional[int] = Field(default=None, ge=1, description="Stop after this many messages")
+
+
+class ExportMessagesOutput(BaseAppOutput):
+    file: File = Field(description="NDJSON file with one message object per line")
+    count: int = Field(description="Number of messages written")
+
+
+class BatchOperation(BaseModel):
+    op: str = Field(description="Method to call, e.g. send_message, create_channel, ban_user")
+    args: dict = Field(
+        default_factory=dict,
+        description="Method arguments; a value like '$3.channel_id' is replaced by that field of step 3's output"
+    )
+    id: Optional[str] = Field(default=None, description="Optional name to reference this step as '$<id>.<field>'")
+
+
+class BatchStepResult(BaseModel):
+    step: int = Field(description="1-based position in the batch")
+    op: str
+    success: bool
+    skipped: bool = Field(default=False, description="Not run because a step it depends on failed")
+    output: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class RunBatchInput(BaseAppInput):
+    operations: list[BatchOperation] = Field(description="Operations in order; steps are numbered from 1")
+    concurrency: int = Field(default=10, ge=1, le=100, description="Steps running at the same time")
+
+
+class RunBatchOutput(BaseAppOutput):
+    results: list[BatchStepResult]
+    succeeded: int
+    failed: int
+    skipped: int
+
+
+class _TemplateValues(dict):
+    """format_map() mapping that leaves unknown placeholders untouched."""
+
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+# "$<step number or id>.<output field>"
+BATCH_REFERENCE = re.compile(r"^\$([\w-]+)\.(\w+)$")
+
+
+def _reference_placeholder(annotation):
+    """A value of an output field's type that stands in for a batch reference
+    while arguments are validated, before the real value is known."""
+    origin = get_origin(annotation)
+    if origin in (Union, UnionType):
+        options = [option for option in get_args(annotation) if option is not type(None)]
+        return _reference_placeholder(options[0]) if options else None
+    annotation = origin or annotation
+    if annotation is str:
+        # Any valid snowflake
+        return "1" * 18
+    if annotation in (bool, int, float):
+        return annotation(1)
+    if annotation in (list, tuple, set, frozenset, dict):
+        return annotation()
+    return None
+
+
 class CreateWebhookInput(BaseAppInput):
     channel_id: str = Field(description="Discord channel ID")
     name: str = Field(description="Webhook name")
@@ -200,6 +595,8 @@ class ExecuteWebhookInput(BaseAppInput):
     content: str = Field(description="Message content")
     username: Optional[str] = Field(default=None, description="Override username")
     avatar_url: Optional[str] = Field(default=None, description="Override avatar")
+    token: Optional[str] = Field(default=None, description="Webhook token; looked up in the webhook vault if omitted")
+    wait: bool = Field(default=True, description="Wait for Discord to confirm and return the message ID")
 
 
 class ExecuteWebhookOutput(BaseAppOutput):
@@ -207,54 +604,3207 @@ class ExecuteWebhookOutput(BaseAppOutput):
     message_id: Optional[str] = None
 
 
+class ExecuteWebhooksInput(BaseAppInput):
+    webhook_ids: list[str] = Field(description="Webhooks to spread the messages across (tokens from the vault)")
+    contents: list[str] = Field(description="Messages to send; message i goes to webhook i mod len(webhook_ids)")
+    username: Optional[str] = Field(default=None, description="Override username")
+    avatar_url: Optional[str] = Field(default=None, description="Override avatar")
+    wait: bool = Field(default=False, description="Wait for each message to be confirmed and return IDs")
+
+
+class ExecuteWebhooksOutput(BaseAppOutput):
+    sent: int
+    failed: int
+    message_ids: list[Optional[str]] = Field(description="Message ID per content (None if not waited for or failed)")
+    errors: dict = Field(default_factory=dict, description="Error per failed content index")
+    elapsed_seconds: float
+
+
 # ============================================================================
-# App
+# Errors
 # ============================================================================
 
-class App(BaseApp):
-    API_BASE = "https://discord.com/api/v10"
+class DiscordAPIError(RuntimeError):
+    """Error response from the Discord API.
+    
+    ``code`` is Discord's JSON error code (e.g. 50013 Missing Permissions),
+    ``retry_after`` is set for 429 responses.
+    """
+
+    def __init__(
+        self,
+        status: int,
+        message: str,
+        code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        method: Optional[str] = None,
+        route: Optional[str] = None,
+        errors: Optional[dict] = None,
+    ):
+        self.status = status
+        self.code = code
+        self.message = message
+        self.retry_after = retry_after
+        self.method = method
+        self.route = route
+        self.errors = errors
+        detail = f" (code {code})" if code else ""
+        super().__init__(f"Discord API error {status}{detail}: {message}")
+
+    @classmethod
+    def from_response(cls, status: int, body: bytes, method: str, route: str, retry_after: Optional[float] = None):
+        text = body.decode("utf-8", "replace")
+        try:
+            body = json.loads(text) if text else {}
+        except ValueError:
+            body = {}
+        if not isinstance(body, dict):
+            body = {}
+        return cls(
+            status,
+            body.get("message") or text[:200],
+            code=body.get("code"),
+            retry_after=retry_after,
+            method=method,
+            route=route,
+            errors=body.get("errors"),
+        )
+
+
+# ============================================================================
+# Snowflakes
+# ============================================================================
+
+DISCORD_EPOCH_MS = 1420070400000
+
+
+def snowflake_time(snowflake: str) -> float:
+    """Return the creation time of a snowflake as a Unix timestamp."""
+    return ((int(snowflake) >> 22) + DISCORD_EPOCH_MS) / 1000
+
+
+def time_snowflake(timestamp: float) -> str:
+    """Return the smallest snowflake created at ``timestamp``."""
+    return str(max(0, int(timestamp * 1000) - DISCORD_EPOCH_MS) << 22)
+
+
+def parse_snowflake_or_time(value: str) -> str:
+    """Accept a snowflake or an ISO 8601 timestamp and return a snowflake."""
+    if value.isdigit():
+        return value
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return time_snowflake(moment.timestamp())
+
+
+# ============================================================================
+# Decoding
+# ============================================================================
+
+def _json_dumps(value) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+# Installed decoders, fastest first; all accept bytes directly
+JSON_DECODERS = {}
+if orjson is not None:
+    JSON_DECODERS["orjson"] = orjson.loads
+if msgspec is not None:
+    JSON_DECODERS["msgspec"] = msgspec.json.decode
+JSON_DECODERS["json"] = json.loads
+
+
+def select_decoder(name: Optional[str] = None) -> Callable[[bytes], object]:
+    """Return the named JSON decoder, or the fastest one installed."""
+    if name:
+        if name not in JSON_DECODERS:
+            raise ValueError(f"JSON decoder '{name}' is not available (have: {', '.join(JSON_DECODERS)})")
+        return JSON_DECODERS[name]
+    return next(iter(JSON_DECODERS.values()))
+
+
+class Record:
+    """Compact read-only view of a Discord object.
+    
+    Built with plain attribute assignment instead of Pydantic validation;
+    subclasses list the fields they keep in ``__slots__``.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_json(cls, data: dict):
+        record = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(record, name, data.get(name))
+        return record
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class ChannelRecord(Record):
+    __slots__ = ("id", "name", "type", "position", "parent_id")
+
+
+class RoleRecord(Record):
+    __slots__ = ("id", "name", "position", "permissions", "color")
+
+
+class MemberRecord(Record):
+    __slots__ = ("id", "username", "nick", "roles", "joined_at")
+
+    @classmethod
+    def from_json(cls, data: dict):
+        record = cls.__new__(cls)
+        user = data.get("user") or {}
+        record.id = user.get("id")
+        record.username = user.get("username")
+        record.nick = data.get("nick")
+        record.roles = data.get("roles", [])
+        record.joined_at = data.get("joined_at")
+        return record
+
+
+# ============================================================================
+# Rate Limiting
+# ============================================================================
+
+# Top-level resources whose ID is a "major parameter": Discord keeps a separate
+# rate-limit bucket per value of these, even for routes sharing a bucket hash.
+MAJOR_PARAMETERS = ("channels", "guilds", "webhooks")
+
+
+# Methods that can be resent without changing the outcome. POST creates new
+# objects, so it is only retried when the request never reached Discord.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "PATCH", "DELETE"})
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+
+
+def route_key(method: str, endpoint: str) -> tuple[str, str]:
+    """Split an endpoint into its route template and major parameter.
+
+    ``/guilds/123/members/456/roles/789`` becomes
+    ``("PUT /guilds/{guild_id}/members/{id}/roles/{id}", "123")``.
+    """
+    parts = endpoint.split("?", 1)[0].strip("/").split("/")
+    major = ""
+    template = []
+    for i, part in enumerate(parts):
+        if i == 1 and parts[0] in MAJOR_PARAMETERS and part.isdigit():
+            major = part
+            template.append("{" + parts[0][:-1] + "_id}")
+        elif i == 2 and parts[0] == "webhooks" and major:
+            # Webhook tokens are part of the major parameter
+            major = f"{major}/{part}"
+            template.append("{token}")
+        elif part.isdigit():
+            template.append("{id}")
+        else:
+            template.append(part)
+    return f"{method} /" + "/".join(template), major
+
+
+def redact_major(major: str) -> str:
+    """``major`` with a webhook token masked, safe for logs and metrics."""
+    webhook_id, sep, _ = major.partition("/")
+    return f"{webhook_id}/:token" if sep else major
+
+
+class RateLimitBucket:
+    """Client-side view of one Discord rate-limit bucket."""
+
+    __slots__ = ("key", "limit", "remaining", "reset_at", "inflight", "unlimited", "lock", "updated")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.limit: Optional[int] = None
+        # One probe request is allowed until the first response tells us the limits
+        self.remaining = 1
+        self.reset_at: Optional[float] = None
+        self.inflight = 0
+        self.unlimited = False
+        self.lock = asyncio.Lock()
+        self.updated = asyncio.Event()
+
+    def notify(self):
+        """Wake callers waiting for fresh rate-limit headers."""
+        event, self.updated = self.updated, asyncio.Event()
+        event.set()
+
+
+class RateLimiter:
+    """Per-bucket request scheduler driven by Discord's rate-limit headers.
+
+    Requests are queued FIFO per bucket and only sent once the bucket has
+    capacity, so 429s become the exception instead of the steady state.
+    """
+
+    # Seconds to wait for a probe response before letting another request through
+    PROBE_TIMEOUT = 5.0
+
+    def __init__(self, global_rate: int = 50):
+        self.global_rate = global_rate
+        self.global_reset_at = 0.0
+        self._window_end = 0.0
+        self._window_count = 0
+        self._hashes: dict[str, str] = {}
+        self._buckets: dict[str, RateLimitBucket] = {}
+
+    def bucket_hash(self, route: str) -> str:
+        """Discord's bucket hash for a route template, or the template until one is seen."""
+        return self._hashes.get(route, route)
+
+    def get_bucket(self, method: str, endpoint: str) -> RateLimitBucket:
+        """Return the bucket a request will be scheduled on."""
+        route, major = route_key(method, endpoint)
+        key = f"{self.bucket_hash(route)}:{major}"
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = RateLimitBucket(key)
+        return bucket
+
+    async def _wait_global(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self.global_reset_at > now:
+                await asyncio.sleep(self.global_reset_at - now)
+                continue
+            if now >= self._window_end:
+                self._window_end = now + 1.0
+                self._window_count = 0
+            if self._window_count < self.global_rate:
+                self._window_count += 1
+                return
+            await asyncio.sleep(self._window_end - now)
+
+    async def acquire(self, bucket: RateLimitBucket, global_limit: bool = True):
+        """Wait until a request may be sent on ``bucket``."""
+        loop = asyncio.get_running_loop()
+        async with bucket.lock:
+            while True:
+                now = loop.time()
+                if bucket.reset_at is not None and now >= bucket.reset_at:
+                    bucket.remaining = bucket.limit or 1
+                    bucket.reset_at = None
+                if bucket.unlimited or bucket.remaining > 0:
+                    if not bucket.unlimited:
+                        bucket.remaining -= 1
+                    break
+                if bucket.reset_at is None:
+                    # Exhausted with no known reset: wait for an in-flight response
+                    try:
+                        await asyncio.wait_for(bucket.updated.wait(), self.PROBE_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        bucket.remaining = 1
+                    continue
+                await asyncio.sleep(bucket.reset_at - now)
+            bucket.inflight += 1
+        if global_limit:
+            await self._wait_global()
+
+    async def wait_ready(self, bucket: RateLimitBucket):
+        """Wait until ``bucket`` has capacity, without taking a slot."""
+        loop = asyncio.get_running_loop()
+        while not bucket.unlimited and bucket.remaining <= 0:
+            now = loop.time()
+            if bucket.reset_at is None:
+                try:
+                    await asyncio.wait_for(bucket.updated.wait(), self.PROBE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    return
+            elif now < bucket.reset_at:
+                await asyncio.sleep(bucket.reset_at - now)
+            else:
+                return
+
+    def release(self, bucket: RateLimitBucket):
+        """Give back a slot for a request that never got a response."""
+        bucket.inflight = max(0, bucket.inflight - 1)
+        if bucket.remaining <= 0 and bucket.reset_at is None:
+            bucket.remaining = 1
+        bucket.notify()
+
+    def update(self, bucket: RateLimitBucket, method: str, endpoint: str, status: int, headers) -> RateLimitBucket:
+        """Apply response headers to ``bucket`` and return the bucket to use next."""
+        loop = asyncio.get_running_loop()
+        bucket.inflight = max(0, bucket.inflight - 1)
+
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+        if bucket_hash:
+            route, major = route_key(method, endpoint)
+            if self._hashes.get(route) != bucket_hash:
+                self._hashes[route] = bucket_hash
+                # Routes sharing a hash share one queue; the first one seen wins
+                bucket = self._buckets.setdefault(f"{bucket_hash}:{major}", bucket)
+
+        limit = headers.get("X-RateLimit-Limit")
+        if limit is None:
+            # Global and shared 429s carry no bucket headers; only a normal
+            # response without them means the route is not limited per bucket
+            bucket.unlimited = status != 429
+            bucket.notify()
+            return bucket
+
+        bucket.unlimited = False
+        bucket.limit = int(limit)
+        remaining = int(headers.get("X-RateLimit-Remaining", 0))
+        reset_at = loop.time() + float(headers.get("X-RateLimit-Reset-After", 0))
+        if bucket.reset_at is None or reset_at > bucket.reset_at + 0.5:
+            # New window: requests still in flight will count against it too
+            bucket.remaining = max(0, remaining - bucket.inflight)
+        else:
+            bucket.remaining = min(bucket.remaining, remaining)
+        bucket.reset_at = reset_at
+        bucket.notify()
+        return bucket
+
+    def on_rate_limited(self, bucket: RateLimitBucket, headers, body: dict) -> float:
+        """Record a 429 and return how many seconds the request must wait."""
+        loop = asyncio.get_running_loop()
+        retry_after = float(body.get("retry_after") or headers.get("Retry-After") or 1.0)
+        scope = headers.get("X-RateLimit-Scope")
+        if body.get("global") or headers.get("X-RateLimit-Global") or scope == "global":
+            self.global_reset_at = loop.time() + retry_after
+        elif scope != "shared":
+            bucket.remaining = 0
+            bucket.reset_at = loop.time() + retry_after
+            return retry_after
+        if bucket.remaining <= 0 and bucket.reset_at is None:
+            # The bucket itself was not charged; hand the probe slot back so
+            # requests waiting on it don't sit out PROBE_TIMEOUT
+            bucket.remaining = 1
+            bucket.notify()
+        return retry_after
+
+
+# ============================================================================
+# Connection Pool
+# ============================================================================
+
+def env_number(name: str, default: float) -> float:
+    """Read a numeric setting from the environment, keeping the type of ``default``."""
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return type(default)(value)
+
+
+class PoolMonitor:
+    """Connection pool statistics collected through aiohttp tracing hooks."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.queued = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        config = aiohttp.TraceConfig(trace_config_ctx_factory=SimpleNamespace)
+        config.on_request_start.append(self._on_request_start)
+        config.on_request_end.append(self._on_request_done)
+        config.on_request_exception.append(self._on_request_done)
+        config.on_connection_queued_start.append(self._on_queued_start)
+        config.on_connection_queued_end.append(self._on_queued_end)
+        config.on_connection_create_end.append(self._on_connection_created)
+        config.on_connection_reuseconn.append(self._on_connection_reused)
+        return config
+
+    async def _on_request_start(self, session, context, params):
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    async def _on_request_done(self, session, context, params):
+        self.in_flight -= 1
+
+    async def _on_queued_start(self, session, context, params):
+        context.queued_at = time.monotonic()
+
+    async def _on_queued_end(self, session, context, params):
+        wait = time.monotonic() - context.queued_at
+        self.queued += 1
+        self.queue_wait_total += wait
+        self.queue_wait_max = max(self.queue_wait_max, wait)
+
+    async def _on_connection_created(self, session, context, params):
+        self.connections_created += 1
+
+    async def _on_connection_reused(self, session, context, params):
+        self.connections_reused += 1
+
+    def stats(self, connector: Optional[aiohttp.BaseConnector], reset: bool = False) -> dict:
+        # aiohttp has no public API for pool occupancy and the tracing hooks
+        # never see a connection go back to the pool. BaseConnector._conns
+        # (key -> idle connections) and ._acquired (connections in use) are
+        # private; checked against aiohttp 3.9 through 3.14. Should a release
+        # rename them, both counts read 0 instead of failing get_stats
+        idle = sum(len(conns) for conns in (getattr(connector, "_conns", None) or {}).values())
+        active = len(getattr(connector, "_acquired", None) or ())
+        result = {
+            "limit": getattr(connector, "limit", None),
+            "limit_per_host": getattr(connector, "limit_per_host", None),
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "active_connections": active,
+            "idle_connections": idle,
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "queued": self.queued,
+            "queue_wait_avg_ms": round(1000 * self.queue_wait_total / self.queued, 3) if self.queued else 0.0,
+            "queue_wait_max_ms": round(1000 * self.queue_wait_max, 3),
+        }
+        if reset:
+            in_flight = self.in_flight
+            self.reset()
+            self.in_flight = self.peak_in_flight = in_flight
+        return result
+
+
+# ============================================================================
+# Metrics
+# ============================================================================
+
+class LatencyHistogram:
+    """Log-linear (HDR-style) histogram of durations with ~6% relative error.
+    
+    Values are recorded in microseconds into buckets that are exact below
+    32µs and then split every power of two into 16 linear sub-buckets, so
+    recording is a couple of integer operations and memory stays small.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    SUB_BUCKET_BITS = 4
+
+    def __init__(self):
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        value = int(seconds * 1_000_000)
+        shift = max(0, value.bit_length() - self.SUB_BUCKET_BITS - 1)
+        index = (shift << self.SUB_BUCKET_BITS) + (value >> shift)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def _bucket_bounds(self, index: int) -> tuple[int, int]:
+        shift = max(0, (index >> self.SUB_BUCKET_BITS) - 1)
+        mantissa = index - (shift << self.SUB_BUCKET_BITS)
+        return mantissa << shift, (mantissa + 1) << shift
+
+    def percentile(self, fraction: float) -> float:
+        """Approximate value at ``fraction`` (0-1) of the distribution, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = self._bucket_bounds(index)
+                return min((low + high) / 2 / 1_000_000, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(1000 * self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(1000 * self.percentile(0.50), 3),
+            "p90_ms": round(1000 * self.percentile(0.90), 3),
+            "p99_ms": round(1000 * self.percentile(0.99), 3),
+            "max_ms": round(1000 * self.max, 3),
+        }
+
+
+class RequestRecord:
+    """What happened to one _request call, as passed to metrics hooks.
+    
+    ``queue_time`` is time spent waiting for the rate limiter and
+    ``network_time`` time spent on the wire, both summed over attempts, in
+    seconds. ``status`` is None when no response was received. ``bucket``
+    is ``<bucket hash>:<major parameter>`` with webhook tokens masked.
+    """
+
+    __slots__ = ("method", "route", "bucket", "status", "bytes", "queue_time", "network_time",
+                 "total_time", "retries", "error")
+
+    def __init__(self, method: str, route: str, bucket: str, status: Optional[int], size: int,
+                 queue_time: float, network_time: float, total_time: float, retries: int,
+                 error: Optional[str] = None):
+        self.method = method
+        self.route = route
+        self.bucket = bucket
+        self.status = status
+        self.bytes = size
+        self.queue_time = queue_time
+        self.network_time = network_time
+        self.total_time = total_time
+        self.retries = retries
+        self.error = error
+
+
+class RouteMetrics:
+    __slots__ = ("requests", "errors", "retries", "bytes", "statuses", "bucket", "total", "queue", "network")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.statuses: dict[str, int] = {}
+        self.bucket: Optional[str] = None
+        self.total = LatencyHistogram()
+        self.queue = LatencyHistogram()
+        self.network = LatencyHistogram()
+
+
+class RequestMetrics:
+    """Per-route request counters and latency histograms.
+    
+    ``hooks`` are called with every RequestRecord after it is counted;
+    they run inline on the request path, so keep them cheap and make sure
+    they do not raise.
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self):
+        self.routes: dict[str, RouteMetrics] = {}
+        self.hooks: list[Callable[[RequestRecord], None]] = []
+        self.started_at = time.time()
+
+    def reset(self):
+        self.routes = {}
+        self.started_at = time.time()
+
+    def observe(self, record: RequestRecord):
+        stats = self.routes.get(record.route)
+        if stats is None:
+            stats = self.routes[record.route] = RouteMetrics()
+        stats.requests += 1
+        stats.retries += record.retries
+        stats.bytes += record.bytes
+        status = str(record.status) if record.status is not None else "none"
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        if record.error is not None:
+            stats.errors += 1
+        # The bucket hash without the major parameter, to keep cardinality low
+        stats.bucket = record.bucket.split(":", 1)[0]
+        stats.total.record(record.total_time)
+        stats.queue.record(record.queue_time)
+        stats.network.record(record.network_time)
+        for hook in self.hooks:
+            hook(record)
+
+    def snapshot(self) -> dict:
+        return {
+            "since": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+            "routes": {
+                route: {
+                    "requests": s.requests,
+                    "errors": s.errors,
+                    "retries": s.retries,
+                    "bytes": s.bytes,
+                    "statuses": dict(s.statuses),
+                    "bucket": s.bucket,
+                    "latency": s.total.summary(),
+                    "queue": s.queue.summary(),
+                    "network": s.network.summary(),
+                }
+                for route, s in self.routes.items()
+            },
+        }
+
+    def prometheus(self, prefix: str = "discord") -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def escape(value: str) -> str:
+            return value.replace("\\", "\\\\").replace('"', '\\"')
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        family("requests_total", "counter", "API requests by route and final status")
+        for route, s in self.routes.items():
+            for status, count in s.statuses.items():
+                lines.append(f'{prefix}_requests_total{{route="{escape(route)}",status="{status}"}} {count}')
+        for name, attr, help_text in (
+            ("request_errors_total", "errors", "API requests that raised"),
+            ("request_retries_total", "retries", "Retries after 429s and transient failures"),
+            ("response_bytes_total", "bytes", "Response body bytes received"),
+        ):
+            family(name, "counter", help_text)
+            for route, s in self.routes.items():
+                lines.append(f'{prefix}_{name}{{route="{escape(route)}"}} {getattr(s, attr)}')
+        for name, attr, help_text in (
+            ("request_duration_seconds", "total", "Time per request including queueing and retries"),
+            ("request_queue_seconds", "queue", "Time spent waiting for the rate limiter"),
+            ("request_network_seconds", "network", "Time spent on the network"),
+        ):
+            family(name, "summary", help_text)
+            for route, s in self.routes.items():
+                histogram = getattr(s, attr)
+                label = f'route="{escape(route)}"'
+                for q in self.QUANTILES:
+                    lines.append(f'{prefix}_{name}{{{label},quantile="{q}"}} {histogram.percentile(q):.6f}')
+                lines.append(f"{prefix}_{name}_sum{{{label}}} {histogram.total:.6f}")
+                lines.append(f"{prefix}_{name}_count{{{label}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+# ============================================================================
+# Caching
+# ============================================================================
+
+class ResponseCache:
+    """Bounded LRU cache of REST lookups with a TTL per resource kind.
+    
+    Keys are ``(kind, *snowflakes)``, e.g. ``("member", guild_id, user_id)``.
+    Values are the decoded JSON and must be treated as read-only; updates
+    replace entries instead of mutating them.
+    """
+
+    DEFAULT_TTLS = {
+        "guild": 300.0,
+        "channel": 120.0,
+        "channels": 120.0,
+        "roles": 120.0,
+        "member": 60.0,
+    }
+
+    def __init__(self, max_size: int = 10000, ttls: Optional[dict] = None):
+        self.max_size = max_size
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = dict.fromkeys(self.ttls, 0)
+        self.misses = dict.fromkeys(self.ttls, 0)
+        self.evictions = 0
+        # Optional callable(kind, key, value) told about every fresh put and
+        # invalidation (value None), e.g. DiskCache.record
+        self.persist: Optional[Callable[[str, tuple, object], None]] = None
+
+    def get(self, kind: str, *key: str):
+        """Return the cached value, or None on a miss or expired entry."""
+        entry = self._entries.get((kind, *key))
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end((kind, *key))
+                self.hits[kind] += 1
+                return value
+            del self._entries[(kind, *key)]
+        self.misses[kind] += 1
+        return None
+
+    def peek(self, kind: str, *key: str):
+        """Like get() but without touching counters or LRU order."""
+        entry = self._entries.get((kind, *key))
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def put(self, kind: str, *key: str, value, ttl: Optional[float] = None):
+        self._entries[(kind, *key)] = (time.monotonic() + (self.ttls[kind] if ttl is None else ttl), value)
+        self._entries.move_to_end((kind, *key))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        if self.persist is not None and ttl is None:
+            self.persist(kind, key, value)
+
+    def invalidate(self, kind: str, *key: str):
+        self._entries.pop((kind, *key), None)
+        if self.persist is not None:
+            self.persist(kind, key, None)
+
+    def stats(self, reset: bool = False) -> dict:
+        result = {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "evictions": self.evictions,
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+        }
+        if reset:
+            self.hits = dict.fromkeys(self.ttls, 0)
+            self.misses = dict.fromkeys(self.ttls, 0)
+            self.evictions = 0
+        return result
+
+
+class DiskCache:
+    """SQLite copy of lookup cache entries that outlives the process.
+    
+    Lets a new App start with the guild structure it saw last time. Rows
+    carry the format version and the time they were fetched; rows from
+    another version or older than ``max_age`` seconds are ignored and
+    pruned. Writes are buffered and flushed in one transaction, so the
+    request path only touches a dict.
+    """
+
+    FORMAT_VERSION = 1
+    FLUSH_THRESHOLD = 500
+
+    def __init__(self, path: str, kinds: tuple, max_age: float):
+        self.path = path
+        self.kinds = frozenset(kinds)
+        self.max_age = max_age
+        self._pending: dict[tuple, tuple] = {}
+        self.loaded = 0
+        self.written = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA mmap_size=67108864")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "kind TEXT, key TEXT, version INTEGER, fetched_at REAL, value BLOB, "
+            "PRIMARY KEY (kind, key)) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    def load(self, decode: Callable[[bytes], object]) -> list[tuple[str, tuple, float, object]]:
+        """Return ``(kind, key, age, value)`` for every usable row."""
+        now = time.time()
+        cutoff = now - self.max_age
+        with self._db:
+            self._db.execute(
+                "DELETE FROM entries WHERE version != ? OR fetched_at <= ?", (self.FORMAT_VERSION, cutoff)
+            )
+            rows = self._db.execute(
+                "SELECT kind, key, fetched_at, value FROM entries WHERE version = ?", (self.FORMAT_VERSION,)
+            ).fetchall()
+        entries = [(kind, tuple(key.split(":")), now - fetched_at, decode(value)) for kind, key, fetched_at, value in rows]
+        self.loaded += len(entries)
+        return entries
+
+    def record(self, kind: str, key: tuple, value):
+        """Queue a write (or a delete, for None) of one entry."""
+        if kind in self.kinds:
+            self._pending[(kind, ":".join(key))] = (time.time(), value)
+            if len(self._pending) >= self.FLUSH_THRESHOLD:
+                self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                [(kind, key, self.FORMAT_VERSION, fetched_at, _json_dumps(value).encode())
+                 for (kind, key), (fetched_at, value) in pending.items() if value is not None],
+            )
+            self._db.executemany(
+                "DELETE FROM entries WHERE kind = ? AND key = ?",
+                [(kind, key) for (kind, key), (_, value) in pending.items() if value is None],
+            )
+        self.written += len(pending)
+
+    def stats(self) -> dict:
+        return {"path": self.path, "loaded": self.loaded, "written": self.written, "pending": len(self._pending)}
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+# ============================================================================
+# Webhook Vault
+# ============================================================================
+
+class WebhookVault:
+    """Encrypted SQLite store of webhook tokens, keyed by webhook ID.
+    
+    Tokens are sealed with an HMAC-SHA256 keystream and authenticated with
+    a separate HMAC key (encrypt-then-MAC), so the file alone does not
+    reveal them. Decrypted tokens are kept in memory for the hot path.
+    The file is created readable by its owner only.
+    """
+
+    @staticmethod
+    def default_path() -> str:
+        """Per-user location: ``$XDG_DATA_HOME/discord-admin/webhooks.db``."""
+        base = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+        directory = os.path.join(base, "discord-admin")
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        return os.path.join(directory, "webhooks.db")
+
+    def __init__(self, path: str, secret: str):
+        self.path = path
+        # Create it 0600 before SQLite does; its journal files copy the mode
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        master = hashlib.sha256(secret.encode()).digest()
+        self._enc_key = hmac.new(master, b"webhook-vault:encrypt", hashlib.sha256).digest()
+        self._mac_key = hmac.new(master, b"webhook-vault:mac", hashlib.sha256).digest()
+        self._tokens: dict[str, str] = {}
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS webhooks ("
+            "webhook_id TEXT PRIMARY KEY, channel_id TEXT, name TEXT, token BLOB, created_at REAL)"
+        )
+        self._db.commit()
+
+    def _keystream(self, nonce: bytes, length: int) -> bytes:
+        blocks = (length + 31) // 32
+        return b"".join(
+            hmac.new(self._enc_key, nonce + i.to_bytes(4, "big"), hashlib.sha256).digest() for i in range(blocks)
+        )[:length]
+
+    def _seal(self, token: str) -> bytes:
+        nonce = os.urandom(16)
+        plain = token.encode()
+        cipher = bytes(a ^ b for a, b in zip(plain, self._keystream(nonce, len(plain))))
+        tag = hmac.new(self._mac_key, nonce + cipher, hashlib.sha256).digest()[:16]
+        return nonce + cipher + tag
+
+    def _open(self, sealed: bytes) -> str:
+        nonce, cipher, tag = sealed[:16], sealed[16:-16], sealed[-16:]
+        expected = hmac.new(self._mac_key, nonce + cipher, hashlib.sha256).digest()[:16]
+        if not hmac.compare_digest(tag, expected):
+            raise ValueError("Webhook vault entry failed authentication (wrong key or corrupted file)")
+        return bytes(a ^ b for a, b in zip(cipher, self._keystream(nonce, len(cipher)))).decode()
+
+    def put(self, webhook_id: str, token: str, channel_id: Optional[str] = None, name: Optional[str] = None):
+        self._db.execute(
+            "INSERT OR REPLACE INTO webhooks VALUES (?, ?, ?, ?, ?)",
+            (webhook_id, channel_id, name, self._seal(token), time.time()),
+        )
+        self._db.commit()
+        self._tokens[webhook_id] = token
+
+    def get(self, webhook_id: str) -> Optional[str]:
+        token = self._tokens.get(webhook_id)
+        if token is None:
+            row = self._db.execute("SELECT token FROM webhooks WHERE webhook_id = ?", (webhook_id,)).fetchone()
+            if row is None:
+                return None
+            token = self._tokens[webhook_id] = self._open(row[0])
+        return token
+
+    def close(self):
+        self._db.close()
+
+
+# ============================================================================
+# Outbox
+# ============================================================================
+
+# Priority lanes, most urgent first
+OUTBOX_LANES = ("moderation", "roles", "messages")
+
+
+class _OutboxItem:
+    """The outbox item a task is working on; ``sent`` once a write went out."""
+
+    __slots__ = ("id", "sent")
+
+    def __init__(self, item_id: int):
+        self.id = item_id
+        self.sent = False
+
+
+# Set while an outbox item runs, so _send_request can record its first write
+CURRENT_OUTBOX_ITEM: contextvars.ContextVar[Optional[_OutboxItem]] = contextvars.ContextVar(
+    "CURRENT_OUTBOX_ITEM", default=None
+)
+
+
+class Outbox:
+    """Durable SQLite (WAL) queue of mutating calls for one bot token.
+    
+    Items move queued -> sending -> done/failed and every transition is
+    committed before the next step. An item becomes "sending" just before
+    its first write request goes out, so after a crash it is either still
+    queued, known to be finished, or possibly applied; recover() decides
+    what to do with the latter. ``owner`` (a token fingerprint) keeps the
+    items of several tokens sharing one file apart.
+    """
+
+    def __init__(self, path: str, owner: str):
+        self.path = path
+        self.owner = owner
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, owner TEXT, lane INTEGER, operation TEXT, input TEXT, "
+            "dedup_key TEXT, state TEXT, created_at REAL, updated_at REAL, result TEXT, error TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS items_state ON items (owner, state, lane, id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS items_dedup ON items (owner, dedup_key)")
+        self._db.commit()
+
+    def add(self, lane: int, operation: str, input_data: dict, dedup_key: Optional[str] = None) -> tuple[int, bool]:
+        """Queue a call and return its ID and whether it is new.
+        
+        With a ``dedup_key`` that an unfailed item already carries, nothing
+        is queued and that item's ID is returned instead.
+        """
+        if dedup_key is not None:
+            row = self._db.execute(
+                "SELECT id FROM items WHERE owner = ? AND dedup_key = ? AND state != 'failed' ORDER BY id DESC LIMIT 1",
+                (self.owner, dedup_key),
+            ).fetchone()
+            if row is not None:
+                return row[0], False
+        now = time.time()
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO items (owner, lane, operation, input, dedup_key, state, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (self.owner, lane, operation, _json_dumps(input_data), dedup_key, now, now),
+            )
+        return cursor.lastrowid, True
+
+    def mark(self, item_id: int, state: str, result: Optional[dict] = None, error: Optional[str] = None):
+        with self._db:
+            self._db.execute(
+                "UPDATE items SET state = ?, updated_at = ?, result = ?, error = ? WHERE id = ?",
+                (state, time.time(), _json_dumps(result) if result is not None else None, error, item_id),
+            )
+
+    def recover(self, idempotent: Callable[[str], bool]) -> list[tuple[int, int, str, dict]]:
+        """Return ``(id, lane, operation, input)`` of the items to replay, in order.
+        
+        Items interrupted while sending are requeued when resending them is
+        harmless and marked "uncertain" otherwise, since Discord may or may
+        not have applied them.
+        """
+        with self._db:
+            for item_id, operation in self._db.execute(
+                "SELECT id, operation FROM items WHERE owner = ? AND state = 'sending'", (self.owner,)
+            ).fetchall():
+                state = "queued" if idempotent(operation) else "uncertain"
+                self._db.execute("UPDATE items SET state = ?, updated_at = ? WHERE id = ?", (state, time.time(), item_id))
+        rows = self._db.execute(
+            "SELECT id, lane, operation, input FROM items WHERE owner = ? AND state = 'queued' ORDER BY id",
+            (self.owner,),
+        ).fetchall()
+        return [(item_id, lane, operation, json.loads(data)) for item_id, lane, operation, data in rows]
+
+    def prune(self, max_age: float) -> int:
+        """Delete finished items older than ``max_age`` seconds."""
+        with self._db:
+            cursor = self._db.execute(
+                "DELETE FROM items WHERE owner = ? AND state IN ('done', 'failed') AND updated_at < ?",
+                (self.owner, time.time() - max_age),
+            )
+        return cursor.rowcount
+
+    def get(self, item_ids: list[int]) -> list[dict]:
+        rows = self._db.execute(
+            f"SELECT id, lane, operation, dedup_key, state, created_at, updated_at, result, error FROM items "
+            f"WHERE owner = ? AND id IN ({', '.join('?' * len(item_ids))})",
+            (self.owner, *item_ids),
+        ).fetchall()
+        return [
+            {"id": item_id, "lane": OUTBOX_LANES[lane], "operation": operation, "dedup_key": dedup_key,
+             "state": state, "created_at": created_at, "updated_at": updated_at,
+             "result": json.loads(result) if result else None, "error": error}
+            for item_id, lane, operation, dedup_key, state, created_at, updated_at, result, error in rows
+        ]
+
+    def counts(self) -> dict:
+        """Item counts by lane and state."""
+        counts = {lane: {} for lane in OUTBOX_LANES}
+        for lane, state, count in self._db.execute(
+            "SELECT lane, state, COUNT(*) FROM items WHERE owner = ? GROUP BY lane, state", (self.owner,)
+        ):
+            counts[OUTBOX_LANES[lane]][state] = count
+        return counts
+
+    def close(self):
+        self._db.close()
+
+
+# ============================================================================
+# Gateway
+# ============================================================================
+
+# Intents: GUILDS covers guild, channel and role events; GUILD_MEMBERS is
+# privileged and has to be enabled for the bot in the developer portal
+INTENT_GUILDS = 1 << 0
+INTENT_GUILD_MEMBERS = 1 << 1
+
+
+class GatewayState:
+    """In-memory guild/channel/role/member state maintained from Gateway events.
+    
+    Entries are replaced, never mutated, so values handed out by get() are
+    safe to keep. A guild's channel and role lists are only answered once
+    its GUILD_CREATE has been seen; members are answered when known.
+    """
+
+    def __init__(self):
+        self.guilds: dict[str, dict] = {}
+        self.channels: dict[str, dict] = {}
+        self.guild_channels: dict[str, set] = {}
+        self.roles: dict[str, dict[str, dict]] = {}
+        self.members: dict[tuple, dict] = {}
+
+    def clear(self):
+        self.__init__()
+
+    def get(self, kind: str, *key: str):
+        """Return the state for a ResponseCache-style key, or None if unknown."""
+        if kind == "guild":
+            return self.guilds.get(key[0])
+        if kind == "channel":
+            return self.channels.get(key[0])
+        if kind == "channels":
+            ids = self.guild_channels.get(key[0])
+            return None if ids is None else [self.channels[c] for c in ids]
+        if kind == "roles":
+            roles = self.roles.get(key[0])
+            return None if roles is None else list(roles.values())
+        if kind == "member":
+            return self.members.get(key)
+        return None
+
+    def apply(self, event: str, data: dict):
+        handler = getattr(self, "_on_" + event.lower(), None)
+        if handler is not None:
+            handler(data)
+
+    def _on_guild_create(self, data: dict):
+        if data.get("unavailable"):
+            return
+        guild_id = data["id"]
+        self._drop_guild(guild_id)
+        self.guilds[guild_id] = {
+            k: v for k, v in data.items() if k not in ("channels", "threads", "roles", "members", "presences")
+        }
+        self.guild_channels[guild_id] = set()
+        for channel in data.get("channels", []):
+            self._on_channel_create({**channel, "guild_id": guild_id})
+        self.roles[guild_id] = {role["id"]: role for role in data.get("roles", [])}
+        for member in data.get("members", []):
+            self._on_guild_member_add({**member, "guild_id": guild_id})
+
+    def _on_guild_update(self, data: dict):
+        self.guilds[data["id"]] = {**self.guilds.get(data["id"], {}), **data}
+
+    def _on_guild_delete(self, data: dict):
+        self._drop_guild(data["id"])
+
+    def _drop_guild(self, guild_id: str):
+        self.guilds.pop(guild_id, None)
+        self.roles.pop(guild_id, None)
+        for channel_id in self.guild_channels.pop(guild_id, ()):
+            self.channels.pop(channel_id, None)
+        for key in [k for k in self.members if k[0] == guild_id]:
+            del self.members[key]
+
+    def _on_channel_create(self, data: dict):
+        self.channels[data["id"]] = data
+        if data.get("guild_id") in self.guild_channels:
+            self.guild_channels[data["guild_id"]].add(data["id"])
+
+    _on_channel_update = _on_channel_create
+
+    def _on_channel_delete(self, data: dict):
+        self.channels.pop(data["id"], None)
+        self.guild_channels.get(data.get("guild_id"), set()).discard(data["id"])
+
+    def _on_guild_role_create(self, data: dict):
+        roles = self.roles.get(data["guild_id"])
+        if roles is not None:
+            roles[data["role"]["id"]] = data["role"]
+
+    _on_guild_role_update = _on_guild_role_create
+
+    def _on_guild_role_delete(self, data: dict):
+        self.roles.get(data["guild_id"], {}).pop(data["role_id"], None)
+        for key, member in self.members.items():
+            if key[0] == data["guild_id"] and data["role_id"] in member.get("roles", ()):
+                self.members[key] = {**member, "roles": [r for r in member["roles"] if r != data["role_id"]]}
+
+    def _on_guild_member_add(self, data: dict):
+        self.members[(data["guild_id"], data["user"]["id"])] = data
+
+    def _on_guild_member_update(self, data: dict):
+        key = (data["guild_id"], data["user"]["id"])
+        self.members[key] = {**self.members.get(key, {}), **data}
+
+    def _on_guild_member_remove(self, data: dict):
+        self.members.pop((data["guild_id"], data["user"]["id"]), None)
+
+    def _on_guild_members_chunk(self, data: dict):
+        for member in data.get("members", []):
+            self._on_guild_member_add({**member, "guild_id": data["guild_id"]})
+
+    def _on_guild_ban_add(self, data: dict):
+        self._on_guild_member_remove(data)
+
+
+class GatewayClient:
+    """Discord Gateway connection that keeps a GatewayState current.
+    
+    Handles HELLO/IDENTIFY, heartbeats with zombie detection, RESUME after
+    drops (so missed events are replayed) and zlib-stream transport
+    compression. ``live`` is true only while the session is established;
+    callers fall back to REST otherwise. ``listeners`` are called with
+    ``(event, data)`` for every dispatch after the state has been updated.
+    """
+
+    ZLIB_SUFFIX = b"\x00\x00\xff\xff"
+    # Close codes after which reconnecting cannot help (bad token, intents, ...)
+    FATAL_CLOSE_CODES = frozenset({4004, 4010, 4011, 4012, 4013, 4014})
+    MAX_BACKOFF = 60.0
+
+    def __init__(self, session: aiohttp.ClientSession, url: str, token: str, intents: int,
+                 state: Optional[GatewayState] = None, listeners: tuple = ()):
+        self.session = session
+        self.url = url.rstrip("/")
+        self.token = token
+        self.intents = intents
+        self.state = state or GatewayState()
+        self.listeners = list(listeners)
+        self.session_id: Optional[str] = None
+        self.resume_url: Optional[str] = None
+        self.seq: Optional[int] = None
+        self.live = False
+        self.ready = asyncio.Event()
+        self.error: Optional[str] = None
+        self.fatal = False
+        self.events = 0
+        self.reconnects = 0
+        self.latency: Optional[float] = None
+        self._acked = True
+        self._heartbeat_sent_at = 0.0
+        self._ws = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        self._closing = True
+        self.live = False
+        if self._ws is not None:
+            await self._ws.close()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "live": self.live,
+            "session_id": self.session_id,
+            "seq": self.seq,
+            "events": self.events,
+            "reconnects": self.reconnects,
+            "latency_ms": round(self.latency * 1000, 3) if self.latency is not None else None,
+            "guilds": len(self.state.guilds),
+            "channels": len(self.state.channels),
+            "members": len(self.state.members),
+            "error": self.error,
+            "fatal": self.fatal,
+        }
+
+    async def _run(self):
+        backoff = 1.0
+        while not self._closing:
+            try:
+                await self._connect()
+                backoff = 1.0
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+            self.live = False
+            if self._closing or self.fatal:
+                return
+            self.reconnects += 1
+            await asyncio.sleep(random.uniform(0, backoff))
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+    async def _connect(self):
+        base = self.resume_url if self.session_id and self.resume_url else self.url
+        url = f"{base.rstrip('/')}?v=10&encoding=json&compress=zlib-stream"
+        inflator = zlib.decompressobj()
+        buffer = bytearray()
+        heartbeat = None
+        async with self.session.ws_connect(url, max_msg_size=0, autoping=True) as ws:
+            self._ws = ws
+            try:
+                async for message in ws:
+                    if message.type == aiohttp.WSMsgType.BINARY:
+                        buffer.extend(message.data)
+                        if not buffer.endswith(self.ZLIB_SUFFIX):
+                            continue
+                        payload = inflator.decompress(buffer)
+                        buffer.clear()
+                    elif message.type == aiohttp.WSMsgType.TEXT:
+                        payload = message.data
+                    else:
+                        break
+                    heartbeat = await self._handle(ws, json.loads(payload), heartbeat)
+            finally:
+                if heartbeat is not None:
+                    heartbeat.cancel()
+                self._ws = None
+        if ws.close_code in self.FATAL_CLOSE_CODES:
+            self.error = f"Gateway closed the connection with code {ws.close_code}"
+            self.fatal = True
+
+    async def _handle(self, ws, payload: dict, heartbeat: Optional[asyncio.Task]) -> Optional[asyncio.Task]:
+        op, data = payload.get("op"), payload.get("d")
+        if op == 0:
+            self.seq = payload.get("s") or self.seq
+            event = payload.get("t")
+            if event == "READY":
+                self.session_id = data["session_id"]
+                self.resume_url = data.get("resume_gateway_url")
+                self.state.clear()
+            if event in ("READY", "RESUMED"):
+                self.live = True
+                self.error = None
+                self.ready.set()
+            self.events += 1
+            self.state.apply(event, data)
+            for listener in self.listeners:
+                listener(event, data)
+        elif op == 10:
+            self._acked = True
+            heartbeat = asyncio.ensure_future(self._heartbeat(ws, data["heartbeat_interval"] / 1000))
+            if self.session_id and self.seq is not None:
+                await ws.send_str(_json_dumps({"op": 6, "d": {
+                    "token": self.token, "session_id": self.session_id, "seq": self.seq,
+                }}))
+            else:
+                await ws.send_str(_json_dumps({"op": 2, "d": {
+                    "token": self.token,
+                    "intents": self.intents,
+                    "properties": {"os": sys.platform, "browser": "discord-admin", "device": "discord-admin"},
+                }}))
+        elif op == 11:
+            self._acked = True
+            self.latency = time.monotonic() - self._heartbeat_sent_at
+        elif op == 1:
+            await ws.send_str(_json_dumps({"op": 1, "d": self.seq}))
+        elif op == 7:
+            # Reconnect requested; a non-1000 close keeps the session resumable
+            await ws.close(code=4000)
+        elif op == 9:
+            if not data:
+                self.session_id = self.seq = None
+            await asyncio.sleep(random.uniform(1, 5))
+            await ws.close(code=4000)
+        return heartbeat
+
+    async def _heartbeat(self, ws, interval: float):
+        await asyncio.sleep(interval * random.random())
+        while not ws.closed:
+            if not self._acked:
+                # No ACK since the last beat: the connection is a zombie
+                self.live = False
+                await ws.close(code=4000)
+                return
+            self._acked = False
+            self._heartbeat_sent_at = time.monotonic()
+            await ws.send_str(_json_dumps({"op": 1, "d": self.seq}))
+            await asyncio.sleep(interval)
+
+
+# ============================================================================
+# Member Index
+# ============================================================================
+
+# Marks the start of a name so prefixes get trigrams of their own
+NAME_START = "\x02"
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _bitmap(ordinals: Iterable[int], size: int) -> int:
+    """Build the int with bits ``ordinals`` set in one pass (no repeated ``|=``)."""
+    buffer = bytearray((size + 7) // 8)
+    for ordinal in ordinals:
+        buffer[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def _bit_ordinals(bits: int) -> Iterator[int]:
+    """Yield the set bit positions of ``bits`` in ascending order."""
+    # Walk the bytes: clearing bits one by one in the big int copies it each time
+    for offset, byte in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, "little")):
+        while byte:
+            low = byte & -byte
+            yield (offset << 3) + low.bit_length() - 1
+            byte ^= low
+
+
+class MemberIndex:
+    """Searchable in-memory copy of one guild's members.
+    
+    Every member gets an ordinal. Name trigrams map to posting lists of
+    ordinals (``array('I')``), intersected starting from the rarest, so
+    memory grows with the number of names rather than trigrams x members.
+    Role membership, bots and live members are Python ints used as bitmaps
+    over the ordinals, so role set algebra is a handful of big-integer
+    ANDs/ORs; only the surviving candidates are checked against the full
+    pattern and join window.
+    
+    Ordinals of removed members are not reused until the next rebuild, and
+    postings are append-only: stale entries are filtered out by ``alive``
+    and the final pattern check. Between start_loading() and
+    finish_loading() the bitmaps are left alone and then built in one pass.
+    """
+
+    def __init__(self, guild_id: str):
+        self.guild_id = guild_id
+        self.built_at = time.monotonic()
+        self.records: list[Optional[dict]] = []
+        self.ordinals: dict[str, int] = {}
+        self.alive = 0
+        self.bots = 0
+        self.role_bits: dict[str, int] = {}
+        self.trigrams: dict[str, array] = {}
+        self.updates = 0
+        self._loading = False
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    @staticmethod
+    def _names(record: dict) -> set[str]:
+        return {
+            NAME_START + name.lower()
+            for name in (record["username"], record["global_name"], record["nick"]) if name
+        }
+
+    def _post_names(self, ordinal: int, names: set[str]):
+        for gram in set().union(*map(_trigrams, names)):
+            postings = self.trigrams.get(gram)
+            if postings is None:
+                postings = self.trigrams[gram] = array("I")
+            postings.append(ordinal)
+
+    def _set_roles(self, ordinal: int, roles: tuple, add: bool):
+        if self._loading:
+            return
+        bit = 1 << ordinal
+        for role_id in roles:
+            if add:
+                self.role_bits[role_id] = self.role_bits.get(role_id, 0) | bit
+            else:
+                self.role_bits[role_id] &= ~bit
+
+    def start_loading(self):
+        """Defer bitmap updates for a bulk load; see finish_loading."""
+        self._loading = True
+
+    def finish_loading(self):
+        """Build the live, bot and role bitmaps from the records in one pass."""
+        self._loading = False
+        alive, bots, roles = [], [], {}
+        for ordinal, record in enumerate(self.records):
+            if record is None:
+                continue
+            alive.append(ordinal)
+            if record["bot"]:
+                bots.append(ordinal)
+            for role_id in record["roles"]:
+                roles.setdefault(role_id, []).append(ordinal)
+        size = len(self.records)
+        self.alive = _bitmap(alive, size)
+        self.bots = _bitmap(bots, size)
+        self.role_bits = {role_id: _bitmap(ordinals, size) for role_id, ordinals in roles.items()}
+
+    def put(self, member: dict):
+        """Add a member as returned by the API, replacing any previous version."""
+        user = member["user"]
+        self.remove(user["id"])
+        joined_at = member.get("joined_at")
+        record = {
+            "user_id": user["id"],
+            "username": user.get("username"),
+            "global_name": user.get("global_name"),
+            "nick": member.get("nick"),
+            "bot": bool(user.get("bot")),
+            "roles": tuple(member.get("roles", ())),
+            "joined_at": joined_at,
+            "joined": datetime.fromisoformat(joined_at.replace("Z", "+00:00")).timestamp() if joined_at else None,
+        }
+        ordinal = len(self.records)
+        self.records.append(record)
+        self.ordinals[record["user_id"]] = ordinal
+        self._post_names(ordinal, self._names(record))
+        if not self._loading:
+            self.alive |= 1 << ordinal
+            if record["bot"]:
+                self.bots |= 1 << ordinal
+        self._set_roles(ordinal, record["roles"], True)
+
+    def remove(self, user_id: str):
+        ordinal = self.ordinals.pop(user_id, None)
+        if ordinal is None:
+            return
+        record = self.records[ordinal]
+        self.records[ordinal] = None
+        if not self._loading:
+            self.alive &= ~(1 << ordinal)
+            self.bots &= ~(1 << ordinal)
+        self._set_roles(ordinal, record["roles"], False)
+        self.updates += 1
+
+    def update(self, user_id: str, add_role: Optional[str] = None, remove_role: Optional[str] = None, **changes):
+        """Apply our own change to an indexed member, if it is indexed."""
+        ordinal = self.ordinals.get(user_id)
+        if ordinal is None:
+            return
+        record = self.records[ordinal]
+        if add_role is not None and add_role not in record["roles"]:
+            record["roles"] += (add_role,)
+            self._set_roles(ordinal, (add_role,), True)
+        if remove_role is not None and remove_role in record["roles"]:
+            record["roles"] = tuple(r for r in record["roles"] if r != remove_role)
+            self._set_roles(ordinal, (remove_role,), False)
+        if "nick" in changes:
+            old = self._names(record)
+            record["nick"] = changes["nick"]
+            self._post_names(ordinal, self._names(record) - old)
+        self.updates += 1
+
+    def _name_candidates(self, pattern: str) -> Optional[set]:
+        """Ordinals whose names may match ``pattern``, or None for no constraint.
+        
+        Every literal run of three or more characters must appear as
+        trigrams in some name; the full glob is checked afterwards.
+        """
+        anchored = NAME_START + pattern if not pattern.startswith("*") else pattern
+        grams = set().union(*map(_trigrams, re.split(r"[*?]+", re.sub(r"\[[^\]]*\]", "?", anchored))))
+        if not grams:
+            return None
+        postings = sorted((self.trigrams.get(gram, ()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for other in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(other)
+        return candidates
+
+    def search(
+        self,
+        name: Optional[str] = None,
+        all_roles: Iterable[str] = (),
+        any_roles: Iterable[str] = (),
+        exclude_roles: Iterable[str] = (),
+        no_roles: bool = False,
+        include_bots: bool = True,
+        joined_after: Optional[float] = None,
+        joined_before: Optional[float] = None,
+    ) -> Iterator[dict]:
+        """Yield matching member records in ascending ordinal (user ID) order.
+        
+        ``name`` is a case-insensitive glob on username, display name or nick;
+        without wildcards it matches names starting with it.
+        """
+        bits = self.alive
+        if not include_bots:
+            bits &= ~self.bots
+        for role_id in all_roles:
+            bits &= self.role_bits.get(role_id, 0)
+        any_roles = list(any_roles)
+        if any_roles:
+            union = 0
+            for role_id in any_roles:
+                union |= self.role_bits.get(role_id, 0)
+            bits &= union
+        for role_id in exclude_roles:
+            bits &= ~self.role_bits.get(role_id, 0)
+        if no_roles:
+            for role_bits in self.role_bits.values():
+                bits &= ~role_bits
+        pattern = None
+        if name:
+            pattern = name.lower()
+            if not any(c in pattern for c in "*?["):
+                pattern += "*"
+            candidates = self._name_candidates(pattern)
+            if candidates is not None:
+                bits &= _bitmap(candidates, len(self.records))
+        
+        for ordinal in _bit_ordinals(bits):
+            record = self.records[ordinal]
+            if joined_after is not None or joined_before is not None:
+                joined = record["joined"]
+                if joined is None or (joined_after is not None and joined <= joined_after) or (
+                    joined_before is not None and joined >= joined_before
+                ):
+                    continue
+            if pattern and not any(fnmatch.fnmatchcase(n[1:], pattern) for n in self._names(record)):
+                continue
+            yield record
+
+
+# ============================================================================
+# Worker Pool
+# ============================================================================
+
+class HashRing:
+    """Consistent hash ring; adding or removing a node only moves ~1/n of keys."""
+
+    def __init__(self, nodes: list[str], replicas: int = 100):
+        self._ring = sorted(
+            (int.from_bytes(hashlib.blake2b(f"{node}#{i}".encode(), digest_size=8).digest(), "big"), index)
+            for index, node in enumerate(nodes)
+            for i in range(replicas)
+        )
+        self._points = [point for point, _ in self._ring]
+
+    def node_for(self, key: str) -> int:
+        """Index of the node that owns ``key``."""
+        point = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+        position = bisect.bisect(self._points, point) % len(self._points)
+        return self._ring[position][1]
+
+
+def _encode_error(error: Exception) -> tuple[str, str, dict]:
+    if isinstance(error, DiscordAPIError):
+        return "DiscordAPIError", str(error), {
+            "status": error.status, "message": error.message, "code": error.code,
+            "retry_after": error.retry_after, "method": error.method, "route": error.route,
+            "errors": error.errors,
+        }
+    return type(error).__name__, str(error), {}
+
+
+def _decode_error(name: str, text: str, attrs: dict) -> Exception:
+    if name == "DiscordAPIError":
+        return DiscordAPIError(**attrs)
+    error_class = getattr(builtins, name, None)
+    if isinstance(error_class, type) and issubclass(error_class, Exception):
+        return error_class(text)
+    return RuntimeError(f"{name}: {text}")
+
+
+class _PipeMetadata:
+    """Metadata stand-in in a worker; log lines go back to the caller."""
+
+    def __init__(self, conn, call_id: Optional[int]):
+        self._conn = conn
+        self._call_id = call_id
+
+    def log(self, message: str):
+        self._conn.send((self._call_id, "log", message))
+
+
+def _pool_worker(conn, app_class: type, token: str):
+    """Process entry point: run one App on ``token`` and serve calls from ``conn``."""
+    os.environ["DISCORD_BOT_TOKEN"] = token
+    os.environ.pop("DISCORD_BOT_TOKENS", None)
+    # The parent queues outbox items; a second owner would replay them too
+    os.environ.pop("DISCORD_OUTBOX", None)
+    asyncio.run(_serve_pool_worker(conn, app_class))
+
+
+async def _serve_pool_worker(conn, app_class: type):
+    loop = asyncio.get_running_loop()
+    app = app_class()
+    try:
+        await app.setup(_PipeMetadata(conn, None))
+    except Exception as e:
+        conn.send((None, "error", _encode_error(e)))
+        return
+    conn.send((None, "ready", None))
+
+    async def run(call_id: int, name: str, data: dict):
+        method = getattr(app, name)
+        try:
+            input_data = get_type_hints(getattr(app_class, name))["input_data"].model_validate(data)
+            output = await method(input_data, _PipeMetadata(conn, call_id))
+            conn.send((call_id, "ok", output.model_dump()))
+        except Exception as e:
+            conn.send((call_id, "error", _encode_error(e)))
+
+    requests: asyncio.Queue = asyncio.Queue()
+    loop.add_reader(conn.fileno(), lambda: requests.put_nowait(conn.recv()))
+    tasks = set()
+    try:
+        while True:
+            message = await requests.get()
+            if message is None:
+                break
+            task = asyncio.ensure_future(run(*message))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        loop.remove_reader(conn.fileno())
+        for task in tasks:
+            task.cancel()
+        await app.unload()
+        conn.close()
+
+
+class WorkerPool:
+    """Worker processes, one per bot token, each with its own App.
+    
+    Every worker has its own event loop, session, rate limiter and caches,
+    so each token gets its full rate limits and JSON work is spread over
+    cores. Calls are entry-point name plus input, sent over a pipe.
+    """
+
+    def __init__(self, app_class: type, tokens: list[str], start_method: str = "spawn"):
+        self.app_class = app_class
+        self.tokens = tokens
+        self.start_method = start_method
+        # Keyed by a digest of the token, so the ring never holds the secret
+        # and a token keeps its guilds when others are added or removed
+        self.ring = HashRing([hashlib.sha256(token.encode()).hexdigest() for token in tokens])
+        self.calls = [0] * len(tokens)
+        self._processes = []
+        self._conns = []
+        # call ID -> (future, metadata, worker index)
+        self._pending: dict[int, tuple] = {}
+        self._ready = []
+        self._next_id = 0
+
+    async def start(self, timeout: float):
+        context = multiprocessing.get_context(self.start_method)
+        loop = asyncio.get_running_loop()
+        for index, token in enumerate(self.tokens):
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=_pool_worker, args=(child, self.app_class, token), name=f"discord-worker-{index}", daemon=True
+            )
+            process.start()
+            child.close()
+            self._processes.append(process)
+            self._conns.append(parent)
+            self._ready.append(loop.create_future())
+            loop.add_reader(parent.fileno(), self._on_readable, index)
+        try:
+            await asyncio.wait_for(asyncio.gather(*self._ready), timeout)
+        except BaseException:
+            await self.close()
+            raise
+
+    def _on_readable(self, index: int):
+        conn = self._conns[index]
+        try:
+            call_id, kind, payload = conn.recv()
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+            error = RuntimeError(f"Worker {index} exited")
+            for future, _, worker in self._pending.values():
+                if worker == index and not future.done():
+                    future.set_exception(error)
+            if not self._ready[index].done():
+                self._ready[index].set_exception(error)
+            return
+        if call_id is None:
+            if kind == "ready":
+                self._ready[index].set_result(None)
+            elif kind == "error" and not self._ready[index].done():
+                self._ready[index].set_exception(_decode_error(*payload))
+            return
+        future, metadata, _ = self._pending.get(call_id, (None, None, None))
+        if future is None:
+            return
+        if kind == "log":
+            metadata.log(payload)
+            return
+        del self._pending[call_id]
+        if future.done():
+            return
+        if kind == "ok":
+            future.set_result(payload)
+        else:
+            future.set_exception(_decode_error(*payload))
+
+    def worker_for(self, key: str) -> int:
+        return self.ring.node_for(key)
+
+    async def call(self, worker: int, name: str, input_data: BaseModel, metadata) -> dict:
+        """Run entry point ``name`` in ``worker`` and return its output as a dict."""
+        self._next_id += 1
+        call_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[call_id] = (future, metadata, worker)
+        self.calls[worker] += 1
+        self._conns[worker].send((call_id, name, input_data.model_dump()))
+        try:
+            # The worker finishes the call regardless; its result is dropped
+            return await future
+        finally:
+            self._pending.pop(call_id, None)
+
+    async def close(self, timeout: float = 10.0):
+        loop = asyncio.get_running_loop()
+        for conn in self._conns:
+            try:
+                loop.remove_reader(conn.fileno())
+                conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+        for conn in self._conns:
+            conn.close()
+        self._processes, self._conns = [], []
+
+
+def _merge_prometheus(texts: list[str]) -> str:
+    """Combine per-worker Prometheus texts, labelling samples with the worker."""
+    families: dict[str, list] = {}
+    for index, text in enumerate(texts):
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# "):
+                family = line.split(" ", 3)[2]
+                lines = families.setdefault(family, [])
+                if line not in lines:
+                    lines.append(line)
+            elif line:
+                name, rest = line.split("{", 1) if "{" in line else line.split(" ", 1)
+                labelled = f'{name}{{worker="{index}",{rest}' if "{" in line else f'{name}{{worker="{index}"}} {rest}'
+                families[family].append(labelled)
+    return "".join(line + "\n" for lines in families.values() for line in lines)
+
+
+# ============================================================================
+# Guild Layout
+# ============================================================================
+
+# Snapshot format version; bump when the layout below changes incompatibly
+LAYOUT_VERSION = 1
+ROLE_FIELDS = ("permissions", "color", "hoist", "mentionable")
+CHANNEL_FIELDS = ("topic", "nsfw", "rate_limit_per_user", "bitrate", "user_limit")
+CATEGORY_CHANNEL = 4
+
+
+def _layout_overwrites(channel: dict, role_names: dict) -> list:
+    """A channel's permission overwrites with roles referenced by name."""
+    overwrites = []
+    for overwrite in channel.get("permission_overwrites", []):
+        if overwrite.get("type", 0) == 0:
+            entry = {"role": role_names.get(overwrite["id"], overwrite["id"])}
+        else:
+            entry = {"member": overwrite["id"]}
+        entry["allow"] = str(overwrite.get("allow", "0"))
+        entry["deny"] = str(overwrite.get("deny", "0"))
+        overwrites.append(entry)
+    return sorted(overwrites, key=_json_dumps)
+
+
+def snapshot_layout(guild: dict, channels: list, roles: list) -> dict:
+    """Portable description of a guild's roles, channels and overwrites.
+    
+    Roles and overwrites refer to each other by role name and channels to
+    their category by name, so a snapshot can be applied to another guild.
+    Managed (integration) roles are left out.
+    """
+    role_names = {role["id"]: role["name"] for role in roles}
+    channel_names = {channel["id"]: channel["name"] for channel in channels}
+    layout_roles = [
+        {"name": role["name"], "position": role.get("position", 0),
+         **{field: role[field] for field in ROLE_FIELDS if field in role}}
+        for role in sorted(roles, key=lambda r: (r.get("position", 0), int(r["id"])))
+        if not role.get("managed")
+    ]
+    layout_channels = []
+    # Categories first, so applying a snapshot creates parents before children
+    for channel in sorted(channels, key=lambda c: (c.get("type") != CATEGORY_CHANNEL,
+                                                   c.get("position", 0), int(c["id"]))):
+        entry = {"name": channel["name"], "type": channel.get("type", 0), "position": channel.get("position", 0)}
+        if channel.get("parent_id"):
+            entry["parent"] = channel_names.get(channel["parent_id"])
+        entry.update({field: channel[field] for field in CHANNEL_FIELDS if field in channel})
+        overwrites = _layout_overwrites(channel, role_names)
+        if overwrites:
+            entry["overwrites"] = overwrites
+        layout_channels.append(entry)
+    return {
+        "version": LAYOUT_VERSION,
+        "guild": {"id": guild.get("id"), "name": guild.get("name")},
+        "roles": layout_roles,
+        "channels": layout_channels,
+    }
+
+
+def _take_match(candidates: list, prefer) -> Optional[dict]:
+    """Pop the first candidate satisfying ``prefer``, else the first one."""
+    if not candidates:
+        return None
+    for i, candidate in enumerate(candidates):
+        if prefer(candidate):
+            return candidates.pop(i)
+    return candidates.pop(0)
+
+
+def plan_layout(layout: dict, channels: list, roles: list, delete_missing: bool = False) -> tuple[list, dict, dict]:
+    """Operations that turn the live ``channels``/``roles`` into ``layout``.
+    
+    Live objects are matched to the layout by name (channels by type and
+    name, preferring the same category); only differing fields are patched
+    and position or category moves are collected into one bulk update per
+    kind. Each operation has a ``stage``; stages must run in order, the
+    operations within one can run concurrently. ``ref`` is the index of
+    the role or channel in the layout, which later stages use to find IDs
+    of objects created earlier.
+    
+    Returns ``(operations, role_ids, channel_ids)``, the last two mapping
+    refs of matched layout entries to live IDs.
+    """
+    if layout.get("version") != LAYOUT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {layout.get('version')!r}")
+    ops = []
+
+    # Roles, matched by name; @everyone always exists and never moves
+    live_roles: dict[str, list] = {}
+    for role in sorted(roles, key=lambda r: (r.get("position", 0), int(r["id"]))):
+        if not role.get("managed"):
+            live_roles.setdefault(role["name"], []).append(role)
+    role_ids, channel_ids = {}, {}
+    role_moves = []
+    for ref, want in enumerate(layout.get("roles", [])):
+        fields = {field: want[field] for field in ROLE_FIELDS if field in want}
+        have = _take_match(live_roles.get(want["name"], []), lambda role: True)
+        if have is not None:
+            role_ids[ref] = have["id"]
+        if have is None and want["name"] == "@everyone":
+            continue
+        if have is None:
+            ops.append({"stage": 1, "op": "create_role", "ref": ref, "name": want["name"],
+                        "payload": {"name": want["name"], **fields}})
+        else:
+            changes = {k: v for k, v in fields.items() if str(have.get(k)) != str(v)}
+            if changes:
+                ops.append({"stage": 1, "op": "patch_role", "ref": ref, "id": have["id"], "name": want["name"],
+                            "payload": changes})
+        if want["name"] != "@everyone" and (have is None or have.get("position") != want.get("position")):
+            role_moves.append({"ref": ref, "position": want.get("position", 0)})
+    if role_moves:
+        ops.append({"stage": 2, "op": "move_roles", "name": f"{len(role_moves)} roles", "moves": role_moves})
+
+    # Channels, matched by type and name, preferring the same category
+    live_by_id = {channel["id"]: channel for channel in channels}
+    role_names = {role["id"]: role["name"] for role in roles}
+    live_channels: dict[tuple, list] = {}
+    for channel in sorted(channels, key=lambda c: (c.get("position", 0), int(c["id"]))):
+        live_channels.setdefault((channel.get("type", 0), channel["name"]), []).append(channel)
+    category_refs = {}
+    channel_moves = []
+    for ref, want in enumerate(layout.get("channels", [])):
+        is_category = want.get("type", 0) == CATEGORY_CHANNEL
+        if is_category:
+            category_refs.setdefault(want["name"], ref)
+        parent = want.get("parent")
+        fields = {field: want[field] for field in CHANNEL_FIELDS if field in want}
+        overwrites = want.get("overwrites", [])
+
+        def same_parent(channel):
+            current = live_by_id.get(channel.get("parent_id"))
+            return (current["name"] if current else None) == parent
+
+        have = _take_match(live_channels.get((want.get("type", 0), want["name"]), []), same_parent)
+        stage = 3 if is_category else 4
+        if have is None:
+            ops.append({"stage": stage, "op": "create_channel", "ref": ref, "name": want["name"], "payload": {
+                "name": want["name"], "type": want.get("type", 0), "position": want.get("position", 0), **fields,
+            }, "parent": parent, "overwrites": overwrites})
+            continue
+        channel_ids[ref] = have["id"]
+        changes = {k: v for k, v in fields.items() if have.get(k) != v}
+        op = {"stage": stage, "op": "patch_channel", "ref": ref, "id": have["id"], "name": want["name"],
+              "payload": changes}
+        if _layout_overwrites(have, role_names) != sorted(overwrites, key=_json_dumps):
+            op["overwrites"] = overwrites
+        if changes or "overwrites" in op:
+            ops.append(op)
+        if have.get("position") != want.get("position", 0) or not same_parent(have):
+            channel_moves.append({"ref": ref, "position": want.get("position", 0), "parent": parent})
+    for op in ops:
+        if op["op"] == "create_channel" and op["parent"] is not None:
+            op["parent_ref"] = category_refs.get(op["parent"])
+    for move in channel_moves:
+        move["parent_ref"] = category_refs.get(move["parent"]) if move["parent"] is not None else None
+    if channel_moves:
+        ops.append({"stage": 5, "op": "move_channels", "name": f"{len(channel_moves)} channels",
+                    "moves": channel_moves})
+
+    if delete_missing:
+        # Children before their categories, channels before the roles they reference
+        for candidates in live_channels.values():
+            for channel in candidates:
+                stage = 7 if channel.get("type") == CATEGORY_CHANNEL else 6
+                ops.append({"stage": stage, "op": "delete_channel", "id": channel["id"], "name": channel["name"]})
+        for name, candidates in live_roles.items():
+            for role in candidates:
+                if name != "@everyone":
+                    ops.append({"stage": 8, "op": "delete_role", "id": role["id"], "name": name})
+    return sorted(ops, key=lambda op: op["stage"]), role_ids, channel_ids
+
+
+# ============================================================================
+# Permissions
+# ============================================================================
+
+PERMISSION_FLAGS = {
+    name: 1 << bit for bit, name in enumerate((
+        "CREATE_INSTANT_INVITE", "KICK_MEMBERS", "BAN_MEMBERS", "ADMINISTRATOR",
+        "MANAGE_CHANNELS", "MANAGE_GUILD", "ADD_REACTIONS", "VIEW_AUDIT_LOG",
+        "PRIORITY_SPEAKER", "STREAM", "VIEW_CHANNEL", "SEND_MESSAGES",
+        "SEND_TTS_MESSAGES", "MANAGE_MESSAGES", "EMBED_LINKS", "ATTACH_FILES",
+        "READ_MESSAGE_HISTORY", "MENTION_EVERYONE", "USE_EXTERNAL_EMOJIS", "VIEW_GUILD_INSIGHTS",
+        "CONNECT", "SPEAK", "MUTE_MEMBERS", "DEAFEN_MEMBERS",
+        "MOVE_MEMBERS", "USE_VAD", "CHANGE_NICKNAME", "MANAGE_NICKNAMES",
+        "MANAGE_ROLES", "MANAGE_WEBHOOKS", "MANAGE_GUILD_EXPRESSIONS", "USE_APPLICATION_COMMANDS",
+        "REQUEST_TO_SPEAK", "MANAGE_EVENTS", "MANAGE_THREADS", "CREATE_PUBLIC_THREADS",
+        "CREATE_PRIVATE_THREADS", "USE_EXTERNAL_STICKERS", "SEND_MESSAGES_IN_THREADS", "USE_EMBEDDED_ACTIVITIES",
+        "MODERATE_MEMBERS", "VIEW_CREATOR_MONETIZATION_ANALYTICS", "USE_SOUNDBOARD", "CREATE_GUILD_EXPRESSIONS",
+        "CREATE_EVENTS", "USE_EXTERNAL_SOUNDS", "SEND_VOICE_MESSAGES", None,
+        None, "SEND_POLLS", "USE_EXTERNAL_APPS",
+    )) if name
+}
+ALL_PERMISSIONS = sum(PERMISSION_FLAGS.values())
+ADMINISTRATOR = PERMISSION_FLAGS["ADMINISTRATOR"]
+VIEW_CHANNEL = PERMISSION_FLAGS["VIEW_CHANNEL"]
+# All a timed-out member keeps
+TIMEOUT_PERMISSIONS = VIEW_CHANNEL | PERMISSION_FLAGS["READ_MESSAGE_HISTORY"]
+
+
+def permission_names(bits: int) -> list[str]:
+    """Names of the flags set in ``bits``."""
+    return [name for name, flag in PERMISSION_FLAGS.items() if bits & flag]
+
+
+class MissingPermissions(DiscordAPIError):
+    """A call the bot is not allowed to make, caught before it was sent.
+    
+    Shaped like Discord's own 403 (code 50013) so callers handle both alike;
+    ``missing`` names the absent flags (empty for role hierarchy failures).
+    """
+
+    def __init__(self, message: str, missing: list, method: str, route: str):
+        super().__init__(403, message, code=50013, method=method, route=route)
+        self.missing = missing
+
+
+class PermissionEngine:
+    """Effective permissions of members in one guild, computed locally.
+    
+    Built from the guild, role and channel objects the app already caches;
+    roles and overwrites are pre-parsed to ints once so each member/channel
+    pair is a few ANDs and ORs, following Discord's documented order:
+    @everyone, member roles, then @everyone, role and member overwrites.
+    """
+
+    def __init__(self, guild: dict, roles: list, channels: list):
+        self.guild_id = guild["id"]
+        self.owner_id = guild.get("owner_id")
+        self.role_bits = {role["id"]: int(role.get("permissions", 0)) for role in roles}
+        self.role_positions = {role["id"]: role.get("position", 0) for role in roles}
+        self.managed_roles = {role["id"] for role in roles if role.get("managed")}
+        self.everyone = self.role_bits.get(self.guild_id, 0)
+        # channel ID -> (@everyone allow, deny, {role: (allow, deny)}, {member: (allow, deny)})
+        self.overwrites = {}
+        for channel in channels:
+            everyone = (0, 0)
+            role_overwrites, member_overwrites = {}, {}
+            for overwrite in channel.get("permission_overwrites", []):
+                pair = (int(overwrite.get("allow", 0)), int(overwrite.get("deny", 0)))
+                if overwrite.get("type", 0) == 1:
+                    member_overwrites[overwrite["id"]] = pair
+                elif overwrite["id"] == self.guild_id:
+                    everyone = pair
+                else:
+                    role_overwrites[overwrite["id"]] = pair
+            self.overwrites[channel["id"]] = (*everyone, role_overwrites, member_overwrites)
+
+    def _timed_out(self, member: dict) -> bool:
+        until = member.get("communication_disabled_until")
+        return bool(until) and datetime.fromisoformat(until.replace("Z", "+00:00")).timestamp() > time.time()
+
+    def base(self, member: dict) -> int:
+        """Guild-wide permissions of ``member``."""
+        if member["user"]["id"] == self.owner_id:
+            return ALL_PERMISSIONS
+        bits = self.everyone
+        for role_id in member.get("roles", ()):
+            bits |= self.role_bits.get(role_id, 0)
+        if bits & ADMINISTRATOR:
+            return ALL_PERMISSIONS
+        if self._timed_out(member):
+            bits &= TIMEOUT_PERMISSIONS
+        return bits
+
+    def channel(self, member: dict, channel_id: str, base: Optional[int] = None) -> int:
+        """Permissions of ``member`` in a channel of this guild."""
+        if base is None:
+            base = self.base(member)
+        if base & ADMINISTRATOR:
+            return ALL_PERMISSIONS
+        everyone_allow, everyone_deny, role_overwrites, member_overwrites = self.overwrites.get(
+            channel_id, (0, 0, {}, {})
+        )
+        bits = (base & ~everyone_deny) | everyone_allow
+        allow = deny = 0
+        for role_id in member.get("roles", ()):
+            pair = role_overwrites.get(role_id)
+            if pair:
+                allow |= pair[0]
+                deny |= pair[1]
+        bits = (bits & ~deny) | allow
+        pair = member_overwrites.get(member["user"]["id"])
+        if pair:
+            bits = (bits & ~pair[1]) | pair[0]
+        if self._timed_out(member):
+            bits &= TIMEOUT_PERMISSIONS
+        # Without View Channel nothing else in the channel applies
+        return bits if bits & VIEW_CHANNEL else 0
+
+    def compute(self, members: Iterable[dict], channel_ids: Iterable[str]) -> dict[str, tuple[int, dict[str, int]]]:
+        """Guild and per-channel permissions for every member and channel.
+        
+        Returns ``{user_id: (guild_bits, {channel_id: bits})}``.
+        """
+        channel_ids = list(channel_ids)
+        result = {}
+        for member in members:
+            base = self.base(member)
+            result[member["user"]["id"]] = (
+                base, {channel_id: self.channel(member, channel_id, base) for channel_id in channel_ids}
+            )
+        return result
+
+    def top_position(self, member: dict) -> float:
+        """Position of the member's highest role; the owner outranks everyone."""
+        if member["user"]["id"] == self.owner_id:
+            return float("inf")
+        return max((self.role_positions.get(r, 0) for r in member.get("roles", ())), default=0)
+
+
+# ============================================================================
+# App
+# ============================================================================
+
+class _PendingWrite:
+    """A coalesced write not sent yet; later writes merge into ``data``."""
+
+    __slots__ = ("data", "send_at", "future", "wake", "task", "callers")
+
+    def __init__(self, data: dict, send_at: float):
+        self.data = data
+        self.send_at = send_at
+        self.future = asyncio.get_running_loop().create_future()
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.callers = 1
+
+
+class App(BaseApp):
+    API_BASE = "https://discord.com/api/v10"
+    # Requests per second allowed across all routes for one bot token
+    GLOBAL_RATE_LIMIT = 50
+    MAX_RATE_LIMIT_RETRIES = 5
+    # Transient failures (5xx, resets, timeouts) of idempotent calls are retried
+    # with full-jitter exponential backoff until MAX_RETRIES or the deadline
+    MAX_RETRIES = 4
+    RETRY_BASE_DELAY = 0.5
+    RETRY_MAX_DELAY = 8.0
+    RETRY_DEADLINE = 60.0
+    # Bulk operations log progress every this many completed items
+    PROGRESS_INTERVAL = 100
+    # Maximum page sizes accepted by the list endpoints
+    MEMBERS_PAGE_SIZE = 1000
+    BANS_PAGE_SIZE = 1000
+    MESSAGES_PAGE_SIZE = 100
+    # Bulk-delete accepts at most this many messages younger than BULK_DELETE_MAX_AGE
+    BULK_DELETE_SIZE = 100
+    BULK_DELETE_MAX_AGE = 14 * 24 * 3600 - 60
+    # Single deletes in flight at once when purging old messages
+    PURGE_CONCURRENCY = 5
+    # Users per bulk-ban request, and bulk-ban requests (or single bans and
+    # kicks) in flight at once during mass moderation
+    BULK_BAN_SIZE = 200
+    MASS_MODERATION_CONCURRENCY = 10
+    # Entry points run_batch may call
+    BATCH_OPERATIONS = frozenset({
+        "send_message", "edit_message", "delete_message",
+        "get_channel", "list_channels", "create_channel",
+        "get_guild",
+        "list_roles", "create_role", "add_role", "remove_role",
+        "get_member", "set_nickname", "ban_user", "unban_user", "kick_user",
+        "create_webhook", "execute_webhook",
+    })
+    # Lookup cache bounds; TTLs in seconds per resource kind
+    CACHE_MAX_SIZE = 10000
+    CACHE_TTLS = ResponseCache.DEFAULT_TTLS
+    # Optional disk cache (DISCORD_DISK_CACHE=<path>): kinds persisted across
+    # runs and the age after which saved entries are discarded, in seconds
+    # (DISCORD_DISK_CACHE_MAX_AGE). Members change too often to be worth it
+    DISK_CACHE_KINDS = ("guild", "channel", "channels", "roles")
+    DISK_CACHE_MAX_AGE = 3600.0
+    # Connection pool defaults; each can be overridden with the DISCORD_<NAME>
+    # environment variable, e.g. DISCORD_POOL_LIMIT_PER_HOST=100
+    POOL_LIMIT = 100
+    POOL_LIMIT_PER_HOST = 50
+    DNS_CACHE_TTL = 300
+    KEEPALIVE_TIMEOUT = 30.0
+    CONNECT_TIMEOUT = 10.0
+    READ_TIMEOUT = 30.0
+    # Optional Gateway mode (DISCORD_GATEWAY=1): intents to request, overridable
+    # with DISCORD_GATEWAY_INTENTS, and how long setup waits for READY
+    GATEWAY_INTENTS = INTENT_GUILDS
+    GATEWAY_READY_TIMEOUT = 10.0
+    # Concurrent identical GETs share one request
+    SINGLE_FLIGHT = True
+    # Check the bot's permissions locally before every mutating call that
+    # supports it, not only those asking for it (DISCORD_PREFLIGHT=1)
+    PREFLIGHT = False
+    # search_members keeps a per-guild member index, rebuilt from the API once
+    # it is older than this many seconds (DISCORD_MEMBER_INDEX_MAX_AGE)
+    MEMBER_INDEX_MAX_AGE = 600.0
+    # Coalesced edits (coalesce=True) are held back at most this many seconds
+    # to merge with later edits of the same target; more merge while an
+    # earlier edit is in flight (DISCORD_COALESCE_MAX_STALENESS)
+    COALESCE_MAX_STALENESS = 0.0
+    # Optional outbox (DISCORD_OUTBOX=<path>): entry points queued durably and
+    # their lane in OUTBOX_LANES; those in OUTBOX_IDEMPOTENT are resent when a
+    # crash interrupted them. OUTBOX_CONCURRENCY request slots are in use at
+    # once, of which each lane leaves OUTBOX_RESERVED free per more urgent
+    # lane; an item takes one slot per request it is expected to make
+    OUTBOX_OPERATIONS = {
+        "ban_user": 0, "kick_user": 0, "unban_user": 0, "mass_ban": 0, "mass_kick": 0,
+        "add_role": 1, "remove_role": 1, "bulk_add_roles": 1, "bulk_remove_roles": 1,
+        "create_role": 1, "set_nickname": 1,
+        "send_message": 2, "edit_message": 2, "delete_message": 2, "purge_messages": 2,
+        "broadcast_message": 2, "edit_broadcast": 2, "execute_webhook": 2, "execute_webhooks": 2,
+    }
+    OUTBOX_IDEMPOTENT = frozenset({
+        "ban_user", "kick_user", "unban_user", "mass_ban", "mass_kick",
+        "add_role", "remove_role", "bulk_add_roles", "bulk_remove_roles", "set_nickname",
+        "edit_message", "delete_message", "purge_messages", "edit_broadcast",
+    })
+    OUTBOX_CONCURRENCY = 20
+    OUTBOX_RESERVED = 5
+    # Items failing with a 429, 5xx or connection error are requeued with
+    # exponential backoff, up to OUTBOX_MAX_ATTEMPTS sends in all, unless a
+    # write of a non-idempotent item already went out
+    OUTBOX_MAX_ATTEMPTS = 4
+    OUTBOX_RETRY_BASE_DELAY = 1.0
+    OUTBOX_RETRY_MAX_DELAY = 60.0
+    # Finished items are kept this many seconds for dedup and status queries
+    OUTBOX_RETENTION = 86400.0
+    # Seconds unload waits for items being sent
+    OUTBOX_DRAIN_TIMEOUT = 5.0
+    # Pool mode (DISCORD_BOT_TOKENS=a,b,...): one worker process per token,
+    # how workers are started and how long setup waits for them
+    WORKER_START_METHOD = "spawn"
+    WORKER_STARTUP_TIMEOUT = 30.0
+    # Entry points the pool parent runs itself: aggregates over all workers,
+    # run_batch, whose steps are each routed to their own worker, and the
+    # outbox, which only the parent keeps
+    POOL_LOCAL = frozenset({"get_stats", "export_metrics", "outbox_status", "enqueue", "run_batch"})
+    
+    def __init__(self):
+        self.token = None
+        self.session = None
+        self.api_base = self.API_BASE
+        self.ratelimiter = None
+        self.cache = None
+        self.disk_cache: Optional[DiskCache] = None
+        self.pool_monitor = PoolMonitor()
+        # Optional callable(app) -> aiohttp.ClientSession-compatible object, to
+        # plug in a different transport (e.g. an HTTP/2-capable session)
+        self.session_factory: Optional[Callable] = None
+        self.decode = select_decoder()
+        self.webhooks = None
+        self.gateway: Optional[GatewayClient] = None
+        self.workers: Optional[WorkerPool] = None
+        # Pool mode: channel ID -> task resolving its guild, for routing
+        self._channel_guilds: dict[str, asyncio.Task] = {}
+        # The bot's user ID, and a permission engine per guild with the
+        # cached objects it was built from
+        self.bot_user_id: Optional[str] = None
+        self._permission_engines: dict[str, tuple] = {}
+        self.preflight = self.PREFLIGHT
+        # Outbox mode: per-lane FIFOs of (item ID, operation, input), callers
+        # waiting per item, items queued or sending in this process, and
+        # items being sent per lane
+        self.outbox: Optional[Outbox] = None
+        self._outbox_queues: list[deque] = [deque() for _ in OUTBOX_LANES]
+        self._outbox_waiters: dict[int, list[asyncio.Future]] = {}
+        self._outbox_metadata: dict[int, object] = {}
+        self._outbox_open: set[int] = set()
+        self._outbox_active = [0] * len(OUTBOX_LANES)
+        self._outbox_attempts: dict[int, int] = {}
+        self._outbox_retries: dict[int, asyncio.TimerHandle] = {}
+        # What actually runs an item: the entry point itself, or in pool mode
+        # the wrapper forwarding it to a worker
+        self._outbox_senders: dict[str, Callable] = {}
+        self._outbox_tasks: set[asyncio.Task] = set()
+        self._outbox_wake = asyncio.Event()
+        self._outbox_drainer: Optional[asyncio.Task] = None
+        # Member indexes per guild, and builds in progress
+        self.member_indexes: dict[str, MemberIndex] = {}
+        self._index_builds: dict[str, asyncio.Task] = {}
+        # Single-flight GETs: shared task per (endpoint, raw, auth), and how
+        # many requests were sent vs. joined
+        self._in_flight: dict[tuple, asyncio.Task] = {}
+        # Per-route request metrics; append callables to metrics.hooks to
+        # receive every RequestRecord. None disables collection
+        self.metrics: Optional[RequestMetrics] = RequestMetrics()
+        self.flights = 0
+        self.coalesced = 0
+        # Coalesced writes: the mergeable write and the one in flight per
+        # (method, endpoint), and how many were sent vs. merged away
+        self._pending_writes: dict[tuple, _PendingWrite] = {}
+        self._writes_in_flight: dict[tuple, asyncio.Task] = {}
+        self.writes_sent = 0
+        self.writes_merged = 0
+    
+    async def setup(self, metadata):
+        """Initialize Discord bot token and aiohttp session."""
+        tokens = [t.strip() for t in os.environ.get("DISCORD_BOT_TOKENS", "").split(",") if t.strip()]
+        self.token = os.environ.get("DISCORD_BOT_TOKEN") or (tokens[0] if tokens else None)
+        if not self.token:
+            raise ValueError("DISCORD_BOT_TOKEN not set in secrets")
+        # Override to point the app at a local stub server
+        self.api_base = os.environ.get("DISCORD_API_BASE", self.API_BASE)
+        self.ratelimiter = RateLimiter(self.GLOBAL_RATE_LIMIT)
+        self.cache = ResponseCache(self.CACHE_MAX_SIZE, self.CACHE_TTLS)
+        self.decode = select_decoder(os.environ.get("DISCORD_JSON_DECODER"))
+        if len(tokens) > 1:
+            # The parent only routes calls and owns the outbox; sessions,
+            # vault, caches and Gateway live in the workers
+            await self._start_workers(tokens, metadata)
+            if os.environ.get("DISCORD_OUTBOX"):
+                self._start_outbox(os.environ["DISCORD_OUTBOX"], metadata)
+            return
+        if os.environ.get("DISCORD_DISK_CACHE"):
+            self._warm_cache(os.environ["DISCORD_DISK_CACHE"], metadata)
+        if os.environ.get("DISCORD_METRICS", "").lower() in ("0", "false", "no"):
+            self.metrics = None
+        if os.environ.get("DISCORD_PREFLIGHT", "").lower() in ("1", "true", "yes"):
+            self.preflight = True
+        for name in ("POOL_LIMIT", "POOL_LIMIT_PER_HOST", "DNS_CACHE_TTL",
+                     "KEEPALIVE_TIMEOUT", "CONNECT_TIMEOUT", "READ_TIMEOUT", "MEMBER_INDEX_MAX_AGE",
+                     "COALESCE_MAX_STALENESS"):
+            setattr(self, name, env_number(f"DISCORD_{name}", getattr(self, name)))
+        self.session = self.session_factory(self) if self.session_factory else self._create_session()
+        self.webhooks = WebhookVault(
+            os.environ.get("DISCORD_WEBHOOK_VAULT") or WebhookVault.default_path(),
+            # Falls back to the bot token: stored tokens become unreadable if it is rotated
+            os.environ.get("DISCORD_WEBHOOK_VAULT_KEY") or self.token,
+        )
+        if os.environ.get("DISCORD_GATEWAY", "").lower() in ("1", "true", "yes"):
+            await self._start_gateway(metadata)
+        if os.environ.get("DISCORD_OUTBOX"):
+            self._start_outbox(os.environ["DISCORD_OUTBOX"], metadata)
+    
+    async def _start_workers(self, tokens: list[str], metadata):
+        """Switch to pool mode: entry points run in one worker per token.
+        
+        Calls are routed by consistent hashing of their guild ID, so a
+        guild's traffic always uses the same token; channel IDs are first
+        resolved to their guild. Calls that span guilds are split into one
+        sub-call per worker, and run_batch runs here, routing each step.
+        Every token must be able to act in the guilds routed to it.
+        """
+        if not os.environ.get("DISCORD_WEBHOOK_VAULT_KEY"):
+            # Webhooks created through one worker are executed through any other
+            raise ValueError("DISCORD_WEBHOOK_VAULT_KEY must be set when DISCORD_BOT_TOKENS lists several tokens")
+        self.workers = WorkerPool(type(self), tokens, self.WORKER_START_METHOD)
+        await self.workers.start(self.WORKER_STARTUP_TIMEOUT)
+        for name in self._entry_points():
+            if name not in self.POOL_LOCAL:
+                setattr(self, name, self._pooled(name))
+        metadata.log(f"Started {len(tokens)} workers")
+    
+    @classmethod
+    def _entry_points(cls) -> list[str]:
+        """Names of the methods the app exposes as functions."""
+        names = []
+        for name in dir(cls):
+            method = getattr(cls, name)
+            if name.startswith("_") or name in ("setup", "unload") or not asyncio.iscoroutinefunction(method):
+                continue
+            input_model = get_type_hints(method).get("input_data")
+            if isinstance(input_model, type) and issubclass(input_model, BaseAppInput):
+                names.append(name)
+        return names
+    
+    async def _channel_guild(self, channel_id: str) -> str:
+        """The guild of ``channel_id`` (the channel ID itself for DMs), asked of
+        the workers once and remembered: channels never change guild."""
+        task = self._channel_guilds.get(channel_id)
+        if task is None:
+            task = self._channel_guilds[channel_id] = asyncio.ensure_future(self._lookup_channel_guild(channel_id))
+        guild_id = await asyncio.shield(task)
+        if guild_id is None:
+            # Unknown to every token: route by the channel and let that call fail
+            self._channel_guilds.pop(channel_id, None)
+            return channel_id
+        return guild_id
+    
+    async def _lookup_channel_guild(self, channel_id: str) -> Optional[str]:
+        quiet = SimpleNamespace(log=lambda message: None)
+        first = self.workers.worker_for(channel_id)
+        # Not every token can see every channel; try the others in turn
+        for worker in [first] + [w for w in range(len(self.workers.tokens)) if w != first]:
+            try:
+                channel = await self.workers.call(worker, "get_channel", GetChannelInput(channel_id=channel_id), quiet)
+            except DiscordAPIError:
+                continue
+            except ValueError:
+                return None
+            return channel.get("guild_id") or channel_id
+        return None
+    
+    async def _route(self, input_data: BaseModel) -> int:
+        """The worker that owns a single-target call."""
+        fields = vars(input_data)
+        if fields.get("guild_id"):
+            return self.workers.worker_for(fields["guild_id"])
+        if fields.get("channel_id"):
+            return self.workers.worker_for(await self._channel_guild(fields["channel_id"]))
+        # Webhook execution is not bound to a bot token; any worker can read the vault
+        return self.workers.worker_for(fields.get("webhook_id") or "")
+    
+    def _pooled(self, name: str):
+        """Entry point ``name`` forwarded to the worker that owns its input."""
+        output_model = get_type_hints(getattr(type(self), name))["return"]
+        split = {
+            "broadcast_message": self._split_broadcast_message,
+            "edit_broadcast": self._split_edit_broadcast,
+            "execute_webhooks": self._split_execute_webhooks,
+        }.get(name)
+        
+        async def call(input_data, metadata):
+            if split is None:
+                worker = await self._route(input_data)
+                return output_model.model_validate(await self.workers.call(worker, name, input_data, metadata))
+            started = time.monotonic()
+            parts, merge = await split(input_data)
+            if len(parts) <= 1:
+                worker = next(iter(parts), 0)
+                return output_model.model_validate(await self.workers.call(worker, name, input_data, metadata))
+            outputs = await asyncio.gather(
+                *(self.workers.call(worker, name, part, metadata) for worker, part in parts.items()),
+                return_exceptions=True,
+            )
+            if all(isinstance(output, BaseException) for output in outputs):
+                raise outputs[0]
+            output = merge(list(zip(parts.values(), outputs)))
+            output.elapsed_seconds = round(time.monotonic() - started, 3)
+            return output
+        
+        call.__name__ = name
+        return call
+    
+    async def _workers_by_channel(self, channel_ids: Iterable[str]) -> dict[int, list[str]]:
+        """Group channels by the worker that owns their guild, keeping order."""
+        channel_ids = list(channel_ids)
+        for channel_id in channel_ids:
+            self._validate_snowflake("channel_id", channel_id)
+        guild_ids = await asyncio.gather(*(self._channel_guild(channel_id) for channel_id in channel_ids))
+        groups: dict[int, list[str]] = {}
+        for channel_id, guild_id in zip(channel_ids, guild_ids):
+            groups.setdefault(self.workers.worker_for(guild_id), []).append(channel_id)
+        return groups
+    
+    async def _split_broadcast_message(self, input_data: BroadcastMessageInput):
+        for guild_id in input_data.guild_ids:
+            self._validate_snowflake("guild_id", guild_id)
+        groups = {
+            worker: (channel_ids, [])
+            for worker, channel_ids in (await self._workers_by_channel(dict.fromkeys(input_data.channel_ids))).items()
+        }
+        for guild_id in input_data.guild_ids:
+            groups.setdefault(self.workers.worker_for(guild_id), ([], []))[1].append(guild_id)
+        parts = {
+            worker: input_data.model_copy(update={"channel_ids": channel_ids, "guild_ids": guild_ids})
+            for worker, (channel_ids, guild_ids) in groups.items()
+        }
+        
+        def merge(results: list) -> BroadcastMessageOutput:
+            messages, failed = {}, {}
+            for part, output in results:
+                if isinstance(output, BaseException):
+                    # Guilds stand in for their channels, which were never listed
+                    failed.update(dict.fromkeys(part.channel_ids + part.guild_ids, str(output)))
+                else:
+                    messages.update(output["messages"])
+                    failed.update(output["failed"])
+            return BroadcastMessageOutput(messages=messages, failed=failed, elapsed_seconds=0.0)
+        
+        return parts, merge
+    
+    async def _split_edit_broadcast(self, input_data: EditBroadcastInput):
+        groups = await self._workers_by_channel(input_data.messages)
+        parts = {
+            worker: input_data.model_copy(update={"messages": {c: input_data.messages[c] for c in channel_ids}})
+            for worker, channel_ids in groups.items()
+        }
+        
+        def merge(results: list) -> EditBroadcastOutput:
+            edited, failed = set(), {}
+            for part, output in results:
+                if isinstance(output, BaseException):
+                    failed.update(dict.fromkeys(part.messages, str(output)))
+                else:
+                    edited.update(output["edited"])
+                    failed.update(output["failed"])
+            return EditBroadcastOutput(
+                edited=[channel_id for channel_id in input_data.messages if channel_id in edited],
+                failed=failed, elapsed_seconds=0.0,
+            )
+        
+        return parts, merge
+    
+    async def _split_execute_webhooks(self, input_data: ExecuteWebhooksInput):
+        webhook_ids, contents = input_data.webhook_ids, input_data.contents
+        lanes: dict[int, list[int]] = {}
+        for lane, webhook_id in enumerate(webhook_ids):
+            lanes.setdefault(self.workers.worker_for(webhook_id), []).append(lane)
+        parts, origins = {}, {}
+        for worker, worker_lanes in lanes.items():
+            # Interleave so that content k of the part still goes to its
+            # webhook k mod len(lanes), in the original order per webhook
+            origin = [
+                index for start in range(0, len(contents), len(webhook_ids))
+                for index in (start + lane for lane in worker_lanes) if index < len(contents)
+            ]
+            origins[worker] = origin
+            parts[worker] = input_data.model_copy(update={
+                "webhook_ids": [webhook_ids[lane] for lane in worker_lanes],
+                "contents": [contents[index] for index in origin],
+            })
+        
+        def merge(results: list) -> ExecuteWebhooksOutput:
+            message_ids: list = [None] * len(contents)
+            errors = {}
+            for origin, (_, output) in zip(origins.values(), results):
+                if isinstance(output, BaseException):
+                    errors.update(dict.fromkeys(map(str, origin), str(output)))
+                    continue
+                for index, message_id in zip(origin, output["message_ids"]):
+                    message_ids[index] = message_id
+                errors.update({str(origin[int(k)]): error for k, error in output["errors"].items()})
+            return ExecuteWebhooksOutput(
+                sent=len(contents) - len(errors), failed=len(errors), message_ids=message_ids,
+                errors=errors, elapsed_seconds=0.0,
+            )
+        
+        return parts, merge
+    
+    async def _call_all_workers(self, name: str, input_data: BaseModel, metadata) -> list[dict]:
+        return await asyncio.gather(*(
+            self.workers.call(worker, name, input_data, metadata) for worker in range(len(self.workers.tokens))
+        ))
+    
+    def _warm_cache(self, path: str, metadata):
+        """Open the disk cache and load its entries into the lookup cache.
+        
+        A warmed entry stays valid for its normal TTL, but never past
+        DISK_CACHE_MAX_AGE since it was fetched.
+        """
+        max_age = env_number("DISCORD_DISK_CACHE_MAX_AGE", self.DISK_CACHE_MAX_AGE)
+        self.disk_cache = DiskCache(path, self.DISK_CACHE_KINDS, max_age)
+        entries = self.disk_cache.load(self.decode)
+        for kind, key, age, value in entries:
+            self.cache.put(kind, *key, value=value, ttl=min(self.cache.ttls[kind], max_age - age))
+        self.cache.persist = self.disk_cache.record
+        metadata.log(f"Warmed lookup cache with {len(entries)} entries from {path}")
+    
+    async def _start_gateway(self, metadata):
+        """Connect to the Gateway so reads can be answered from live state."""
+        url = os.environ.get("DISCORD_GATEWAY_URL")
+        if not url:
+            url = (await self._request("GET", "/gateway/bot"))["url"]
+        self.gateway = GatewayClient(
+            self.session, url, self.token,
+            int(env_number("DISCORD_GATEWAY_INTENTS", self.GATEWAY_INTENTS)),
+            listeners=(self._on_gateway_event,),
+        )
+        self.gateway.start()
+        try:
+            await asyncio.wait_for(self.gateway.ready.wait(), self.GATEWAY_READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            metadata.log("Gateway not ready yet; reads use REST until it is")
+    
+    def _on_gateway_event(self, event: str, data: dict):
+        """Drop lookup cache entries an event has made stale."""
+        if event.startswith("CHANNEL_"):
+            self.cache.invalidate("channel", data["id"])
+            if data.get("guild_id"):
+                self.cache.invalidate("channels", data["guild_id"])
+        elif event.startswith("GUILD_ROLE_"):
+            self.cache.invalidate("roles", data["guild_id"])
+        elif event.startswith("GUILD_MEMBER_") or event == "GUILD_BAN_ADD":
+            self.cache.invalidate("member", data["guild_id"], data["user"]["id"])
+            index = self.member_indexes.get(data["guild_id"])
+            if index is not None:
+                if event in ("GUILD_MEMBER_ADD", "GUILD_MEMBER_UPDATE"):
+                    index.put(data)
+                else:
+                    index.remove(data["user"]["id"])
+        elif event in ("GUILD_UPDATE", "GUILD_DELETE"):
+            self.cache.invalidate("guild", data["id"])
+    
+    def _create_session(self) -> aiohttp.ClientSession:
+        """Build the shared session with a tuned, monitored connection pool."""
+        connector = aiohttp.TCPConnector(
+            limit=self.POOL_LIMIT,
+            limit_per_host=self.POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=self.DNS_CACHE_TTL,
+            keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(sock_connect=self.CONNECT_TIMEOUT, sock_read=self.READ_TIMEOUT),
+            trace_configs=[self.pool_monitor.trace_config()],
+            # Authorization is added per request so webhook calls can omit it
+            headers={"Content-Type": "application/json"}
+        )
+    
+    async def unload(self):
+        """Cleanup aiohttp session."""
+        if self.outbox:
+            await self._stop_outbox()
+        if self.workers:
+            await self.workers.close()
+        if self.gateway:
+            await self.gateway.close()
+        if self.session:
+            await self.session.close()
+        if self.webhooks:
+            self.webhooks.close()
+        if self.disk_cache:
+            self.disk_cache.close()
+    
+    def _validate_snowflake(self, name: str, value: str):
+        """Validate Discord snowflake ID (17-20 digits)."""
+        if not value or not value.isdigit() or not (17 <= len(value) <= 20):
+            raise ValueError(f"Invalid {name}: '{value}' (expected 17-20 digit snowflake)")
+    
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        data: Optional[dict] = None,
+        idempotent: Optional[bool] = None,
+        deadline: Optional[float] = None,
+        raw: bool = False,
+        auth: bool = True,
+        reason: Optional[str] = None,
+    ):
+        """Make API request with rate limiting, retries and error handling.
+        
+        Raises DiscordAPIError for error responses. Idempotent calls are
+        retried on 5xx, connection resets and timeouts; every call is retried
+        when the connection could not be opened at all. ``deadline`` bounds
+        the total time spent including waits, in seconds. With ``raw`` the
+        undecoded response body is returned as bytes. ``auth=False`` sends
+        no bot token and skips the bot's global limit (webhook execution).
+        ``reason`` is recorded in the guild's audit log.
+        
+        Concurrent identical GETs share one request (see _single_flight).
+        """
+        if method == "GET" and self.SINGLE_FLIGHT:
+            return await self._single_flight(endpoint, deadline, raw, auth)
+        return await self._send_request(method, endpoint, data, idempotent, deadline, raw, auth, reason)
+    
+    async def _single_flight(self, endpoint: str, deadline: Optional[float], raw: bool, auth: bool):
+        """Send a GET, or join the identical one already in flight.
+        
+        The request runs in its own task and each caller awaits it through
+        asyncio.shield, so a cancelled caller leaves the others (and the
+        request) running. The result is shared and must be treated as
+        read-only, like lookup cache entries.
+        
+        The request retries within the first caller's ``deadline``; a caller
+        that joins with a ``deadline`` of its own stops waiting after it
+        (asyncio.TimeoutError) but may still see the request give up sooner.
+        """
+        key = (endpoint, raw, auth)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._send_request("GET", endpoint, None, None, deadline, raw, auth, None))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._end_flight(key, done))
+            self.flights += 1
+        else:
+            self.coalesced += 1
+            if deadline is not None:
+                return await asyncio.wait_for(asyncio.shield(task), deadline)
+        return await asyncio.shield(task)
+    
+    async def _coalesced_write(
+        self, method: str, endpoint: str, data: dict, max_staleness: Optional[float] = None
+    ) -> tuple[dict, dict, bool]:
+        """Send a write that later writes to the same endpoint may replace.
+        
+        At most one write per (method, endpoint) is in flight. Writes that
+        arrive meanwhile are merged (later keys win) into one pending write,
+        sent once the previous one finished and its bucket has capacity, but
+        not before ``max_staleness`` seconds after the first of them unless
+        nothing is pending. Every merged caller gets the same result.
+        
+        Returns the response, the payload that was actually sent and whether
+        a later write was merged in after this one (superseding it).
+        """
+        loop = asyncio.get_running_loop()
+        key = (method, endpoint)
+        send_at = loop.time() + (self.COALESCE_MAX_STALENESS if max_staleness is None else max_staleness)
+        pending = self._pending_writes.get(key)
+        if pending is not None:
+            pending.data = {**pending.data, **data}
+            pending.callers += 1
+            self.writes_merged += 1
+            position = pending.callers
+            if send_at < pending.send_at:
+                pending.send_at = send_at
+                pending.wake.set()
+        else:
+            pending = self._pending_writes[key] = _PendingWrite(data, send_at)
+            pending.task = asyncio.ensure_future(self._flush_write(key, pending))
+            position = 1
+        result, sent = await asyncio.shield(pending.future)
+        # No write merges in once the pending write is sent, so callers is final
+        return result, sent, position < pending.callers
+    
+    async def _flush_write(self, key: tuple, pending: _PendingWrite):
+        method, endpoint = key
+        loop = asyncio.get_running_loop()
+        try:
+            previous = self._writes_in_flight.get(key)
+            if previous is not None:
+                await asyncio.wait([previous])
+            while pending.send_at > loop.time():
+                pending.wake.clear()
+                try:
+                    await asyncio.wait_for(pending.wake.wait(), pending.send_at - loop.time())
+                except asyncio.TimeoutError:
+                    pass
+            await self.ratelimiter.wait_ready(self.ratelimiter.get_bucket(method, endpoint))
+            # Later writes start a new pending write behind this one
+            del self._pending_writes[key]
+            self._writes_in_flight[key] = pending.task
+            self.writes_sent += 1
+            result = await self._request(method, endpoint, pending.data)
+            pending.future.set_result((result, pending.data))
+        except asyncio.CancelledError:
+            pending.future.cancel()
+            raise
+        except Exception as e:
+            pending.future.set_exception(e)
+            # Retrieved here so it is not reported as unhandled when every
+            # caller was cancelled
+            pending.future.exception()
+        finally:
+            if self._pending_writes.get(key) is pending:
+                del self._pending_writes[key]
+            if self._writes_in_flight.get(key) is pending.task:
+                del self._writes_in_flight[key]
+    
+    def _end_flight(self, key: tuple, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Retrieve the exception so it is not reported as unhandled when
+            # every caller was cancelled before the request finished
+            task.exception()
+    
+    async def _send_request(
+        self,
+        method: str,
+        endpoint: str,
+        data: Optional[dict],
+        idempotent: Optional[bool],
+        deadline: Optional[float],
+        raw: bool,
+        auth: bool,
+        reason: Optional[str],
+    ):
+        """Send one API request; see _request."""
+        url = f"{self.api_base}{endpoint}"
+        route, major = route_key(method, endpoint)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + (deadline or self.RETRY_DEADLINE)
+        headers = {"Authorization": f"Bot {self.token}"} if auth else {}
+        if reason:
+            headers["X-Audit-Log-Reason"] = quote(reason)
+        bucket = self.ratelimiter.get_bucket(method, endpoint)
+        rate_limited = 0
+        failures = 0
+        
+        queue_time = network_time = 0.0
+        status = None
+        size = 0
+        started = time.perf_counter()
+        error = None
+        try:
+            while True:
+                waited_at = time.perf_counter()
+                await self.ratelimiter.acquire(bucket, global_limit=auth)
+                sent_at = time.perf_counter()
+                item = CURRENT_OUTBOX_ITEM.get()
+                if item is not None and not item.sent and method != "GET":
+                    item.sent = True
+                    self.outbox.mark(item.id, "sending")
+                queue_time += sent_at - waited_at
+                answered = False
+                error = None
+                try:
+                    timeout = aiohttp.ClientTimeout(
+                        total=max(0.1, give_up_at - loop.time()),
+                        sock_connect=self.CONNECT_TIMEOUT,
+                        sock_read=self.READ_TIMEOUT,
+                    )
+                    async with self.session.request(
+                        method, url, json=data if data else None, headers=headers, timeout=timeout
+                    ) as resp:
+                        bucket = self.ratelimiter.update(bucket, method, endpoint, resp.status, resp.headers)
+                        answered = True
+                        status = resp.status
+                        body = await resp.read()
+                        size += len(body)
+                except aiohttp.ClientConnectorError as e:
+                    # Nothing was sent, so even a POST is safe to repeat
+                    error = e
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if not idempotent:
+                        raise
+                    error = e
+                finally:
+                    network_time += time.perf_counter() - sent_at
+                    if not answered:
+                        self.ratelimiter.release(bucket)
+                
+                if error is None:
+                    if resp.status == 204:
+                        return {"success": True}
+                
+                    if resp.status < 400:
+                        if raw:
+                            return body
+                        return self.decode(body) if body else {}
+                
+                    if resp.status == 429:
+                        try:
+                            details = self.decode(body) if body else {}
+                        except Exception:
+                            # Each decoder raises its own error type
+                            details = {}
+                        retry_after = self.ratelimiter.on_rate_limited(bucket, resp.headers, details)
+                        if rate_limited < self.MAX_RATE_LIMIT_RETRIES and loop.time() + retry_after < give_up_at:
+                            rate_limited += 1
+                            await asyncio.sleep(retry_after)
+                            continue
+                        raise DiscordAPIError.from_response(resp.status, body, method, route, retry_after)
+                
+                    error = DiscordAPIError.from_response(resp.status, body, method, route)
+                    if resp.status not in RETRY_STATUSES or not idempotent:
+                        raise error
+                
+                failures += 1
+                delay = random.uniform(0, min(self.RETRY_MAX_DELAY, self.RETRY_BASE_DELAY * 2 ** failures))
+                if failures > self.MAX_RETRIES or loop.time() + delay >= give_up_at:
+                    raise error
+                await asyncio.sleep(delay)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe(RequestRecord(
+                    method, route, f"{self.ratelimiter.bucket_hash(route)}:{redact_major(major)}",
+                    status, size, queue_time, network_time,
+                    time.perf_counter() - started, rate_limited + failures,
+                    type(error).__name__ if error is not None else None,
+                ))
+    
+    def _lookup(self, kind: str, *key: str):
+        """Local copy of a resource: live Gateway state first, then the lookup cache."""
+        if self.gateway is not None and self.gateway.live:
+            result = self.gateway.state.get(kind, *key)
+            if result is not None:
+                return result
+        return self.cache.get(kind, *key)
+    
+    async def _cached_get(self, kind: str, key: tuple, endpoint: str):
+        """GET ``endpoint`` through the lookup cache."""
+        result = self._lookup(kind, *key)
+        if result is None:
+            result = await self._request("GET", endpoint)
+            self.cache.put(kind, *key, value=result)
+        return result
+    
+    async def _guild_channels(self, guild_id: str) -> list:
+        """A guild's channels through the lookup cache."""
+        result = self._lookup("channels", guild_id)
+        if result is None:
+            result = await self._request("GET", f"/guilds/{guild_id}/channels")
+            self._store_channels(guild_id, result)
+        return result
+    
+    def _store_channels(self, guild_id: str, channels: list):
+        self.cache.put("channels", guild_id, value=channels)
+        for channel in channels:
+            self.cache.put("channel", channel["id"], value=channel)
     
-    def __init__(self):
-        self.token = None
-        self.session = None
+    @staticmethod
+    def _changed_member(member: dict, changes: dict) -> dict:
+        member = dict(member)
+        if "add_role" in changes and changes["add_role"] not in member.get("roles", []):
+            member["roles"] = [*member.get("roles", []), changes["add_role"]]
+        if "remove_role" in changes:
+            member["roles"] = [r for r in member.get("roles", []) if r != changes["remove_role"]]
+        if "nick" in changes:
+            member["nick"] = changes["nick"]
+        return member
     
-    async def setup(self, metadata):
-        """Initialize Discord bot token and aiohttp session."""
-        self.token = os.environ.get("DISCORD_BOT_TOKEN")
-        if not self.token:
-            raise ValueError("DISCORD_BOT_TOKEN not set in secrets")
-        self.session = aiohttp.ClientSession(
-            headers={
-                "Authorization": f"Bot {self.token}",
-                "Content-Type": "application/json"
-            }
-        )
+    def _update_cached_member(self, guild_id: str, user_id: str, **changes):
+        """Apply our own change to a cached, indexed or Gateway-known member."""
+        index = self.member_indexes.get(guild_id)
+        if index is not None:
+            index.update(user_id, **changes)
+        if self.gateway is not None:
+            # Without the members intent no GUILD_MEMBER_UPDATE follows, yet
+            # GUILD_CREATE still lists some members (the bot, voice members)
+            member = self.gateway.state.members.get((guild_id, user_id))
+            if member is not None:
+                self.gateway.state.members[(guild_id, user_id)] = self._changed_member(member, changes)
+        member = self.cache.peek("member", guild_id, user_id)
+        if member is not None:
+            self.cache.put("member", guild_id, user_id, value=self._changed_member(member, changes))
     
-    async def unload(self):
-        """Cleanup aiohttp session."""
-        if self.session:
-            await self.session.close()
+    def _forget_member(self, guild_id: str, user_id: str):
+        """Drop a member we banned or kicked from the cache, the index and Gateway state."""
+        self.cache.invalidate("member", guild_id, user_id)
+        index = self.member_indexes.get(guild_id)
+        if index is not None:
+            index.remove(user_id)
+        if self.gateway is not None:
+            self.gateway.state.members.pop((guild_id, user_id), None)
     
-    def _validate_snowflake(self, name: str, value: str):
-        """Validate Discord snowflake ID (17-20 digits)."""
-        if not value or not value.isdigit() or not (17 <= len(value) <= 20):
-            raise ValueError(f"Invalid {name}: '{value}' (expected 17-20 digit snowflake)")
+    def _append_cached_list(self, kind: str, guild_id: str, item: dict):
+        """Add a newly created channel or role to a cached guild list."""
+        items = self.cache.peek(kind, guild_id)
+        if items is not None:
+            self.cache.put(kind, guild_id, value=[*items, item])
+    
+    # =========================================================================
+    # Outbox
+    # =========================================================================
     
-    async def _request(self, method: str, endpoint: str, data: Optional[dict] = None):
-        """Make API request with error handling."""
-        url = f"{self.API_BASE}{endpoint}"
+    def _start_outbox(self, path: str, metadata):
+        """Send mutating entry points through a durable, prioritized outbox.
         
-        async with self.session.request(method, url, json=data if data else None) as resp:
-            text = await resp.text()
-            
-            if resp.status == 204:
-                return {"success": True}
-            
-            if resp.status >= 400:
-                raise RuntimeError(f"Discord API error {resp.status}: {text[:200]}")
-            
-            import json
-            return json.loads(text) if text else {}
+        Calls to OUTBOX_OPERATIONS are queued and the caller waits for a
+        background drainer to send them, most urgent lane first, so a burst
+        of messages cannot hold up bans and kicks. Items left queued by a
+        previous run (with the same token) are replayed. In pool mode the
+        items are forwarded to the workers like direct calls.
+        """
+        self.outbox = Outbox(path, hashlib.sha256(self.token.encode()).hexdigest()[:16])
+        self.outbox.prune(self.OUTBOX_RETENTION)
+        items = self.outbox.recover(lambda operation: operation in self.OUTBOX_IDEMPOTENT)
+        for item_id, lane, operation, data in items:
+            self._outbox_queues[lane].append((item_id, operation, data))
+            self._outbox_open.add(item_id)
+        for name in self.OUTBOX_OPERATIONS:
+            self._outbox_senders[name] = getattr(self, name)
+            setattr(self, name, self._outboxed(name))
+        self._outbox_drainer = asyncio.ensure_future(self._drain_outbox())
+        if items:
+            metadata.log(f"Replaying {len(items)} queued outbox items")
+    
+    async def _stop_outbox(self):
+        """Stop draining; items still being sent get OUTBOX_DRAIN_TIMEOUT to finish.
+        
+        Callers still waiting for an item (queued, waiting to be retried or
+        cut off) get a RuntimeError; the item stays on disk for the next start.
+        """
+        self._outbox_drainer.cancel()
+        await asyncio.gather(self._outbox_drainer, return_exceptions=True)
+        # Items waiting to be retried are still queued on disk
+        for handle in self._outbox_retries.values():
+            handle.cancel()
+        self._outbox_retries.clear()
+        if self._outbox_tasks:
+            await asyncio.wait(self._outbox_tasks, timeout=self.OUTBOX_DRAIN_TIMEOUT)
+            tasks = list(self._outbox_tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for item_id, futures in self._outbox_waiters.items():
+            for future in futures:
+                if not future.done():
+                    future.set_exception(RuntimeError(f"Outbox stopped; item {item_id} persisted for replay"))
+        self._outbox_waiters.clear()
+        self.outbox.close()
+    
+    def _outboxed(self, name: str):
+        """Entry point ``name`` queued in the outbox; waits for the result."""
+        output_model = get_type_hints(getattr(type(self), name))["return"]
+        
+        async def call(input_data, metadata):
+            _, _, future = self._enqueue(name, input_data, None, metadata, wait=True)
+            return output_model.model_validate(await asyncio.shield(future))
+        
+        call.__name__ = name
+        return call
+    
+    def _enqueue(
+        self, operation: str, input_data: BaseModel, dedup_key: Optional[str], metadata, wait: bool
+    ) -> tuple[int, bool, Optional[asyncio.Future]]:
+        """Queue a call; returns its item ID, whether it is new, and a future
+        for its output (as a dict) when ``wait`` is set."""
+        lane = self.OUTBOX_OPERATIONS[operation]
+        item_id, created = self.outbox.add(lane, operation, input_data.model_dump(mode="json"), dedup_key)
+        if created:
+            self._outbox_queues[lane].append((item_id, operation, input_data))
+            self._outbox_metadata[item_id] = metadata
+            self._outbox_open.add(item_id)
+            self._outbox_wake.set()
+        if not wait:
+            return item_id, created, None
+        future = asyncio.get_running_loop().create_future()
+        if item_id in self._outbox_open:
+            self._outbox_waiters.setdefault(item_id, []).append(future)
+        else:
+            item = self.outbox.get([item_id])[0]
+            if item["state"] == "done":
+                future.set_result(item["result"])
+            else:
+                future.set_exception(RuntimeError(f"Outbox item {item_id} is {item['state']}: {item['error'] or 'not sent'}"))
+        return item_id, created, future
+    
+    def _outbox_weight(self, operation: str, input_data) -> int:
+        """Requests an item is expected to make, i.e. the slots it takes."""
+        fields = input_data if isinstance(input_data, dict) else vars(input_data)
+        if operation in ("mass_ban", "mass_kick"):
+            # A member filter without user_ids selects an unknown number
+            count = len(fields["user_ids"]) or self.OUTBOX_CONCURRENCY
+        elif operation in ("bulk_add_roles", "bulk_remove_roles"):
+            count = len(fields["assignments"])
+        elif operation == "purge_messages":
+            count = fields["limit"] or self.OUTBOX_CONCURRENCY
+        elif operation == "broadcast_message":
+            # Every guild adds all of its text channels
+            count = len(fields["channel_ids"]) + self.OUTBOX_CONCURRENCY * len(fields["guild_ids"])
+        elif operation == "edit_broadcast":
+            count = len(fields["messages"])
+        elif operation == "execute_webhooks":
+            count = len(fields["contents"])
+        else:
+            count = 1
+        return max(1, count)
+    
+    async def _drain_outbox(self):
+        """Start queued items, most urgent lane first, whenever enough slots are free.
+        
+        An item takes at most its lane's limit, so it can always start once
+        the outbox is idle. Items start in order; while the head of a lane
+        waits for slots, less urgent lanes wait too.
+        """
+        while True:
+            self._outbox_wake.clear()
+            active = sum(self._outbox_active)
+            for lane, queue in enumerate(self._outbox_queues):
+                limit = self.OUTBOX_CONCURRENCY - lane * self.OUTBOX_RESERVED
+                while queue:
+                    item_id, operation, input_data = queue[0]
+                    weight = min(self._outbox_weight(operation, input_data), limit)
+                    if active + weight > limit:
+                        break
+                    queue.popleft()
+                    active += weight
+                    self._outbox_active[lane] += weight
+                    task = asyncio.ensure_future(
+                        self._send_outbox_item(lane, weight, item_id, operation, input_data)
+                    )
+                    self._outbox_tasks.add(task)
+                    task.add_done_callback(self._outbox_tasks.discard)
+                if queue:
+                    break
+            await self._outbox_wake.wait()
+    
+    @staticmethod
+    def _outbox_retryable(error: Exception) -> bool:
+        if isinstance(error, DiscordAPIError):
+            return error.status == 429 or error.status in RETRY_STATUSES
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError))
+    
+    async def _send_outbox_item(self, lane: int, weight: int, item_id: int, operation: str, input_data):
+        metadata = self._outbox_metadata.pop(item_id, None) or SimpleNamespace(log=lambda message: None)
+        item = _OutboxItem(item_id)
+        CURRENT_OUTBOX_ITEM.set(item)
+        try:
+            if isinstance(input_data, dict):
+                # Replayed from disk
+                input_data = get_type_hints(getattr(type(self), operation))["input_data"].model_validate(input_data)
+            if self.workers:
+                # The worker's requests are out of sight; count the item as
+                # possibly applied once it is handed over
+                item.sent = True
+                self.outbox.mark(item_id, "sending")
+            output = await self._outbox_senders[operation](input_data, metadata)
+        except asyncio.CancelledError:
+            # Still "queued" if nothing was sent, else left for recover();
+            # _stop_outbox fails the waiters
+            raise
+        except Exception as e:
+            attempts = self._outbox_attempts.pop(item_id, 0) + 1
+            if (
+                attempts < self.OUTBOX_MAX_ATTEMPTS and self._outbox_retryable(e)
+                and (not item.sent or operation in self.OUTBOX_IDEMPOTENT)
+            ):
+                self._retry_outbox_item(lane, item_id, operation, input_data, metadata, attempts, e)
+                return
+            self.outbox.mark(item_id, "failed", error=str(e))
+            for future in self._outbox_waiters.pop(item_id, ()):
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            self._outbox_attempts.pop(item_id, None)
+            result = output.model_dump(mode="json")
+            self.outbox.mark(item_id, "done", result)
+            for future in self._outbox_waiters.pop(item_id, ()):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            if item_id not in self._outbox_retries:
+                self._outbox_open.discard(item_id)
+            self._outbox_active[lane] -= weight
+            self._outbox_wake.set()
+    
+    def _retry_outbox_item(
+        self, lane: int, item_id: int, operation: str, input_data, metadata, attempts: int, error: Exception
+    ):
+        """Queue a failed item again after a backoff; its callers keep waiting."""
+        delay = min(self.OUTBOX_RETRY_MAX_DELAY, self.OUTBOX_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+        delay = max(random.uniform(delay / 2, delay), getattr(error, "retry_after", None) or 0.0)
+        self.outbox.mark(item_id, "queued", error=str(error))
+        self._outbox_attempts[item_id] = attempts
+        self._outbox_metadata[item_id] = metadata
+        metadata.log(f"Outbox item {item_id} failed ({error}); retrying in {delay:.1f}s")
+        
+        def requeue():
+            del self._outbox_retries[item_id]
+            self._outbox_queues[lane].append((item_id, operation, input_data))
+            self._outbox_wake.set()
+        
+        self._outbox_retries[item_id] = asyncio.get_running_loop().call_later(delay, requeue)
+    
+    async def enqueue(self, input_data: EnqueueInput, metadata) -> EnqueueOutput:
+        """Queue a mutating call in the outbox, optionally waiting for its result."""
+        if self.outbox is None:
+            raise ValueError("Outbox is not enabled (set DISCORD_OUTBOX)")
+        operation = input_data.operation
+        if operation not in self.OUTBOX_OPERATIONS:
+            raise ValueError(f"{operation} cannot be queued; use one of: {', '.join(sorted(self.OUTBOX_OPERATIONS))}")
+        input_model = get_type_hints(getattr(type(self), operation))["input_data"].model_validate(input_data.input)
+        
+        item_id, created, future = self._enqueue(
+            operation, input_model, input_data.dedup_key, metadata, input_data.wait
+        )
+        if future is None:
+            state = "queued" if created else self.outbox.get([item_id])[0]["state"]
+            return EnqueueOutput(item_id=item_id, deduplicated=not created, state=state)
+        try:
+            result = await asyncio.shield(future)
+        except Exception as e:
+            return EnqueueOutput(item_id=item_id, deduplicated=not created, state="failed", error=str(e))
+        return EnqueueOutput(item_id=item_id, deduplicated=not created, state="done", result=result)
+    
+    async def outbox_status(self, input_data: OutboxStatusInput, metadata) -> OutboxStatusOutput:
+        """Report outbox items by lane and state, and the requested items."""
+        if self.outbox is None:
+            raise ValueError("Outbox is not enabled (set DISCORD_OUTBOX)")
+        return OutboxStatusOutput(
+            counts=self.outbox.counts(),
+            active=dict(zip(OUTBOX_LANES, self._outbox_active)),
+            items=self.outbox.get(input_data.item_ids) if input_data.item_ids else [],
+        )
+    
+    # =========================================================================
+    # Stats
+    # =========================================================================
+    
+    async def get_stats(self, input_data: GetStatsInput, metadata) -> GetStatsOutput:
+        """Report cache, connection pool, request coalescing and Gateway counters."""
+        if self.workers:
+            outputs = await self._call_all_workers("get_stats", input_data, metadata)
+            return GetStatsOutput(**{
+                field: {f"worker-{i}": output[field] for i, output in enumerate(outputs)}
+                for field in ("cache", "pool", "coalescing", "gateway")
+            })
+        coalescing = {
+            "in_flight": len(self._in_flight),
+            "requests": self.flights,
+            "coalesced": self.coalesced,
+            "writes_pending": len(self._pending_writes),
+            "writes_sent": self.writes_sent,
+            "writes_merged": self.writes_merged,
+        }
+        if input_data.reset:
+            self.flights = self.coalesced = self.writes_sent = self.writes_merged = 0
+        cache = self.cache.stats(input_data.reset)
+        if self.disk_cache:
+            cache["disk"] = self.disk_cache.stats()
+        return GetStatsOutput(
+            cache=cache,
+            pool=self.pool_monitor.stats(getattr(self.session, "connector", None), input_data.reset),
+            coalescing=coalescing,
+            gateway=self.gateway.stats() if self.gateway else {},
+        )
+    
+    async def export_metrics(self, input_data: ExportMetricsInput, metadata) -> ExportMetricsOutput:
+        """Export per-route request counts, retries, bytes and latency percentiles."""
+        if self.workers:
+            outputs = await self._call_all_workers("export_metrics", input_data, metadata)
+            if input_data.format == "prometheus":
+                return ExportMetricsOutput(text=_merge_prometheus([output["text"] for output in outputs]))
+            return ExportMetricsOutput(metrics={
+                "workers": {f"worker-{i}": output["metrics"] for i, output in enumerate(outputs)}
+            })
+        if self.metrics is None:
+            raise ValueError("Metrics are disabled (DISCORD_METRICS=0)")
+        if input_data.format == "prometheus":
+            output = ExportMetricsOutput(text=self.metrics.prometheus())
+        else:
+            output = ExportMetricsOutput(metrics=self.metrics.snapshot())
+        if input_data.reset:
+            self.metrics.reset()
+        return output
     
     # =========================================================================
     # Messages
@@ -284,15 +3834,21 @@ class App(BaseApp):
         
         metadata.log(f"Editing message {input_data.message_id}")
         
-        await self._request(
-            "PATCH",
-            f"/channels/{input_data.channel_id}/messages/{input_data.message_id}",
-            {"content": input_data.content}
-        )
+        endpoint = f"/channels/{input_data.channel_id}/messages/{input_data.message_id}"
+        payload = {"content": input_data.content}
+        if input_data.coalesce:
+            _, payload, superseded = await self._coalesced_write(
+                "PATCH", endpoint, payload, input_data.max_staleness
+            )
+        else:
+            await self._request("PATCH", endpoint, payload)
+            superseded = False
         
         return EditMessageOutput(
             message_id=input_data.message_id,
-            updated=True
+            updated=True,
+            content=payload["content"],
+            superseded=superseded
         )
     
     async def delete_message(self, input_data: DeleteMessageInput, metadata) -> DeleteMessageOutput:
@@ -300,15 +3856,212 @@ class App(BaseApp):
         self._validate_snowflake("channel_id", input_data.channel_id)
         self._validate_snowflake("message_id", input_data.message_id)
         
+        endpoint = f"/channels/{input_data.channel_id}/messages/{input_data.message_id}"
+        if self._wants_preflight(input_data):
+            # Only visibility can be checked: deleting the bot's own messages
+            # needs no Manage Messages, and the author is not known here
+            channel = await self._cached_get("channel", (input_data.channel_id,), f"/channels/{input_data.channel_id}")
+            if channel.get("guild_id"):
+                await self._preflight(
+                    channel["guild_id"], "DELETE", endpoint, VIEW_CHANNEL, channel_id=input_data.channel_id
+                )
+        
         metadata.log(f"Deleting message {input_data.message_id}")
         
-        await self._request(
-            "DELETE",
-            f"/channels/{input_data.channel_id}/messages/{input_data.message_id}"
-        )
+        await self._request("DELETE", endpoint)
         
         return DeleteMessageOutput(deleted=True)
     
+    async def purge_messages(self, input_data: PurgeMessagesInput, metadata) -> PurgeMessagesOutput:
+        """Delete matching messages, bulk-deleting those younger than 14 days."""
+        started = time.monotonic()
+        channel_id = input_data.channel_id
+        self._validate_snowflake("channel_id", channel_id)
+        if input_data.author_id:
+            self._validate_snowflake("author_id", input_data.author_id)
+        after = parse_snowflake_or_time(input_data.after) if input_data.after else None
+        before = parse_snowflake_or_time(input_data.before) if input_data.before else None
+        pattern = re.compile(input_data.content_pattern) if input_data.content_pattern else None
+        
+        metadata.log(f"Purging messages in channel {channel_id}")
+        
+        counts = {"scanned": 0, "matched": 0, "bulk_deleted": 0, "single_deleted": 0, "failed": 0}
+        semaphore = asyncio.Semaphore(self.PURGE_CONCURRENCY)
+        tasks = set()
+        
+        async def bulk_delete(ids: list):
+            try:
+                await self._request(
+                    "POST", f"/channels/{channel_id}/messages/bulk-delete", {"messages": ids}
+                )
+                counts["bulk_deleted"] += len(ids)
+            except Exception as e:
+                metadata.log(f"Bulk delete of {len(ids)} messages failed: {e}")
+                counts["failed"] += len(ids)
+        
+        async def single_delete(message_id: str):
+            try:
+                await self._request("DELETE", f"/channels/{channel_id}/messages/{message_id}")
+                counts["single_deleted"] += 1
+            except Exception:
+                counts["failed"] += 1
+        
+        async def spawn(coro):
+            # Backpressure: never hold more than PURGE_CONCURRENCY pending deletes
+            await semaphore.acquire()
+            task = asyncio.ensure_future(coro)
+            tasks.add(task)
+            task.add_done_callback(lambda t: (tasks.discard(t), semaphore.release()))
+        
+        bulk_cutoff = time.time() - self.BULK_DELETE_MAX_AGE
+        
+        async def flush(ids: list):
+            # A slow scan can age the first messages of a chunk past the limit
+            # while it fills, so check them again against the current time
+            nonlocal bulk_cutoff
+            bulk_cutoff = time.time() - self.BULK_DELETE_MAX_AGE
+            fresh = [message_id for message_id in ids if snowflake_time(message_id) > bulk_cutoff]
+            for message_id in ids:
+                # bulk-delete needs at least two messages
+                if len(fresh) < 2 or snowflake_time(message_id) <= bulk_cutoff:
+                    await spawn(single_delete(message_id))
+            if len(fresh) >= 2:
+                await spawn(bulk_delete(fresh))
+        
+        chunk = []
+        try:
+            async for message in self.iter_messages(channel_id, before=before, after=after):
+                counts["scanned"] += 1
+                if input_data.author_id and message.get("author", {}).get("id") != input_data.author_id:
+                    continue
+                if pattern and not pattern.search(message.get("content") or ""):
+                    continue
+                counts["matched"] += 1
+                
+                if snowflake_time(message["id"]) > bulk_cutoff:
+                    chunk.append(message["id"])
+                    if len(chunk) == self.BULK_DELETE_SIZE:
+                        await flush(chunk)
+                        chunk = []
+                else:
+                    await spawn(single_delete(message["id"]))
+                
+                if counts["scanned"] % (self.PROGRESS_INTERVAL * 10) == 0:
+                    metadata.log(f"Purge: scanned {counts['scanned']}, matched {counts['matched']}")
+                if input_data.limit and counts["matched"] >= input_data.limit:
+                    break
+            if chunk:
+                await flush(chunk)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        elapsed = time.monotonic() - started
+        metadata.log(
+            f"Purged {counts['bulk_deleted'] + counts['single_deleted']} messages "
+            f"({counts['failed']} failed) in {elapsed:.1f}s"
+        )
+        return PurgeMessagesOutput(elapsed_seconds=round(elapsed, 3), **counts)
+    
+    def _channel_renderer(self, template: str, variables: dict, channel_variables: dict):
+        """Return ``async render(channel_id)`` producing that channel's content."""
+        fields = {name for _, name, _, _ in string.Formatter().parse(template) if name}
+        needs_channel = bool(fields & {"channel_name", "guild_id"})
+        
+        async def render(channel_id: str) -> str:
+            values = {"channel_id": channel_id, **variables, **channel_variables.get(channel_id, {})}
+            if needs_channel:
+                channel = await self._cached_get("channel", (channel_id,), f"/channels/{channel_id}")
+                values.setdefault("channel_name", channel.get("name", ""))
+                values.setdefault("guild_id", channel.get("guild_id", ""))
+            # Unknown placeholders are left as-is rather than failing the broadcast
+            return template.format_map(_TemplateValues(values))
+        
+        return render
+    
+    async def _fan_out(self, items: dict, send, concurrency: int) -> tuple[dict, dict]:
+        """Run ``send(key, value)`` for every item with bounded concurrency.
+        
+        Returns ``(results, errors)`` keyed like ``items``; one failure never
+        stops the others.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        results, errors = {}, {}
+        
+        async def run(key, value):
+            async with semaphore:
+                try:
+                    results[key] = await send(key, value)
+                except Exception as e:
+                    errors[key] = str(e)
+        
+        await asyncio.gather(*(run(key, value) for key, value in items.items()))
+        return results, errors
+    
+    async def broadcast_message(self, input_data: BroadcastMessageInput, metadata) -> BroadcastMessageOutput:
+        """Send a templated message to many channels across guilds."""
+        started = time.monotonic()
+        channel_ids = list(dict.fromkeys(input_data.channel_ids))
+        for channel_id in channel_ids:
+            self._validate_snowflake("channel_id", channel_id)
+        for guild_id in input_data.guild_ids:
+            self._validate_snowflake("guild_id", guild_id)
+        
+        guild_channels = await asyncio.gather(*(self._guild_channels(g) for g in input_data.guild_ids))
+        for channels in guild_channels:
+            for channel in channels:
+                # Text and announcement channels only
+                if channel.get("type") not in (0, 5) or channel["id"] in channel_ids:
+                    continue
+                if input_data.channel_name_pattern and not fnmatch.fnmatch(
+                    channel.get("name", ""), input_data.channel_name_pattern
+                ):
+                    continue
+                channel_ids.append(channel["id"])
+        if not channel_ids:
+            raise ValueError("No channels to broadcast to")
+        
+        metadata.log(f"Broadcasting to {len(channel_ids)} channels")
+        
+        render = self._channel_renderer(input_data.content, input_data.variables, input_data.channel_variables)
+        
+        async def send(channel_id: str, _) -> str:
+            content = await render(channel_id)
+            result = await self._request("POST", f"/channels/{channel_id}/messages", {"content": content})
+            return result.get("id", "")
+        
+        messages, failed = await self._fan_out(dict.fromkeys(channel_ids), send, input_data.concurrency)
+        
+        metadata.log(f"Broadcast finished: {len(messages)} sent, {len(failed)} failed")
+        return BroadcastMessageOutput(
+            messages=messages, failed=failed, elapsed_seconds=round(time.monotonic() - started, 3)
+        )
+    
+    async def edit_broadcast(self, input_data: EditBroadcastInput, metadata) -> EditBroadcastOutput:
+        """Edit every copy of a broadcast in one call."""
+        started = time.monotonic()
+        for channel_id, message_id in input_data.messages.items():
+            self._validate_snowflake("channel_id", channel_id)
+            self._validate_snowflake("message_id", message_id)
+        
+        metadata.log(f"Editing {len(input_data.messages)} broadcast copies")
+        
+        render = self._channel_renderer(input_data.content, input_data.variables, input_data.channel_variables)
+        
+        async def edit(channel_id: str, message_id: str) -> bool:
+            content = await render(channel_id)
+            await self._request("PATCH", f"/channels/{channel_id}/messages/{message_id}", {"content": content})
+            return True
+        
+        edited, failed = await self._fan_out(input_data.messages, edit, input_data.concurrency)
+        
+        metadata.log(f"Broadcast edit finished: {len(edited)} edited, {len(failed)} failed")
+        return EditBroadcastOutput(
+            edited=list(edited), failed=failed, elapsed_seconds=round(time.monotonic() - started, 3)
+        )
+    
     # =========================================================================
     # Channels
     # =========================================================================
@@ -317,7 +4070,9 @@ class App(BaseApp):
         """Get channel information."""
         self._validate_snowflake("channel_id", input_data.channel_id)
         
-        result = await self._request("GET", f"/channels/{input_data.channel_id}")
+        result = await self._cached_get(
+            "channel", (input_data.channel_id,), f"/channels/{input_data.channel_id}"
+        )
         
         return GetChannelOutput(
             id=result.get("id", ""),
@@ -325,7 +4080,8 @@ class App(BaseApp):
             type=result.get("type", 0),
             position=result.get("position"),
             topic=result.get("topic"),
-            nsfw=result.get("nsfw")
+            nsfw=result.get("nsfw"),
+            guild_id=result.get("guild_id"),
         )
     
     async def list_channels(self, input_data: ListChannelsInput, metadata) -> ListChannelsOutput:
@@ -334,8 +4090,19 @@ class App(BaseApp):
         
         metadata.log(f"Listing channels for guild {input_data.guild_id}")
         
-        result = await self._request("GET", f"/guilds/{input_data.guild_id}/channels")
+        result = self._lookup("channels", input_data.guild_id)
+        if result is None:
+            body = await self._request("GET", f"/guilds/{input_data.guild_id}/channels", raw=True)
+            if input_data.format == "raw":
+                # Passthrough: skip decoding entirely
+                return ListChannelsOutput(raw=body.decode())
+            result = self.decode(body)
+            self._store_channels(input_data.guild_id, result)
         
+        if input_data.format == "raw":
+            return ListChannelsOutput(raw=_json_dumps(result))
+        if input_data.format == "compact":
+            return ListChannelsOutput(channels=[ChannelRecord.from_json(c).to_dict() for c in result])
         return ListChannelsOutput(channels=result)
     
     async def create_channel(self, input_data: CreateChannelInput, metadata) -> CreateChannelOutput:
@@ -351,6 +4118,11 @@ class App(BaseApp):
             "stage": 13
         }
         channel_type_int = type_map.get(input_data.channel_type.lower(), 0)
+        if self._wants_preflight(input_data):
+            await self._preflight(
+                input_data.guild_id, "POST", f"/guilds/{input_data.guild_id}/channels",
+                PERMISSION_FLAGS["MANAGE_CHANNELS"]
+            )
         
         metadata.log(f"Creating {input_data.channel_type} channel: {input_data.name}")
         
@@ -363,6 +4135,10 @@ class App(BaseApp):
             }
         )
         
+        if result.get("id"):
+            self.cache.put("channel", result["id"], value=result)
+            self._append_cached_list("channels", input_data.guild_id, result)
+        
         return CreateChannelOutput(
             channel_id=result.get("id", ""),
             name=result.get("name", ""),
@@ -377,8 +4153,8 @@ class App(BaseApp):
         """Get guild (server) information."""
         self._validate_snowflake("guild_id", input_data.guild_id)
         
-        result = await self._request(
-            "GET", 
+        result = await self._cached_get(
+            "guild", (input_data.guild_id,),
             f"/guilds/{input_data.guild_id}?with_counts=true"
         )
         
@@ -388,7 +4164,152 @@ class App(BaseApp):
             icon=result.get("icon"),
             banner=result.get("banner"),
             description=result.get("description"),
-            approximate_member_count=result.get("approximate_member_count")
+            # Gateway state carries the exact member_count instead
+            approximate_member_count=result.get("approximate_member_count", result.get("member_count"))
+        )
+    
+    async def snapshot_guild(self, input_data: SnapshotGuildInput, metadata) -> SnapshotGuildOutput:
+        """Save the guild's roles, channels and permission overwrites to a JSON file."""
+        guild_id = input_data.guild_id
+        self._validate_snowflake("guild_id", guild_id)
+        
+        metadata.log(f"Snapshotting guild {guild_id}")
+        
+        guild, channels, roles = await asyncio.gather(
+            self._cached_get("guild", (guild_id,), f"/guilds/{guild_id}?with_counts=true"),
+            self._guild_channels(guild_id),
+            self._cached_get("roles", (guild_id,), f"/guilds/{guild_id}/roles"),
+        )
+        layout = snapshot_layout(guild, channels, roles)
+        
+        fd, path = tempfile.mkstemp(prefix=f"guild-{guild_id}-", suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            f.write(_json_dumps(layout))
+        overwrites = sum(len(c.get("overwrites", [])) for c in layout["channels"])
+        metadata.log(f"Saved {len(layout['roles'])} roles and {len(layout['channels'])} channels to {path}")
+        return SnapshotGuildOutput(
+            file=File(path=path),
+            roles=len(layout["roles"]),
+            channels=len(layout["channels"]),
+            overwrites=overwrites,
+        )
+    
+    async def apply_guild_plan(self, input_data: ApplyGuildPlanInput, metadata) -> ApplyGuildPlanOutput:
+        """Make the guild match a snapshot with the fewest creates, patches and deletes.
+        
+        Stages run in dependency order (roles, role positions, categories,
+        channels, channel positions, deletes); operations within a stage run
+        concurrently. Positions and category moves use the bulk routes.
+        """
+        started = time.monotonic()
+        guild_id = input_data.guild_id
+        self._validate_snowflake("guild_id", guild_id)
+        with open(input_data.snapshot.path) as f:
+            layout = json.load(f)
+        
+        # Always diff against fresh state, not the lookup cache
+        channels, roles = await asyncio.gather(
+            self._request("GET", f"/guilds/{guild_id}/channels"),
+            self._request("GET", f"/guilds/{guild_id}/roles"),
+        )
+        ops, role_ids, channel_ids = plan_layout(layout, channels, roles, input_data.delete_missing)
+        metadata.log(f"Plan for guild {guild_id}: {len(ops)} operations")
+        
+        results = [{"op": op["op"], "name": op["name"], "status": "planned"} for op in ops]
+        if input_data.dry_run or not ops:
+            return ApplyGuildPlanOutput(
+                operations=results, applied=0, failed=0, elapsed_seconds=round(time.monotonic() - started, 3)
+            )
+        
+        role_by_name = {}
+        for role in sorted(roles, key=lambda r: r.get("position", 0)):
+            role_by_name.setdefault(role["name"], role["id"])
+        
+        def resolve_overwrites(overwrites: list) -> list:
+            resolved = []
+            for overwrite in overwrites:
+                if "member" in overwrite:
+                    target, kind = overwrite["member"], 1
+                else:
+                    target, kind = role_by_name.get(overwrite["role"]), 0
+                    if target is None:
+                        raise ValueError(f"Role {overwrite['role']!r} for a permission overwrite does not exist")
+                resolved.append({"id": target, "type": kind, "allow": overwrite["allow"], "deny": overwrite["deny"]})
+            return resolved
+        
+        def parent_id(op: dict) -> Optional[str]:
+            if op.get("parent_ref") is None:
+                return None
+            if op["parent_ref"] not in channel_ids:
+                raise ValueError(f"Category {op['parent']!r} was not created")
+            return channel_ids[op["parent_ref"]]
+        
+        async def run(index: int, op: dict):
+            kind = op["op"]
+            if kind == "create_role":
+                role = await self._request("POST", f"/guilds/{guild_id}/roles", op["payload"])
+                role_ids[op["ref"]] = role["id"]
+                role_by_name.setdefault(role["name"], role["id"])
+            elif kind == "patch_role":
+                await self._request("PATCH", f"/guilds/{guild_id}/roles/{op['id']}", op["payload"])
+            elif kind == "move_roles":
+                moves = [
+                    {"id": role_ids[move["ref"]], "position": move["position"]}
+                    for move in op["moves"] if move["ref"] in role_ids
+                ]
+                # Nothing to send when every role to move failed to be created
+                if moves:
+                    await self._request("PATCH", f"/guilds/{guild_id}/roles", moves)
+            elif kind == "create_channel":
+                payload = {**op["payload"], "permission_overwrites": resolve_overwrites(op["overwrites"])}
+                if op.get("parent_ref") is not None:
+                    payload["parent_id"] = parent_id(op)
+                channel = await self._request("POST", f"/guilds/{guild_id}/channels", payload)
+                channel_ids[op["ref"]] = channel["id"]
+            elif kind == "patch_channel":
+                payload = dict(op["payload"])
+                if "overwrites" in op:
+                    payload["permission_overwrites"] = resolve_overwrites(op["overwrites"])
+                await self._request("PATCH", f"/channels/{op['id']}", payload)
+            elif kind == "move_channels":
+                moves = []
+                for move in op["moves"]:
+                    if move["ref"] not in channel_ids:
+                        continue
+                    entry = {"id": channel_ids[move["ref"]], "position": move["position"]}
+                    if move["parent"] is None:
+                        entry["parent_id"] = None
+                    elif move.get("parent_ref") is not None:
+                        entry["parent_id"] = parent_id(move)
+                    # A category missing from the layout is left as it is, not cleared
+                    moves.append(entry)
+                if moves:
+                    await self._request("PATCH", f"/guilds/{guild_id}/channels", moves)
+            elif kind == "delete_channel":
+                await self._request("DELETE", f"/channels/{op['id']}")
+            elif kind == "delete_role":
+                await self._request("DELETE", f"/guilds/{guild_id}/roles/{op['id']}")
+        
+        failed = 0
+        for stage in sorted({op["stage"] for op in ops}):
+            batch = {i: op for i, op in enumerate(ops) if op["stage"] == stage}
+            _, errors = await self._fan_out(batch, run, input_data.concurrency)
+            for i in batch:
+                if i in errors:
+                    results[i].update(status="failed", error=errors[i])
+                    failed += 1
+                else:
+                    results[i]["status"] = "done"
+        
+        self.cache.invalidate("channels", guild_id)
+        self.cache.invalidate("roles", guild_id)
+        for channel in channels:
+            self.cache.invalidate("channel", channel["id"])
+        
+        elapsed = time.monotonic() - started
+        metadata.log(f"Applied {len(ops) - failed} operations ({failed} failed) in {elapsed:.1f}s")
+        return ApplyGuildPlanOutput(
+            operations=results, applied=len(ops) - failed, failed=failed, elapsed_seconds=round(elapsed, 3)
         )
     
     # =========================================================================
@@ -399,8 +4320,18 @@ class App(BaseApp):
         """List all roles in a guild."""
         self._validate_snowflake("guild_id", input_data.guild_id)
         
-        result = await self._request("GET", f"/guilds/{input_data.guild_id}/roles")
+        result = self._lookup("roles", input_data.guild_id)
+        if result is None:
+            body = await self._request("GET", f"/guilds/{input_data.guild_id}/roles", raw=True)
+            if input_data.format == "raw":
+                return ListRolesOutput(raw=body.decode())
+            result = self.decode(body)
+            self.cache.put("roles", input_data.guild_id, value=result)
         
+        if input_data.format == "raw":
+            return ListRolesOutput(raw=_json_dumps(result))
+        if input_data.format == "compact":
+            return ListRolesOutput(roles=[RoleRecord.from_json(r).to_dict() for r in result])
         return ListRolesOutput(roles=result)
     
     async def create_role(self, input_data: CreateRoleInput, metadata) -> CreateRoleOutput:
@@ -419,6 +4350,9 @@ class App(BaseApp):
             }
         )
         
+        if result.get("id"):
+            self._append_cached_list("roles", input_data.guild_id, result)
+        
         return CreateRoleOutput(
             role_id=result.get("id", ""),
             name=result.get("name", "")
@@ -430,12 +4364,16 @@ class App(BaseApp):
         self._validate_snowflake("user_id", input_data.user_id)
         self._validate_snowflake("role_id", input_data.role_id)
         
+        endpoint = f"/guilds/{input_data.guild_id}/members/{input_data.user_id}/roles/{input_data.role_id}"
+        if self._wants_preflight(input_data):
+            await self._preflight(
+                input_data.guild_id, "PUT", endpoint, PERMISSION_FLAGS["MANAGE_ROLES"], role_id=input_data.role_id
+            )
+        
         metadata.log(f"Adding role {input_data.role_id} to user {input_data.user_id}")
         
-        await self._request(
-            "PUT",
-            f"/guilds/{input_data.guild_id}/members/{input_data.user_id}/roles/{input_data.role_id}"
-        )
+        await self._request("PUT", endpoint)
+        self._update_cached_member(input_data.guild_id, input_data.user_id, add_role=input_data.role_id)
         
         return AddRoleOutput(
             user_id=input_data.user_id,
@@ -449,12 +4387,16 @@ class App(BaseApp):
         self._validate_snowflake("user_id", input_data.user_id)
         self._validate_snowflake("role_id", input_data.role_id)
         
+        endpoint = f"/guilds/{input_data.guild_id}/members/{input_data.user_id}/roles/{input_data.role_id}"
+        if self._wants_preflight(input_data):
+            await self._preflight(
+                input_data.guild_id, "DELETE", endpoint, PERMISSION_FLAGS["MANAGE_ROLES"], role_id=input_data.role_id
+            )
+        
         metadata.log(f"Removing role {input_data.role_id} from user {input_data.user_id}")
         
-        await self._request(
-            "DELETE",
-            f"/guilds/{input_data.guild_id}/members/{input_data.user_id}/roles/{input_data.role_id}"
-        )
+        await self._request("DELETE", endpoint)
+        self._update_cached_member(input_data.guild_id, input_data.user_id, remove_role=input_data.role_id)
         
         return RemoveRoleOutput(
             user_id=input_data.user_id,
@@ -462,6 +4404,218 @@ class App(BaseApp):
             success=True
         )
     
+    async def bulk_add_roles(self, input_data: BulkAddRolesInput, metadata) -> BulkAddRolesOutput:
+        """Assign many roles concurrently, preserving order per member."""
+        results = await self._bulk_roles("PUT", input_data, metadata)
+        return BulkAddRolesOutput(results=results, **self._count_results(results))
+    
+    async def bulk_remove_roles(self, input_data: BulkRemoveRolesInput, metadata) -> BulkRemoveRolesOutput:
+        """Remove many roles concurrently, preserving order per member."""
+        results = await self._bulk_roles("DELETE", input_data, metadata)
+        return BulkRemoveRolesOutput(results=results, **self._count_results(results))
+    
+    def _count_results(self, results: list) -> dict:
+        skipped = sum(1 for r in results if r.skipped)
+        succeeded = sum(1 for r in results if r.success) - skipped
+        return {"succeeded": succeeded, "failed": len(results) - succeeded - skipped, "skipped": skipped}
+    
+    async def _bulk_roles(self, method: str, input_data, metadata) -> list:
+        """Fan out role PUT/DELETE calls over members with bounded concurrency.
+        
+        Each member's changes run sequentially in input order; members run in
+        parallel. Successful items are appended to the checkpoint file so a
+        rerun with the same path skips them.
+        """
+        guild_id = input_data.guild_id
+        self._validate_snowflake("guild_id", guild_id)
+        for item in input_data.assignments:
+            self._validate_snowflake("user_id", item.user_id)
+            self._validate_snowflake("role_id", item.role_id)
+        
+        done = set()
+        torn = False
+        if input_data.checkpoint_path and os.path.exists(input_data.checkpoint_path):
+            with open(input_data.checkpoint_path) as f:
+                lines = f.read().split("\n")
+            # A last line without a newline was cut off mid-write: not done
+            torn = lines.pop() != ""
+            done = {line.strip() for line in lines if line.strip()}
+        
+        total = len(input_data.assignments)
+        results: list = [None] * total
+        by_member: dict[str, list] = {}
+        for index, item in enumerate(input_data.assignments):
+            key = f"{method} {guild_id} {item.user_id} {item.role_id}"
+            if key in done:
+                results[index] = RoleAssignmentResult(
+                    user_id=item.user_id, role_id=item.role_id, success=True, skipped=True
+                )
+            else:
+                by_member.setdefault(item.user_id, []).append((index, item, key))
+        
+        pending = sum(len(items) for items in by_member.values())
+        verb = "Adding" if method == "PUT" else "Removing"
+        metadata.log(
+            f"{verb} {pending} role assignments for {len(by_member)} members "
+            f"({total - pending} already done)"
+        )
+        
+        checkpoint = open(input_data.checkpoint_path, "a") if input_data.checkpoint_path else None
+        if torn:
+            # Keep the next key off the torn line
+            checkpoint.write("\n")
+        semaphore = asyncio.Semaphore(input_data.concurrency)
+        preflight = self._wants_preflight(input_data)
+        completed = 0
+        
+        async def run_member(items: list):
+            nonlocal completed
+            async with semaphore:
+                for index, item, key in items:
+                    endpoint = f"/guilds/{guild_id}/members/{item.user_id}/roles/{item.role_id}"
+                    try:
+                        if preflight:
+                            await self._preflight(
+                                guild_id, method, endpoint, PERMISSION_FLAGS["MANAGE_ROLES"], role_id=item.role_id
+                            )
+                        await self._request(method, endpoint)
+                        if method == "PUT":
+                            self._update_cached_member(guild_id, item.user_id, add_role=item.role_id)
+                        else:
+                            self._update_cached_member(guild_id, item.user_id, remove_role=item.role_id)
+                        results[index] = RoleAssignmentResult(
+                            user_id=item.user_id, role_id=item.role_id, success=True
+                        )
+                        if checkpoint:
+                            checkpoint.write(key + "\n")
+                            checkpoint.flush()
+                    except Exception as e:
+                        results[index] = RoleAssignmentResult(
+                            user_id=item.user_id, role_id=item.role_id, success=False, error=str(e)
+                        )
+                    completed += 1
+                    if completed % self.PROGRESS_INTERVAL == 0:
+                        metadata.log(f"{verb} roles: {completed}/{pending} done")
+        
+        try:
+            await asyncio.gather(*(run_member(items) for items in by_member.values()))
+        finally:
+            if checkpoint:
+                checkpoint.close()
+        
+        failed = sum(1 for r in results if not r.success)
+        metadata.log(f"{verb} roles finished: {total - failed} ok, {failed} failed")
+        return results
+    
+    # =========================================================================
+    # Permissions
+    # =========================================================================
+    
+    async def _bot_user_id(self) -> str:
+        if self.bot_user_id is None:
+            user = await self._request("GET", "/users/@me")
+            self.bot_user_id = user["id"]
+        return self.bot_user_id
+    
+    async def _member_object(self, guild_id: str, user_id: str) -> dict:
+        return await self._cached_get(
+            "member", (guild_id, user_id), f"/guilds/{guild_id}/members/{user_id}"
+        )
+    
+    async def _permission_engine(self, guild_id: str) -> PermissionEngine:
+        """Permission engine over the cached guild, roles and channels.
+        
+        Rebuilt only when one of them has been refetched or replaced.
+        """
+        sources = await asyncio.gather(
+            self._cached_get("guild", (guild_id,), f"/guilds/{guild_id}?with_counts=true"),
+            self._cached_get("roles", (guild_id,), f"/guilds/{guild_id}/roles"),
+            self._guild_channels(guild_id),
+        )
+        cached = self._permission_engines.get(guild_id)
+        if cached is not None and all(a is b for a, b in zip(cached[0], sources)):
+            return cached[1]
+        engine = PermissionEngine(*sources)
+        self._permission_engines[guild_id] = (sources, engine)
+        return engine
+    
+    def _wants_preflight(self, input_data: BaseModel) -> bool:
+        return self.preflight or input_data.preflight
+    
+    async def _preflight(
+        self,
+        guild_id: str,
+        method: str,
+        endpoint: str,
+        needed: int = 0,
+        channel_id: Optional[str] = None,
+        role_id: Optional[str] = None,
+        target_id: Optional[str] = None,
+    ):
+        """Raise MissingPermissions if the bot cannot make a call.
+        
+        ``needed`` flags are checked guild-wide, or in ``channel_id``.
+        ``role_id`` must sit below the bot's highest role and ``target_id``
+        must be a member it outranks (or not a member at all).
+        """
+        route = route_key(method, endpoint)[0]
+        engine, bot = await asyncio.gather(
+            self._permission_engine(guild_id), self._member_object(guild_id, await self._bot_user_id())
+        )
+        bits = engine.channel(bot, channel_id) if channel_id else engine.base(bot)
+        missing = permission_names(needed & ~bits)
+        if missing:
+            raise MissingPermissions(f"Missing Permissions: {', '.join(missing)} (checked locally)", missing, method, route)
+        if bot["user"]["id"] == engine.owner_id:
+            return
+        top = engine.top_position(bot)
+        if role_id is not None:
+            if role_id in engine.managed_roles:
+                raise MissingPermissions(f"Role {role_id} is managed by an integration", [], method, route)
+            if engine.role_positions.get(role_id, -1) >= top:
+                raise MissingPermissions(f"Role {role_id} is not below the bot's highest role", [], method, route)
+        if target_id is not None:
+            if target_id == engine.owner_id:
+                raise MissingPermissions("The guild owner cannot be moderated", [], method, route)
+            try:
+                target = await self._member_object(guild_id, target_id)
+            except DiscordAPIError as e:
+                if e.status != 404:
+                    raise
+                return
+            if engine.top_position(target) >= top:
+                raise MissingPermissions(
+                    f"User {target_id}'s highest role is not below the bot's", [], method, route
+                )
+    
+    async def get_permissions(self, input_data: GetPermissionsInput, metadata) -> GetPermissionsOutput:
+        """Compute effective permissions for many members and channels at once.
+        
+        Uses the cached roles and channel overwrites, so only members not yet
+        cached cost a request. Without user_ids, reports the bot itself.
+        """
+        guild_id = input_data.guild_id
+        self._validate_snowflake("guild_id", guild_id)
+        for user_id in input_data.user_ids:
+            self._validate_snowflake("user_id", user_id)
+        
+        engine = await self._permission_engine(guild_id)
+        unknown = [c for c in input_data.channel_ids if c not in engine.overwrites]
+        if unknown:
+            raise ValueError(f"Channels not in guild {guild_id}: {', '.join(unknown)}")
+        user_ids = input_data.user_ids or [await self._bot_user_id()]
+        members = await asyncio.gather(*(self._member_object(guild_id, user_id) for user_id in user_ids))
+        results = engine.compute(members, input_data.channel_ids or list(engine.overwrites))
+        
+        render = permission_names if input_data.format == "names" else str
+        return GetPermissionsOutput(
+            guild={user_id: render(base) for user_id, (base, _) in results.items()},
+            channels={
+                user_id: {channel_id: render(bits) for channel_id, bits in channels.items()}
+                for user_id, (_, channels) in results.items()
+            },
+        )
+    
     # =========================================================================
     # Members
     # =========================================================================
@@ -471,8 +4625,8 @@ class App(BaseApp):
         self._validate_snowflake("guild_id", input_data.guild_id)
         self._validate_snowflake("user_id", input_data.user_id)
         
-        result = await self._request(
-            "GET",
+        result = await self._cached_get(
+            "member", (input_data.guild_id, input_data.user_id),
             f"/guilds/{input_data.guild_id}/members/{input_data.user_id}"
         )
         
@@ -483,6 +4637,79 @@ class App(BaseApp):
             joined_at=result.get("joined_at")
         )
     
+    async def _member_index(self, guild_id: str, refresh: bool, metadata) -> MemberIndex:
+        """Return the guild's member index, building it if missing or stale.
+        
+        Concurrent callers share one build.
+        """
+        index = self.member_indexes.get(guild_id)
+        if index is not None and not refresh and time.monotonic() - index.built_at < self.MEMBER_INDEX_MAX_AGE:
+            return index
+        build = self._index_builds.get(guild_id)
+        if build is None:
+            async def run() -> MemberIndex:
+                started = time.monotonic()
+                index = MemberIndex(guild_id)
+                index.start_loading()
+                async for member in self.iter_members(guild_id):
+                    index.put(member)
+                index.finish_loading()
+                index.built_at = time.monotonic()
+                self.member_indexes[guild_id] = index
+                metadata.log(f"Indexed {len(index)} members in {index.built_at - started:.1f}s")
+                return index
+            
+            build = self._index_builds[guild_id] = asyncio.ensure_future(run())
+            build.add_done_callback(lambda _: self._index_builds.pop(guild_id, None))
+        return await asyncio.shield(build)
+    
+    async def search_members(self, input_data: SearchMembersInput, metadata) -> SearchMembersOutput:
+        """Search members by name, roles and join time using a local index.
+        
+        The index is built from paginated member enumeration on first use and
+        kept current with our own role, nickname, kick and ban calls (and
+        Gateway member events, when connected).
+        """
+        guild_id = input_data.guild_id
+        self._validate_snowflake("guild_id", guild_id)
+        for role_id in (*input_data.all_roles, *input_data.any_roles, *input_data.exclude_roles):
+            self._validate_snowflake("role_id", role_id)
+        joined_after, joined_before = (
+            snowflake_time(parse_snowflake_or_time(value)) if value else None
+            for value in (input_data.joined_after, input_data.joined_before)
+        )
+        
+        index = await self._member_index(guild_id, input_data.refresh, metadata)
+        members, total = [], 0
+        for record in index.search(
+            name=input_data.name,
+            all_roles=input_data.all_roles,
+            any_roles=input_data.any_roles,
+            exclude_roles=input_data.exclude_roles,
+            no_roles=input_data.no_roles,
+            include_bots=input_data.include_bots,
+            joined_after=joined_after,
+            joined_before=joined_before,
+        ):
+            total += 1
+            if total <= input_data.limit:
+                members.append({
+                    "user_id": record["user_id"],
+                    "username": record["username"],
+                    "global_name": record["global_name"],
+                    "nick": record["nick"],
+                    "bot": record["bot"],
+                    "roles": list(record["roles"]),
+                    "joined_at": record["joined_at"],
+                })
+        
+        return SearchMembersOutput(
+            members=members,
+            total=total,
+            indexed=len(index),
+            index_age_seconds=round(time.monotonic() - index.built_at, 3),
+        )
+    
     async def set_nickname(self, input_data: SetNicknameInput, metadata) -> SetNicknameOutput:
         """Set a member's nickname."""
         self._validate_snowflake("guild_id", input_data.guild_id)
@@ -490,15 +4717,21 @@ class App(BaseApp):
         
         metadata.log(f"Setting nickname for user {input_data.user_id}")
         
-        await self._request(
-            "PATCH",
-            f"/guilds/{input_data.guild_id}/members/{input_data.user_id}",
-            {"nick": input_data.nick if input_data.nick else None}
-        )
+        endpoint = f"/guilds/{input_data.guild_id}/members/{input_data.user_id}"
+        payload = {"nick": input_data.nick if input_data.nick else None}
+        if input_data.coalesce:
+            _, payload, superseded = await self._coalesced_write(
+                "PATCH", endpoint, payload, input_data.max_staleness
+            )
+        else:
+            await self._request("PATCH", endpoint, payload)
+            superseded = False
+        self._update_cached_member(input_data.guild_id, input_data.user_id, nick=payload["nick"])
         
         return SetNicknameOutput(
             user_id=input_data.user_id,
-            nick=input_data.nick if input_data.nick else None
+            nick=payload["nick"],
+            superseded=superseded
         )
     
     async def ban_user(self, input_data: BanUserInput, metadata) -> BanUserOutput:
@@ -506,19 +4739,25 @@ class App(BaseApp):
         self._validate_snowflake("guild_id", input_data.guild_id)
         self._validate_snowflake("user_id", input_data.user_id)
         
+        if self._wants_preflight(input_data):
+            await self._preflight(
+                input_data.guild_id, "PUT", f"/guilds/{input_data.guild_id}/bans/{input_data.user_id}",
+                PERMISSION_FLAGS["BAN_MEMBERS"], target_id=input_data.user_id
+            )
+        
         metadata.log(f"Banning user {input_data.user_id}")
         
         payload = {
             "delete_message_days": input_data.delete_messages_days or 0
         }
-        if input_data.reason:
-            payload["reason"] = input_data.reason
         
         await self._request(
             "PUT",
             f"/guilds/{input_data.guild_id}/bans/{input_data.user_id}",
-            payload
+            payload,
+            reason=input_data.reason
         )
+        self._forget_member(input_data.guild_id, input_data.user_id)
         
         return BanUserOutput(user_id=input_data.user_id, banned=True)
     
@@ -541,16 +4780,363 @@ class App(BaseApp):
         self._validate_snowflake("guild_id", input_data.guild_id)
         self._validate_snowflake("user_id", input_data.user_id)
         
-        metadata.log(f"Kicking user {input_data.user_id}")
+        if self._wants_preflight(input_data):
+            await self._preflight(
+                input_data.guild_id, "DELETE", f"/guilds/{input_data.guild_id}/members/{input_data.user_id}",
+                PERMISSION_FLAGS["KICK_MEMBERS"], target_id=input_data.user_id
+            )
         
-        endpoint = f"/guilds/{input_data.guild_id}/members/{input_data.user_id}"
-        if input_data.reason:
-            endpoint += f"?reason={input_data.reason}"
+        metadata.log(f"Kicking user {input_data.user_id}")
         
-        await self._request("DELETE", endpoint)
+        await self._request(
+            "DELETE",
+            f"/guilds/{input_data.guild_id}/members/{input_data.user_id}",
+            reason=input_data.reason
+        )
+        self._forget_member(input_data.guild_id, input_data.user_id)
         
         return KickUserOutput(user_id=input_data.user_id, kicked=True)
     
+    # =========================================================================
+    # Moderation
+    # =========================================================================
+    
+    def _moderation_user_ids(self, user_ids: list, member_filter: Optional[MemberFilter]) -> list:
+        """Validate and de-duplicate ``user_ids`` and check the filter's bounds.
+        
+        Runs before the first request, so bad input cannot stop a mass
+        action after some chunks were already applied.
+        """
+        for user_id in user_ids:
+            self._validate_snowflake("user_id", user_id)
+        if member_filter is not None:
+            for bound in (member_filter.joined_after, member_filter.joined_before):
+                if bound:
+                    parse_snowflake_or_time(bound)
+        return list(dict.fromkeys(user_ids))
+    
+    async def _moderation_targets(
+        self, guild_id: str, user_ids: list, member_filter: Optional[MemberFilter]
+    ) -> AsyncIterator[str]:
+        """Yield the explicit user IDs (from _moderation_user_ids), then
+        streamed members matching the filter."""
+        seen = set(user_ids)
+        for user_id in user_ids:
+            yield user_id
+        if member_filter is None:
+            return
+        
+        f = member_filter
+        joined_after = snowflake_time(parse_snowflake_or_time(f.joined_after)) if f.joined_after else None
+        joined_before = snowflake_time(parse_snowflake_or_time(f.joined_before)) if f.joined_before else None
+        pattern = f.name_pattern.lower() if f.name_pattern else None
+        matched = 0
+        async for member in self.iter_members(guild_id):
+            user = member.get("user", {})
+            if user.get("id") in seen or (user.get("bot") and not f.include_bots):
+                continue
+            if f.no_roles and member.get("roles"):
+                continue
+            if joined_after is not None or joined_before is not None:
+                if not member.get("joined_at"):
+                    # No join date to compare (e.g. a member object without one)
+                    continue
+                joined = datetime.fromisoformat(member["joined_at"].replace("Z", "+00:00")).timestamp()
+                if (joined_after is not None and joined <= joined_after) or (
+                    joined_before is not None and joined >= joined_before
+                ):
+                    continue
+            if pattern:
+                names = (user.get("username"), user.get("global_name"), member.get("nick"))
+                if not any(fnmatch.fnmatchcase(name.lower(), pattern) for name in names if name):
+                    continue
+            seen.add(user["id"])
+            yield user["id"]
+            matched += 1
+            if f.limit and matched >= f.limit:
+                return
+    
+    async def _moderate(self, targets: AsyncIterator[str], size: int, act, metadata) -> tuple[int, list]:
+        """Feed ``targets`` to ``act(ids)`` in chunks of ``size`` as they stream in.
+        
+        At most MASS_MODERATION_CONCURRENCY chunks are in flight. Returns the
+        number of targets and, on a dry run (``act`` is None), their IDs.
+        """
+        semaphore = asyncio.Semaphore(self.MASS_MODERATION_CONCURRENCY)
+        tasks = set()
+        matched = 0
+        selected = []
+        
+        async def spawn(ids: list):
+            await semaphore.acquire()
+            task = asyncio.ensure_future(act(ids))
+            tasks.add(task)
+            task.add_done_callback(lambda t: (tasks.discard(t), semaphore.release()))
+        
+        chunk = []
+        try:
+            async for user_id in targets:
+                matched += 1
+                if act is None:
+                    selected.append(user_id)
+                    continue
+                chunk.append(user_id)
+                if len(chunk) == size:
+                    await spawn(chunk)
+                    chunk = []
+                if matched % self.PROGRESS_INTERVAL == 0:
+                    metadata.log(f"Selected {matched} users")
+            if chunk:
+                await spawn(chunk)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return matched, selected
+    
+    async def mass_ban(self, input_data: MassBanInput, metadata) -> MassBanOutput:
+        """Ban many users at once via the bulk-ban route, 200 per request.
+        
+        Falls back to concurrent single bans when the bulk route is not
+        available to the bot (it also needs Manage Server).
+        """
+        started = time.monotonic()
+        guild_id = input_data.guild_id
+        self._validate_snowflake("guild_id", guild_id)
+        if not input_data.user_ids and input_data.filter is None:
+            raise ValueError("Provide user_ids and/or a filter")
+        user_ids = self._moderation_user_ids(input_data.user_ids, input_data.filter)
+        
+        metadata.log(f"Mass ban in guild {guild_id}")
+        
+        banned, failed = [], {}
+        use_bulk = True
+        
+        async def ban_one(user_id: str):
+            try:
+                await self._request(
+                    "PUT", f"/guilds/{guild_id}/bans/{user_id}",
+                    {"delete_message_seconds": input_data.delete_message_seconds},
+                    reason=input_data.reason,
+                )
+                banned.append(user_id)
+                self._forget_member(guild_id, user_id)
+            except Exception as e:
+                failed[user_id] = str(e)
+        
+        async def ban_chunk(ids: list):
+            nonlocal use_bulk
+            if use_bulk:
+                try:
+                    result = await self._request(
+                        "POST", f"/guilds/{guild_id}/bulk-ban",
+                        {"user_ids": ids, "delete_message_seconds": input_data.delete_message_seconds},
+                        reason=input_data.reason,
+                    )
+                except DiscordAPIError as e:
+                    if e.status not in (403, 404, 405) or e.code == 500000:
+                        # 500000: none of the users could be banned
+                        failed.update(dict.fromkeys(ids, str(e)))
+                        return
+                    if use_bulk:
+                        metadata.log(f"Bulk-ban unavailable ({e.message}); banning one by one")
+                        use_bulk = False
+                except Exception as e:
+                    failed.update(dict.fromkeys(ids, str(e)))
+                    return
+                else:
+                    for user_id in result.get("banned_users", []):
+                        banned.append(user_id)
+                        self._forget_member(guild_id, user_id)
+                    for user_id in result.get("failed_users", []):
+                        failed[user_id] = "Not banned (already banned, or not bannable by the bot)"
+                    reported = set(result.get("banned_users", [])) | set(result.get("failed_users", []))
+                    for user_id in ids:
+                        if user_id not in reported:
+                            failed[user_id] = "Outcome unknown (not listed in the bulk-ban response)"
+                    return
+            await asyncio.gather(*(ban_one(user_id) for user_id in ids))
+        
+        matched, selected = await self._moderate(
+            self._moderation_targets(guild_id, user_ids, input_data.filter),
+            self.BULK_BAN_SIZE, None if input_data.dry_run else ban_chunk, metadata,
+        )
+        
+        elapsed = time.monotonic() - started
+        metadata.log(f"Banned {len(banned)} of {matched} users ({len(failed)} failed) in {elapsed:.1f}s")
+        return MassBanOutput(
+            matched=matched, banned=banned, failed=failed, selected=selected, elapsed_seconds=round(elapsed, 3)
+        )
+    
+    async def mass_kick(self, input_data: MassKickInput, metadata) -> MassKickOutput:
+        """Kick many users at once with concurrent, rate-limited requests."""
+        started = time.monotonic()
+        guild_id = input_data.guild_id
+        self._validate_snowflake("guild_id", guild_id)
+        if not input_data.user_ids and input_data.filter is None:
+            raise ValueError("Provide user_ids and/or a filter")
+        user_ids = self._moderation_user_ids(input_data.user_ids, input_data.filter)
+        
+        metadata.log(f"Mass kick in guild {guild_id}")
+        
+        kicked, failed = [], {}
+        
+        async def kick(ids: list):
+            user_id = ids[0]
+            try:
+                await self._request(
+                    "DELETE", f"/guilds/{guild_id}/members/{user_id}", reason=input_data.reason
+                )
+                kicked.append(user_id)
+                self._forget_member(guild_id, user_id)
+            except Exception as e:
+                failed[user_id] = str(e)
+        
+        matched, selected = await self._moderate(
+            self._moderation_targets(guild_id, user_ids, input_data.filter),
+            1, None if input_data.dry_run else kick, metadata,
+        )
+        
+        elapsed = time.monotonic() - started
+        metadata.log(f"Kicked {len(kicked)} of {matched} users ({len(failed)} failed) in {elapsed:.1f}s")
+        return MassKickOutput(
+            matched=matched, kicked=kicked, failed=failed, selected=selected, elapsed_seconds=round(elapsed, 3)
+        )
+    
+    # =========================================================================
+    # Enumeration
+    # =========================================================================
+    
+    async def _paginate(
+        self,
+        endpoint: str,
+        page_size: int,
+        cursor_param: str,
+        cursor: Optional[str],
+        cursor_of,
+        limit: Optional[int] = None,
+        stop_at: Optional[str] = None,
+    ) -> AsyncIterator[dict]:
+        """Yield items from a snowflake-cursor paginated list endpoint.
+        
+        The next page is requested while the current one is being consumed,
+        so at most two pages are held in memory. ``cursor_of`` extracts the
+        snowflake of an item; when walking backwards with ``before``, items
+        at or below ``stop_at`` end the iteration.
+        """
+        separator = "&" if "?" in endpoint else "?"
+        
+        def fetch(after_cursor: Optional[str]):
+            url = f"{endpoint}{separator}limit={page_size}"
+            if after_cursor:
+                url += f"&{cursor_param}={after_cursor}"
+            return asyncio.ensure_future(self._request("GET", url))
+        
+        yielded = 0
+        pending = fetch(cursor)
+        try:
+            while pending is not None:
+                page = await pending
+                pending = None
+                if not page:
+                    return
+                if cursor_param == "after":
+                    # A copy: the page may be a single-flight result shared with other callers
+                    page = sorted(page, key=lambda item: int(cursor_of(item)))
+                next_cursor = cursor_of(page[-1])
+                if len(page) >= page_size:
+                    pending = fetch(next_cursor)
+                for item in page:
+                    if stop_at and int(cursor_of(item)) <= int(stop_at):
+                        return
+                    yield item
+                    yielded += 1
+                    if limit is not None and yielded >= limit:
+                        return
+        finally:
+            if pending is not None:
+                pending.cancel()
+    
+    def iter_members(self, guild_id: str, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        """Stream guild members in ascending user ID order."""
+        self._validate_snowflake("guild_id", guild_id)
+        return self._paginate(
+            f"/guilds/{guild_id}/members", self.MEMBERS_PAGE_SIZE,
+            "after", None, lambda member: member["user"]["id"], limit
+        )
+    
+    def iter_bans(self, guild_id: str, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        """Stream guild bans in ascending user ID order."""
+        self._validate_snowflake("guild_id", guild_id)
+        return self._paginate(
+            f"/guilds/{guild_id}/bans", self.BANS_PAGE_SIZE,
+            "after", None, lambda ban: ban["user"]["id"], limit
+        )
+    
+    def iter_messages(
+        self,
+        channel_id: str,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[dict]:
+        """Stream channel history.
+        
+        Walks backwards from ``before`` (or the newest message), stopping at
+        ``after``. With only ``after`` set, walks forwards in ascending order.
+        """
+        self._validate_snowflake("channel_id", channel_id)
+        for name, value in (("before", before), ("after", after)):
+            if value is not None:
+                self._validate_snowflake(name, value)
+        if after and not before:
+            return self._paginate(
+                f"/channels/{channel_id}/messages", self.MESSAGES_PAGE_SIZE,
+                "after", after, lambda message: message["id"], limit
+            )
+        return self._paginate(
+            f"/channels/{channel_id}/messages", self.MESSAGES_PAGE_SIZE,
+            "before", before, lambda message: message["id"], limit, stop_at=after
+        )
+    
+    async def _write_ndjson(self, items: AsyncIterator[dict], prefix: str, metadata) -> tuple[File, int]:
+        """Write streamed items to a temporary NDJSON file."""
+        fd, path = tempfile.mkstemp(prefix=f"{prefix}-", suffix=".ndjson")
+        count = 0
+        with os.fdopen(fd, "w") as f:
+            async for item in items:
+                f.write(_json_dumps(item))
+                f.write("\n")
+                count += 1
+                if count % (self.PROGRESS_INTERVAL * 10) == 0:
+                    metadata.log(f"Exported {count} {prefix}")
+        metadata.log(f"Exported {count} {prefix} to {path}")
+        return File(path=path), count
+    
+    async def export_members(self, input_data: ExportMembersInput, metadata) -> ExportMembersOutput:
+        """Export all guild members as NDJSON."""
+        members = self.iter_members(input_data.guild_id, input_data.limit)
+        metadata.log(f"Exporting members of guild {input_data.guild_id}")
+        file, count = await self._write_ndjson(members, "members", metadata)
+        return ExportMembersOutput(file=file, count=count)
+    
+    async def export_bans(self, input_data: ExportBansInput, metadata) -> ExportBansOutput:
+        """Export all guild bans as NDJSON."""
+        bans = self.iter_bans(input_data.guild_id, input_data.limit)
+        metadata.log(f"Exporting bans of guild {input_data.guild_id}")
+        file, count = await self._write_ndjson(bans, "bans", metadata)
+        return ExportBansOutput(file=file, count=count)
+    
+    async def export_messages(self, input_data: ExportMessagesInput, metadata) -> ExportMessagesOutput:
+        """Export channel history as NDJSON."""
+        messages = self.iter_messages(
+            input_data.channel_id, input_data.before, input_data.after, input_data.limit
+        )
+        metadata.log(f"Exporting messages of channel {input_data.channel_id}")
+        file, count = await self._write_ndjson(messages, "messages", metadata)
+        return ExportMessagesOutput(file=file, count=count)
+    
     # =========================================================================
     # Webhooks
     # =========================================================================
@@ -567,21 +5153,212 @@ class App(BaseApp):
             {"name": input_data.name}
         )
         
+        if result.get("id") and result.get("token"):
+            self.webhooks.put(result["id"], result["token"], input_data.channel_id, result.get("name"))
+        
         return CreateWebhookOutput(
             webhook_id=result.get("id", ""),
             name=result.get("name", ""),
             token=result.get("token")
         )
     
+    def _webhook_token(self, webhook_id: str) -> str:
+        token = self.webhooks.get(webhook_id)
+        if token is None:
+            raise ValueError(
+                f"No token stored for webhook {webhook_id}; create it with create_webhook or pass token"
+            )
+        return token
+    
+    async def _execute_webhook(self, webhook_id: str, token: str, payload: dict, wait: bool) -> Optional[str]:
+        """Send one webhook message without the bot token; returns the message ID if waited."""
+        result = await self._request(
+            "POST",
+            f"/webhooks/{webhook_id}/{token}?wait={'true' if wait else 'false'}",
+            payload,
+            auth=False,
+        )
+        return result.get("id") if wait else None
+    
+    def _webhook_payload(self, content: str, username: Optional[str], avatar_url: Optional[str]) -> dict:
+        payload = {"content": content}
+        if username:
+            payload["username"] = username
+        if avatar_url:
+            payload["avatar_url"] = avatar_url
+        return payload
+    
     async def execute_webhook(self, input_data: ExecuteWebhookInput, metadata) -> ExecuteWebhookOutput:
         """Execute a webhook to send a message."""
         self._validate_snowflake("webhook_id", input_data.webhook_id)
+        token = input_data.token or self._webhook_token(input_data.webhook_id)
         
         metadata.log(f"Executing webhook {input_data.webhook_id}")
         
-        # For webhooks, we need the token too - this is a limitation
-        # In practice, you'd store webhook tokens or use bot API
-        raise NotImplementedError(
-            "execute_webhook requires a webhook token. "
-            "Use Discord bot API for sending messages instead."
+        message_id = await self._execute_webhook(
+            input_data.webhook_id,
+            token,
+            self._webhook_payload(input_data.content, input_data.username, input_data.avatar_url),
+            input_data.wait,
+        )
+        
+        return ExecuteWebhookOutput(sent=True, message_id=message_id)
+    
+    async def execute_webhooks(self, input_data: ExecuteWebhooksInput, metadata) -> ExecuteWebhooksOutput:
+        """Spread a burst of messages across several webhooks in parallel.
+        
+        Each webhook has its own rate limit, so N webhooks give roughly N
+        times the throughput of one. Messages sent through the same webhook
+        keep their relative order.
+        """
+        started = time.monotonic()
+        if not input_data.webhook_ids:
+            raise ValueError("webhook_ids must not be empty")
+        tokens = {}
+        for webhook_id in input_data.webhook_ids:
+            self._validate_snowflake("webhook_id", webhook_id)
+            tokens[webhook_id] = self._webhook_token(webhook_id)
+        
+        metadata.log(
+            f"Sending {len(input_data.contents)} messages across {len(input_data.webhook_ids)} webhooks"
+        )
+        
+        message_ids: list = [None] * len(input_data.contents)
+        errors = {}
+        
+        async def drain(lane: int):
+            webhook_id = input_data.webhook_ids[lane]
+            for index in range(lane, len(input_data.contents), len(input_data.webhook_ids)):
+                payload = self._webhook_payload(
+                    input_data.contents[index], input_data.username, input_data.avatar_url
+                )
+                try:
+                    message_ids[index] = await self._execute_webhook(
+                        webhook_id, tokens[webhook_id], payload, input_data.wait
+                    )
+                except Exception as e:
+                    errors[str(index)] = str(e)
+        
+        await asyncio.gather(*(drain(lane) for lane in range(len(input_data.webhook_ids))))
+        
+        elapsed = time.monotonic() - started
+        metadata.log(f"Webhook burst finished: {len(input_data.contents) - len(errors)} sent, {len(errors)} failed")
+        return ExecuteWebhooksOutput(
+            sent=len(input_data.contents) - len(errors),
+            failed=len(errors),
+            message_ids=message_ids,
+            errors=errors,
+            elapsed_seconds=round(elapsed, 3),
         )
+    
+    # =========================================================================
+    # Batch
+    # =========================================================================
+    
+    def _plan_batch(self, operations: list) -> list:
+        """Validate every step up front and resolve its dependencies.
+        
+        Returns ``(method, input_model, args, references, depends_on)`` per
+        step, where ``references`` maps argument name to (step index, field).
+        """
+        names = {}
+        for index, operation in enumerate(operations):
+            if operation.id:
+                if operation.id in names or operation.id.isdigit():
+                    raise ValueError(f"Step {index + 1}: duplicate or numeric id '{operation.id}'")
+                names[operation.id] = index
+        
+        plan = []
+        last_touch = {}
+        for index, operation in enumerate(operations):
+            label = f"Step {index + 1} ({operation.op})"
+            if operation.op not in self.BATCH_OPERATIONS:
+                raise ValueError(f"{label}: unsupported operation")
+            method = getattr(self, operation.op)
+            # From the class: in pool and outbox mode the instance holds forwarders
+            hints = get_type_hints(getattr(type(self), operation.op))
+            input_model = hints["input_data"]
+            
+            references = {}
+            placeholders = {}
+            for name, value in operation.args.items():
+                match = BATCH_REFERENCE.match(value) if isinstance(value, str) else None
+                if match is None:
+                    if name.endswith("_id") and isinstance(value, str):
+                        self._validate_snowflake(name, value)
+                    continue
+                target, field = match.groups()
+                target_index = int(target) - 1 if target.isdigit() else names.get(target)
+                if target_index is None or not 0 <= target_index < index:
+                    raise ValueError(f"{label}: '{value}' must reference an earlier step")
+                target_output = get_type_hints(getattr(type(self), operations[target_index].op))["return"]
+                if field not in target_output.model_fields:
+                    raise ValueError(f"{label}: step {target_index + 1} has no output field '{field}'")
+                references[name] = (target_index, field)
+                placeholders[name] = _reference_placeholder(target_output.model_fields[field].annotation)
+            
+            try:
+                input_model(**{**operation.args, **placeholders})
+            except Exception as e:
+                raise ValueError(f"{label}: invalid arguments: {e}") from e
+            
+            # Steps on the same channel's messages or the same member keep list order
+            depends_on = {target for target, _ in references.values()}
+            args = operation.args
+            touch = None
+            if "message" in operation.op and isinstance(args.get("channel_id"), str):
+                touch = ("channel", args["channel_id"])
+            elif isinstance(args.get("user_id"), str):
+                touch = ("member", args.get("guild_id"), args["user_id"])
+            if touch is not None:
+                if touch in last_touch:
+                    depends_on.add(last_touch[touch])
+                last_touch[touch] = index
+            
+            plan.append((method, input_model, operation.args, references, depends_on))
+        return plan
+    
+    async def run_batch(self, input_data: RunBatchInput, metadata) -> RunBatchOutput:
+        """Run many operations in one call, concurrently where independent."""
+        plan = self._plan_batch(input_data.operations)
+        metadata.log(f"Running batch of {len(plan)} operations")
+        
+        outputs: list = [None] * len(plan)
+        results: list = [None] * len(plan)
+        done = [asyncio.Event() for _ in plan]
+        semaphore = asyncio.Semaphore(input_data.concurrency)
+        
+        async def run_step(index: int):
+            method, input_model, args, references, depends_on = plan[index]
+            op = input_data.operations[index].op
+            try:
+                for dependency in sorted(depends_on):
+                    await done[dependency].wait()
+                failed = [d + 1 for d in sorted(depends_on) if not results[d].success]
+                if failed:
+                    results[index] = BatchStepResult(
+                        step=index + 1, op=op, success=False, skipped=True,
+                        error=f"Depends on failed step(s) {failed}"
+                    )
+                    return
+                
+                resolved = dict(args)
+                for name, (target, field) in references.items():
+                    resolved[name] = outputs[target][field]
+                
+                async with semaphore:
+                    output = await method(input_model(**resolved), metadata)
+                outputs[index] = output.model_dump()
+                results[index] = BatchStepResult(step=index + 1, op=op, success=True, output=outputs[index])
+            except Exception as e:
+                results[index] = BatchStepResult(step=index + 1, op=op, success=False, error=str(e))
+            finally:
+                done[index].set()
+        
+        await asyncio.gather(*(run_step(index) for index in range(len(plan))))
+        
+        succeeded = sum(1 for r in results if r.success)
+        skipped = sum(1 for r in results if r.skipped)
+        failed = len(results) - succeeded - skipped
+        metadata.log(f"Batch finished: {succeeded} ok, {failed} failed, {skipped} skipped")
+        return RunBatchOutput(results=results, succeeded=succeeded, failed=failed, skipped=skipped)
@@ -0,0 +1,66 @@
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import inference  # noqa: E402
+
+MESSAGES = "POST /channels/{channel_id}/messages"
+
+
+class Metadata:
+    def __init__(self):
+        self.lines = []
+
+    def log(self, message: str):
+        self.lines.append(message)
+
+
+def record_requests(app) -> list:
+    """(method, endpoint) of every request the app sends from now on."""
+    sent = []
+    request = app._request
+
+    async def recording(method, endpoint, *args, **kwargs):
+        sent.append((method, endpoint))
+        return await request(method, endpoint, *args, **kwargs)
+
+    app._request = recording
+    return sent
+
+
+@asynccontextmanager
+async def _running_app(simulator, **attributes):
+    """Start ``simulator`` and yield an App set up against it."""
+    await simulator.start()
+    os.environ["DISCORD_API_BASE"] = simulator.url
+    app = inference.App()
+    for name, value in attributes.items():
+        setattr(app, name, value)
+    try:
+        await app.setup(Metadata())
+        yield app
+    finally:
+        await app.unload()
+        await simulator.stop()
+
+
+@pytest.fixture(autouse=True)
+def discord_env(monkeypatch, tmp_path):
+    """A bot token, a private webhook vault and none of the optional modes."""
+    for name in list(os.environ):
+        if name.startswith("DISCORD_"):
+            monkeypatch.delenv(name)
+    monkeypatch.setenv("DISCORD_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("DISCORD_API_BASE", "")
+    monkeypatch.setenv("DISCORD_WEBHOOK_VAULT", str(tmp_path / "webhooks.db"))
+
+
+@pytest.fixture
+def running_app():
+    return _running_app
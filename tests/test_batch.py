@@ -0,0 +1,27 @@
+"""run_batch planning: references are checked against the referenced field's type."""
+
+import pytest
+
+import inference
+
+
+def plan(*operations):
+    return inference.App()._plan_batch([inference.BatchOperation(**operation) for operation in operations])
+
+
+def test_reference_to_non_string_field_is_accepted():
+    steps = plan(
+        {"op": "get_channel", "args": {"channel_id": "1" * 18}},
+        {"op": "create_channel", "args": {"guild_id": "2" * 18, "name": "copy", "preflight": "$1.nsfw"}},
+        {"op": "create_role", "args": {"guild_id": "2" * 18, "name": "typed", "color": "$1.type"}},
+    )
+    assert steps[1][3] == {"preflight": (0, "nsfw")}
+    assert steps[2][3] == {"color": (0, "type")}
+
+
+def test_reference_of_the_wrong_type_is_rejected_up_front():
+    with pytest.raises(ValueError, match="Step 2 .*invalid arguments"):
+        plan(
+            {"op": "get_channel", "args": {"channel_id": "1" * 18}},
+            {"op": "send_message", "args": {"channel_id": "1" * 18, "content": "$1.type"}},
+        )
@@ -0,0 +1,84 @@
+"""broadcast_message and edit_broadcast against the simulator."""
+
+import asyncio
+
+import pytest
+from simulator import DiscordSimulator
+
+import inference
+from conftest import Metadata
+
+
+def setup_guild(simulator: DiscordSimulator) -> tuple:
+    """A guild with two announce channels, a chat channel and a voice channel."""
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    announce = [simulator._create_channel(guild_id, {"name": f"announce-{i}"})["id"] for i in range(2)]
+    chat = simulator._create_channel(guild_id, {"name": "chat"})["id"]
+    simulator._create_channel(guild_id, {"name": "announce-voice", "type": 2})
+    return guild_id, announce, chat
+
+
+def content(simulator: DiscordSimulator, channel_id: str, message_id: str) -> str:
+    return simulator.messages[channel_id][message_id]["content"]
+
+
+def test_broadcast_renders_per_channel_and_reports_failures(running_app):
+    simulator = DiscordSimulator()
+    guild_id, announce, chat = setup_guild(simulator)
+    missing = simulator.ids.next()
+
+    async def main():
+        async with running_app(simulator) as app:
+            return await app.broadcast_message(inference.BroadcastMessageInput(
+                content="{greeting} #{channel_name} in {guild_id}{suffix} {unknown}",
+                channel_ids=[chat, missing],
+                guild_ids=[guild_id],
+                channel_name_pattern="announce*",
+                variables={"greeting": "Hello", "suffix": "."},
+                channel_variables={announce[1]: {"suffix": "!"}},
+            ), Metadata())
+
+    output = asyncio.run(main())
+    assert set(output.messages) == {chat, *announce}
+    assert list(output.failed) == [missing]
+    assert content(simulator, chat, output.messages[chat]) == f"Hello #chat in {guild_id}. {{unknown}}"
+    assert content(simulator, announce[0], output.messages[announce[0]]) == f"Hello #announce-0 in {guild_id}. {{unknown}}"
+    assert content(simulator, announce[1], output.messages[announce[1]]) == f"Hello #announce-1 in {guild_id}! {{unknown}}"
+
+
+def test_broadcast_without_channels_fails_before_sending(running_app):
+    simulator = DiscordSimulator()
+    guild_id, _, _ = setup_guild(simulator)
+
+    async def main():
+        async with running_app(simulator) as app:
+            await app.broadcast_message(inference.BroadcastMessageInput(
+                content="hi", guild_ids=[guild_id], channel_name_pattern="nothing*"
+            ), Metadata())
+
+    with pytest.raises(ValueError, match="No channels"):
+        asyncio.run(main())
+    assert simulator.route_counts.get("POST /channels/{channel_id}/messages", 0) == 0
+
+
+def test_edit_broadcast_edits_every_copy(running_app):
+    simulator = DiscordSimulator()
+    guild_id, announce, chat = setup_guild(simulator)
+
+    async def main():
+        async with running_app(simulator) as app:
+            sent = await app.broadcast_message(
+                inference.BroadcastMessageInput(content="v1 {channel_id}", channel_ids=[chat, *announce]), Metadata()
+            )
+            copies = {**sent.messages, announce[0]: simulator.ids.next()}
+            edited = await app.edit_broadcast(
+                inference.EditBroadcastInput(messages=copies, content="v2 #{channel_name}"), Metadata()
+            )
+            return sent, edited
+
+    sent, edited = asyncio.run(main())
+    assert sorted(edited.edited) == sorted([chat, announce[1]])
+    assert list(edited.failed) == [announce[0]]
+    assert content(simulator, chat, sent.messages[chat]) == "v2 #chat"
+    assert content(simulator, announce[1], sent.messages[announce[1]]) == "v2 #announce-1"
+    assert content(simulator, announce[0], sent.messages[announce[0]]) == f"v1 {announce[0]}"
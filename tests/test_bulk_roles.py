@@ -0,0 +1,81 @@
+"""bulk_add_roles / bulk_remove_roles: ordering, per-item results and checkpoints."""
+
+import asyncio
+
+from simulator import DiscordSimulator
+
+import inference
+from conftest import Metadata, record_requests
+
+ROLES = "PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}"
+
+
+def setup_guild(simulator: DiscordSimulator, members: int, roles: int) -> tuple:
+    guild_id = simulator.add_guild(channels=0, roles=roles, members=0)
+    role_ids = [r for r in simulator.roles[guild_id] if r != guild_id]
+    user_ids = [simulator.add_member(guild_id) for _ in range(members)]
+    return guild_id, user_ids, role_ids
+
+
+def test_results_follow_input_and_each_member_runs_in_order(running_app):
+    simulator = DiscordSimulator(latency=0.01)
+    guild_id, user_ids, role_ids = setup_guild(simulator, members=3, roles=3)
+    assignments = [
+        {"user_id": user_id, "role_id": role_id} for role_id in role_ids for user_id in user_ids
+    ] + [{"user_id": user_ids[0], "role_id": "1" * 18}]
+
+    async def main():
+        async with running_app(simulator) as app:
+            sent = record_requests(app)
+            result = await app.bulk_add_roles(
+                inference.BulkAddRolesInput(guild_id=guild_id, assignments=assignments, concurrency=3), Metadata()
+            )
+            return sent, result
+
+    sent, result = asyncio.run(main())
+    assert [(r.user_id, r.role_id) for r in result.results] == [(a["user_id"], a["role_id"]) for a in assignments]
+    assert [r.success for r in result.results] == [True] * 9 + [False]
+    assert "10011" in result.results[-1].error
+    assert (result.succeeded, result.failed, result.skipped) == (9, 1, 0)
+    for user_id in user_ids:
+        wanted = [a["role_id"] for a in assignments if a["user_id"] == user_id]
+        assert [e.rsplit("/", 1)[1] for _, e in sent if f"/members/{user_id}/" in e] == wanted
+        assert simulator.members[guild_id][user_id]["roles"] == role_ids
+
+
+def test_interrupted_run_resumes_from_its_checkpoint(running_app, tmp_path):
+    simulator = DiscordSimulator(latency=0.02)
+    guild_id, user_ids, role_ids = setup_guild(simulator, members=4, roles=5)
+    assignments = [{"user_id": u, "role_id": r} for u in user_ids for r in role_ids]
+    checkpoint = tmp_path / "roles.checkpoint"
+    request = inference.BulkAddRolesInput(
+        guild_id=guild_id, assignments=assignments, concurrency=2, checkpoint_path=str(checkpoint)
+    )
+
+    async def main():
+        async with running_app(simulator) as app:
+            run = asyncio.ensure_future(app.bulk_add_roles(request, Metadata()))
+            while not checkpoint.exists() or checkpoint.read_text().count("\n") < 6:
+                await asyncio.sleep(0.005)
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+        done = checkpoint.read_text().splitlines()
+        # The crash also tore the line being written
+        with open(checkpoint, "a") as f:
+            f.write(f"PUT {guild_id} {user_ids[-1]}")
+
+        async with running_app(simulator) as app:
+            sent = record_requests(app)
+            result = await app.bulk_add_roles(request, Metadata())
+        return done, sent, result
+
+    done, sent, result = asyncio.run(main())
+    assert 6 <= len(done) < len(assignments)
+    assert result.skipped == len(done) and result.failed == 0
+    resent = {f"PUT {guild_id} {e.split('/')[4]} {e.split('/')[6]}" for _, e in sent}
+    assert not resent & set(done)
+    assert len(sent) == len(assignments) - len(done)
+    lines = checkpoint.read_text().splitlines()
+    assert set(lines) - {f"PUT {guild_id} {user_ids[-1]}"} == {
+        f"PUT {guild_id} {a['user_id']} {a['role_id']}" for a in assignments
+    }
@@ -0,0 +1,174 @@
+"""ResponseCache eviction and expiry, lookups kept fresh by our own writes, and DiskCache warm-up."""
+
+import asyncio
+import time
+
+from simulator import DiscordSimulator
+
+import inference
+from conftest import Metadata
+
+MEMBER = "GET /guilds/{guild_id}/members/{user_id}"
+CHANNELS = "GET /guilds/{guild_id}/channels"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = inference.ResponseCache(max_size=2)
+    cache.put("guild", "1", value={"id": "1"})
+    cache.put("guild", "2", value={"id": "2"})
+    assert cache.get("guild", "1") == {"id": "1"}
+    cache.put("guild", "3", value={"id": "3"})
+    assert cache.get("guild", "2") is None
+    assert cache.get("guild", "1") == {"id": "1"}
+    assert cache.get("guild", "3") == {"id": "3"}
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"]["guild"] == 3
+    assert stats["misses"]["guild"] == 1
+
+
+def test_entries_expire_after_their_kind_ttl():
+    cache = inference.ResponseCache(ttls={"member": 0.05})
+    cache.put("member", "1", "2", value={"user": {"id": "2"}})
+    cache.put("guild", "1", value={"id": "1"})
+    assert cache.get("member", "1", "2") is not None
+    time.sleep(0.1)
+    assert cache.get("member", "1", "2") is None
+    assert cache.peek("member", "1", "2") is None
+    assert cache.get("guild", "1") == {"id": "1"}
+    assert cache.stats()["size"] == 1
+
+
+def run_member_lookups(running_app, simulator, guild_id, user_id, between, **attributes):
+    """get_member, ``between(app)``, get_member again; return both results."""
+    async def main():
+        async with running_app(simulator, **attributes) as app:
+            member = inference.GetMemberInput(guild_id=guild_id, user_id=user_id)
+            before = await app.get_member(member, Metadata())
+            await between(app)
+            return before, await app.get_member(member, Metadata())
+
+    return asyncio.run(main())
+
+
+def test_repeated_lookups_are_served_from_the_cache(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    user_id = simulator.add_member(guild_id)
+
+    async def nothing(app):
+        pass
+
+    before, after = run_member_lookups(running_app, simulator, guild_id, user_id, nothing)
+    assert before == after
+    assert simulator.route_counts[MEMBER] == 1
+
+
+def test_expired_lookups_are_fetched_again(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    user_id = simulator.add_member(guild_id)
+
+    async def wait(app):
+        await asyncio.sleep(0.1)
+
+    run_member_lookups(
+        running_app, simulator, guild_id, user_id, wait,
+        CACHE_TTLS={**inference.ResponseCache.DEFAULT_TTLS, "member": 0.05},
+    )
+    assert simulator.route_counts[MEMBER] == 2
+
+
+def test_own_role_changes_update_the_cached_member(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=1, members=0)
+    role_id = next(r for r in simulator.roles[guild_id] if r != guild_id)
+    user_id = simulator.add_member(guild_id)
+
+    async def add_role(app):
+        await app.add_role(inference.AddRoleInput(guild_id=guild_id, user_id=user_id, role_id=role_id), Metadata())
+
+    before, after = run_member_lookups(running_app, simulator, guild_id, user_id, add_role)
+    assert role_id not in before.roles
+    assert role_id in after.roles
+    assert simulator.members[guild_id][user_id]["roles"] == after.roles
+    assert simulator.route_counts[MEMBER] == 1
+
+
+def test_own_bans_drop_the_cached_member(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    user_id = simulator.add_member(guild_id)
+
+    async def main():
+        async with running_app(simulator) as app:
+            await app.get_member(inference.GetMemberInput(guild_id=guild_id, user_id=user_id), Metadata())
+            cached = app.cache.peek("member", guild_id, user_id)
+            await app.ban_user(inference.BanUserInput(guild_id=guild_id, user_id=user_id), Metadata())
+            return cached, app.cache.peek("member", guild_id, user_id)
+
+    cached, after = asyncio.run(main())
+    assert cached is not None
+    assert after is None
+
+
+def test_created_channels_join_the_cached_channel_list(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=2, roles=0, members=0)
+
+    async def main():
+        async with running_app(simulator) as app:
+            listing = inference.ListChannelsInput(guild_id=guild_id)
+            await app.list_channels(listing, Metadata())
+            created = await app.create_channel(
+                inference.CreateChannelInput(guild_id=guild_id, name="new-channel"), Metadata()
+            )
+            channels = await app.list_channels(listing, Metadata())
+            return created, channels
+
+    created, channels = asyncio.run(main())
+    assert created.channel_id in [c["id"] for c in channels.channels]
+    assert len(channels.channels) == 3
+    assert simulator.route_counts[CHANNELS] == 1
+
+
+def lookup_runs(running_app, simulator, guild_id, user_id, pause=0.0):
+    """Two App lifetimes, each looking up the guild, its channels and a member."""
+    async def lookups(app):
+        await app.get_guild(inference.GetGuildInput(guild_id=guild_id), Metadata())
+        await app.list_channels(inference.ListChannelsInput(guild_id=guild_id), Metadata())
+        await app.get_member(inference.GetMemberInput(guild_id=guild_id, user_id=user_id), Metadata())
+
+    async def main():
+        async with running_app(simulator) as app:
+            await lookups(app)
+        await asyncio.sleep(pause)
+        async with running_app(simulator) as app:
+            await lookups(app)
+
+    asyncio.run(main())
+
+
+def test_disk_cache_warms_the_next_start(running_app, monkeypatch, tmp_path):
+    monkeypatch.setenv("DISCORD_DISK_CACHE", str(tmp_path / "cache.db"))
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=2, roles=0, members=0)
+    user_id = simulator.add_member(guild_id)
+
+    lookup_runs(running_app, simulator, guild_id, user_id)
+    assert simulator.route_counts["GET /guilds/{guild_id}"] == 1
+    assert simulator.route_counts[CHANNELS] == 1
+    # Members are not persisted
+    assert simulator.route_counts[MEMBER] == 2
+
+
+def test_disk_cache_entries_expire(running_app, monkeypatch, tmp_path):
+    monkeypatch.setenv("DISCORD_DISK_CACHE", str(tmp_path / "cache.db"))
+    monkeypatch.setenv("DISCORD_DISK_CACHE_MAX_AGE", "0.2")
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=2, roles=0, members=0)
+    user_id = simulator.add_member(guild_id)
+
+    lookup_runs(running_app, simulator, guild_id, user_id, pause=0.3)
+    assert simulator.route_counts["GET /guilds/{guild_id}"] == 2
+    assert simulator.route_counts[CHANNELS] == 2
@@ -0,0 +1,52 @@
+"""Coalesced edit_message and set_nickname writes."""
+
+import asyncio
+
+from simulator import DiscordSimulator
+
+import inference
+from conftest import Metadata
+
+
+def test_superseded_marks_every_edit_merged_before_a_later_one(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=1, roles=0, members=0)
+    channel_id = next(c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id)
+    message_id = simulator.add_messages(channel_id, 1)[0]
+
+    async def main():
+        async with running_app(simulator) as app:
+            edits = [
+                app.edit_message(
+                    inference.EditMessageInput(
+                        channel_id=channel_id, message_id=message_id, content=content, coalesce=True, max_staleness=0.2
+                    ),
+                    Metadata(),
+                )
+                for content in ("same", "other", "same")
+            ]
+            return await asyncio.gather(*edits), app.writes_sent
+
+    results, writes_sent = asyncio.run(main())
+    assert writes_sent == 1
+    # The first edit carries the same content that was sent, yet a later edit replaced it
+    assert [r.superseded for r in results] == [True, True, False]
+    assert {r.content for r in results} == {"same"}
+
+
+def test_unmerged_and_uncoalesced_writes_are_not_superseded(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    user_id = simulator.add_member(guild_id)
+
+    async def main():
+        async with running_app(simulator) as app:
+            results = []
+            for coalesce in (True, False):
+                results.append(await app.set_nickname(
+                    inference.SetNicknameInput(guild_id=guild_id, user_id=user_id, nick="n", coalesce=coalesce),
+                    Metadata(),
+                ))
+            return results
+
+    assert [r.superseded for r in asyncio.run(main())] == [False, False]
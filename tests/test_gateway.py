@@ -0,0 +1,133 @@
+"""Gateway mode (DISCORD_GATEWAY=1) against the simulator's /gateway stub."""
+
+import asyncio
+
+import pytest
+from simulator import DiscordSimulator
+
+import inference
+from conftest import Metadata
+
+
+@pytest.fixture
+def gateway_env(monkeypatch):
+    monkeypatch.setenv("DISCORD_GATEWAY", "1")
+
+
+def test_own_member_changes_reach_gateway_state(running_app, gateway_env):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=1, roles=2, members=0)
+    first, second = [r for r in simulator.roles[guild_id] if r != guild_id]
+    bot_id = simulator.add_member(guild_id, roles=[first], user=simulator.bot_user)
+
+    async def main():
+        async with running_app(simulator) as app:
+            # Only the GUILDS intent: the bot's member comes with GUILD_CREATE,
+            # but no GUILD_MEMBER_UPDATE follows our own changes
+            assert app.gateway.state.get("member", guild_id, bot_id)["roles"] == [first]
+            await app.add_role(inference.AddRoleInput(guild_id=guild_id, user_id=bot_id, role_id=second), Metadata())
+            await app.remove_role(
+                inference.RemoveRoleInput(guild_id=guild_id, user_id=bot_id, role_id=first), Metadata()
+            )
+            await app.set_nickname(inference.SetNicknameInput(guild_id=guild_id, user_id=bot_id, nick="n"), Metadata())
+            member = await app.get_member(inference.GetMemberInput(guild_id=guild_id, user_id=bot_id), Metadata())
+            await app.kick_user(inference.KickUserInput(guild_id=guild_id, user_id=bot_id), Metadata())
+            with pytest.raises(inference.DiscordAPIError) as error:
+                await app.get_member(inference.GetMemberInput(guild_id=guild_id, user_id=bot_id), Metadata())
+            return member, error.value
+
+    member, error = asyncio.run(main())
+    assert (member.roles, member.nick) == ([second], "n")
+    assert error.status == 404
+    assert simulator.route_counts["GET /guilds/{guild_id}/members/{user_id}"] == 1
+
+
+async def wait_for(condition, timeout: float = 5.0):
+    for _ in range(int(timeout / 0.02)):
+        if condition():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("condition not met in time")
+
+
+def test_identify_ready_and_guild_state(running_app, gateway_env):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=3, roles=2, members=5)
+
+    async def main():
+        async with running_app(simulator) as app:
+            return app.gateway.stats(), app.gateway.state
+
+    stats, state = asyncio.run(main())
+    (session,) = simulator.gateway_sessions.values()
+    assert session.intents == inference.App.GATEWAY_INTENTS
+    assert stats["live"] and stats["session_id"] == session.id
+    assert set(state.guilds) == {guild_id}
+    assert len(state.channels) == 3 and len(state.roles[guild_id]) == 3
+    # No members intent: none of the members are sent
+    assert stats["members"] == 0
+
+
+def test_reads_are_answered_from_state(running_app, gateway_env):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=3, roles=2, members=0)
+    channel_id = next(c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id)
+
+    async def main():
+        async with running_app(simulator) as app:
+            requests = simulator.requests
+            guild = await app.get_guild(inference.GetGuildInput(guild_id=guild_id), Metadata())
+            channels = await app.list_channels(inference.ListChannelsInput(guild_id=guild_id), Metadata())
+            roles = await app.list_roles(inference.ListRolesInput(guild_id=guild_id), Metadata())
+            # A change made elsewhere arrives as an event
+            await simulator.dispatch("CHANNEL_UPDATE", {**simulator.channels[channel_id], "name": "renamed"})
+            await wait_for(lambda: app.gateway.state.channels[channel_id]["name"] == "renamed")
+            channel = await app.get_channel(inference.GetChannelInput(channel_id=channel_id), Metadata())
+            return simulator.requests - requests, guild, channels, roles, channel
+
+    requests, guild, channels, roles, channel = asyncio.run(main())
+    assert requests == 0
+    assert guild.id == guild_id
+    assert len(channels.channels) == 3 and len(roles.roles) == 3
+    assert channel.name == "renamed"
+
+
+def test_dropped_socket_resumes_and_replays_missed_events(running_app, gateway_env):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=1, roles=0, members=0)
+    role = simulator._role("1" * 18, "missed", 1, guild_id)
+
+    async def main():
+        async with running_app(simulator) as app:
+            session_id = app.gateway.session_id
+            await simulator.drop_gateway()
+            await wait_for(lambda: not app.gateway.live)
+            # Sent while nobody is connected: only the session backlog has it
+            await simulator.dispatch("GUILD_ROLE_CREATE", {"guild_id": guild_id, "role": role})
+            await wait_for(lambda: app.gateway.live)
+            return session_id, app.gateway
+
+    session_id, gateway = asyncio.run(main())
+    assert gateway.session_id == session_id and gateway.reconnects == 1
+    assert simulator.gateway_connections == 2
+    # Resumed, not identified again
+    assert len(simulator.gateway_sessions) == 1
+    assert role["id"] in gateway.state.roles[guild_id]
+
+
+def test_zlib_stream_messages_split_across_frames(running_app, gateway_env):
+    simulator = DiscordSimulator(gateway_frame_size=7)
+    guild_id = simulator.add_guild(channels=20, roles=20, members=0)
+    role_id = next(r for r in simulator.roles[guild_id] if r != guild_id)
+    simulator.gateway_events.append({"t": "GUILD_ROLE_DELETE", "d": {"guild_id": guild_id, "role_id": role_id}})
+
+    async def main():
+        async with running_app(simulator) as app:
+            await wait_for(lambda: app.gateway.events == 3)
+            return app.gateway
+
+    gateway = asyncio.run(main())
+    # READY, GUILD_CREATE and the replayed event, each inflated from many frames
+    assert gateway.events == 3 and gateway.error is None
+    assert len(gateway.state.channels) == 20
+    assert len(gateway.state.roles[guild_id]) == 20 and role_id not in gateway.state.roles[guild_id]
@@ -0,0 +1,60 @@
+"""apply_guild_plan against the simulator."""
+
+import asyncio
+import json
+
+from simulator import DiscordSimulator
+
+import inference
+from conftest import Metadata
+
+
+def test_moves_are_skipped_when_their_creates_failed(running_app):
+    simulator = DiscordSimulator()
+    source = simulator.add_guild(channels=0, roles=2, members=0)
+    target = simulator.add_guild(channels=0, roles=0, members=0)
+    simulator.script("POST /guilds/{guild_id}/roles", 400, {"message": "Invalid Form Body", "code": 50035}, count=2)
+
+    async def main():
+        async with running_app(simulator) as app:
+            snapshot = await app.snapshot_guild(inference.SnapshotGuildInput(guild_id=source), Metadata())
+            return await app.apply_guild_plan(
+                inference.ApplyGuildPlanInput(guild_id=target, snapshot=snapshot.file), Metadata()
+            )
+
+    result = asyncio.run(main())
+    statuses = {op["op"]: op["status"] for op in result.operations}
+    assert statuses == {"create_role": "failed", "move_roles": "done"}
+    assert result.failed == 2
+    assert "PATCH /guilds/{guild_id}/roles" not in simulator.route_counts
+
+
+def test_moves_keep_a_category_missing_from_the_layout(running_app):
+    simulator = DiscordSimulator()
+    source = simulator.add_guild(channels=0, roles=0, members=0)
+    source_category = simulator._create_channel(source, {"name": "cat", "type": 4})
+    simulator._create_channel(source, {"name": "general", "type": 0, "parent_id": source_category["id"]})
+    simulator._create_channel(source, {"name": "top", "type": 0})
+    target = simulator.add_guild(channels=0, roles=0, members=0)
+    category = simulator._create_channel(target, {"name": "cat", "type": 4, "position": 0})
+    general = simulator._create_channel(target, {"name": "general", "type": 0, "parent_id": category["id"], "position": 7})
+    top = simulator._create_channel(target, {"name": "top", "type": 0, "parent_id": category["id"], "position": 8})
+
+    async def main():
+        async with running_app(simulator) as app:
+            snapshot = await app.snapshot_guild(inference.SnapshotGuildInput(guild_id=source), Metadata())
+            with open(snapshot.file.path) as f:
+                layout = json.load(f)
+            # "general" still names its category, which the layout no longer has
+            layout["channels"] = [c for c in layout["channels"] if c["name"] != "cat"]
+            with open(snapshot.file.path, "w") as f:
+                json.dump(layout, f)
+            return await app.apply_guild_plan(
+                inference.ApplyGuildPlanInput(guild_id=target, snapshot=snapshot.file), Metadata()
+            )
+
+    result = asyncio.run(main())
+    assert {op["op"]: op["status"] for op in result.operations} == {"move_channels": "done"}
+    assert simulator.channels[general["id"]]["parent_id"] == category["id"]
+    # A channel the layout puts at the top level still leaves its category
+    assert simulator.channels[top["id"]]["parent_id"] is None
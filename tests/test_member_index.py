@@ -0,0 +1,60 @@
+"""MemberIndex search over trigram postings and role bitmaps."""
+
+import inference
+
+
+def member(user_id, username, roles=(), nick=None, bot=False):
+    return {
+        "user": {"id": user_id, "username": username, "bot": bot},
+        "nick": nick,
+        "roles": list(roles),
+        "joined_at": "2024-01-01T00:00:00+00:00",
+    }
+
+
+def build(members, loading=True):
+    index = inference.MemberIndex("1")
+    if loading:
+        index.start_loading()
+    for m in members:
+        index.put(m)
+    if loading:
+        index.finish_loading()
+    return index
+
+
+def ids(records):
+    return [r["user_id"] for r in records]
+
+
+MEMBERS = [
+    member("1", "alice", roles=("10",)),
+    member("2", "alicia", roles=("10", "20")),
+    member("3", "bob", roles=("20",)),
+    member("4", "alfred", bot=True),
+]
+
+
+def test_bulk_load_matches_incremental_puts():
+    for loading in (True, False):
+        index = build(MEMBERS, loading)
+        assert ids(index.search(name="ali")) == ["1", "2"]
+        assert ids(index.search(name="*ic*")) == ["1", "2"]
+        assert ids(index.search(all_roles=["10", "20"])) == ["2"]
+        assert ids(index.search(no_roles=True, include_bots=True)) == ["4"]
+        assert ids(index.search(name="al")) == ["1", "2", "4"]
+        assert ids(index.search(name="al", include_bots=False)) == ["1", "2"]
+
+
+def test_removed_and_renamed_members_leave_no_stale_matches():
+    index = build(MEMBERS)
+    index.remove("1")
+    index.update("3", nick="alison", add_role="10")
+    assert ids(index.search(name="ali")) == ["2", "3"]
+    assert ids(index.search(all_roles=["10"])) == ["2", "3"]
+    index.update("3", nick="robert", remove_role="10")
+    assert ids(index.search(name="ali")) == ["2"]
+    assert ids(index.search(name="rob")) == ["3"]
+    index.put(member("1", "alice"))
+    assert ids(index.search(name="alice")) == ["1"]
+    assert ids(index.search(name="zzz")) == []
@@ -0,0 +1,64 @@
+"""Request records passed to metrics hooks, and connection pool statistics."""
+
+import asyncio
+
+from simulator import DiscordSimulator
+
+import inference
+from conftest import Metadata
+
+
+def test_webhook_token_is_not_exposed_in_records(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=1, roles=0, members=0)
+    channel_id = next(c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id)
+    records = []
+
+    async def main():
+        async with running_app(simulator) as app:
+            app.metrics.hooks.append(records.append)
+            webhook = await app.create_webhook(
+                inference.CreateWebhookInput(channel_id=channel_id, name="hook"), Metadata()
+            )
+            await app.execute_webhook(
+                inference.ExecuteWebhookInput(webhook_id=webhook.webhook_id, content="hi"), Metadata()
+            )
+            metrics = await app.export_metrics(inference.ExportMetricsInput(format="prometheus"), Metadata())
+            return webhook, metrics
+
+    webhook, metrics = asyncio.run(main())
+    token = simulator.webhooks[webhook.webhook_id]["token"]
+    execution = next(r for r in records if r.route == "POST /webhooks/{webhook_id}/{token}")
+    assert execution.bucket.endswith(f":{webhook.webhook_id}/:token")
+    assert all(token not in record.bucket for record in records)
+    assert token not in str(metrics)
+
+
+def test_pool_stats_count_idle_and_reused_connections(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+
+    async def main():
+        async with running_app(simulator) as app:
+            for _ in range(3):
+                await app._request("GET", f"/guilds/{guild_id}")
+            return (await app.get_stats(inference.GetStatsInput(), Metadata())).pool
+
+    pool = asyncio.run(main())
+    assert pool["requests"] == 3
+    assert pool["connections_created"] == 1
+    assert pool["connections_reused"] == 2
+    assert pool["idle_connections"] == 1
+    assert pool["active_connections"] == 0
+    assert pool["in_flight"] == 0
+
+
+def test_pool_stats_survive_a_connector_without_private_state():
+    class Connector:
+        limit = 10
+        limit_per_host = 5
+
+    stats = inference.PoolMonitor().stats(Connector())
+    assert stats["idle_connections"] == stats["active_connections"] == 0
+    assert stats["limit"] == 10
+    assert inference.PoolMonitor().stats(None)["limit"] is None
@@ -0,0 +1,79 @@
+"""mass_ban and mass_kick input handling."""
+
+import asyncio
+
+import pytest
+from simulator import DiscordSimulator
+
+import inference
+from conftest import Metadata
+
+
+@pytest.mark.parametrize("operation", ["mass_ban", "mass_kick"])
+def test_invalid_user_id_fails_before_any_request(running_app, operation):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=250)
+    user_ids = list(simulator.members[guild_id]) + ["not-a-snowflake"]
+    input_model = inference.MassBanInput if operation == "mass_ban" else inference.MassKickInput
+
+    async def main():
+        async with running_app(simulator) as app:
+            with pytest.raises(ValueError, match="user_id"):
+                await getattr(app, operation)(input_model(guild_id=guild_id, user_ids=user_ids), Metadata())
+
+    asyncio.run(main())
+    assert simulator.requests == 0
+    assert len(simulator.members[guild_id]) == 250
+
+
+def test_duplicate_user_ids_are_banned_once(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=3)
+    user_ids = list(simulator.members[guild_id])
+
+    async def main():
+        async with running_app(simulator) as app:
+            return await app.mass_ban(inference.MassBanInput(guild_id=guild_id, user_ids=user_ids * 2), Metadata())
+
+    result = asyncio.run(main())
+    assert result.matched == 3
+    assert sorted(result.banned) == sorted(user_ids)
+
+
+def test_bulk_ban_reports_users_missing_from_the_response(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=3)
+    banned, refused, unlisted = simulator.members[guild_id]
+    simulator.script(
+        "POST /guilds/{guild_id}/bulk-ban", 200, {"banned_users": [banned], "failed_users": [refused]}
+    )
+
+    async def main():
+        async with running_app(simulator) as app:
+            return await app.mass_ban(
+                inference.MassBanInput(guild_id=guild_id, user_ids=[banned, refused, unlisted]), Metadata()
+            )
+
+    result = asyncio.run(main())
+    assert result.banned == [banned]
+    assert set(result.failed) == {refused, unlisted}
+    assert "unknown" in result.failed[unlisted]
+
+
+def test_join_filter_skips_members_without_a_join_date(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=3)
+    undated, *dated = simulator.members[guild_id]
+    simulator.members[guild_id][undated]["joined_at"] = None
+
+    async def main():
+        async with running_app(simulator) as app:
+            return await app.mass_kick(
+                inference.MassKickInput(
+                    guild_id=guild_id, filter={"joined_after": "2015-01-01T00:00:00+00:00"}, dry_run=True
+                ),
+                Metadata(),
+            )
+
+    result = asyncio.run(main())
+    assert sorted(result.selected) == sorted(dated)
@@ -0,0 +1,157 @@
+"""Outbox (DISCORD_OUTBOX): retries, request-weighted lanes and pool mode."""
+
+import asyncio
+
+import pytest
+from simulator import DiscordSimulator
+
+import inference
+from conftest import MESSAGES, Metadata
+
+BANS = "PUT /guilds/{guild_id}/bans/{user_id}"
+# Transient failures reach the outbox at once and are retried quickly
+FAST = {"MAX_RETRIES": 0, "OUTBOX_RETRY_BASE_DELAY": 0.01}
+
+
+@pytest.fixture
+def outbox_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("DISCORD_OUTBOX", str(tmp_path / "outbox.db"))
+
+
+def guild_with_member(simulator: DiscordSimulator) -> tuple:
+    guild_id = simulator.add_guild(channels=1, roles=0, members=0)
+    return guild_id, simulator.add_member(guild_id)
+
+
+def test_transient_failures_are_retried(running_app, outbox_env):
+    simulator = DiscordSimulator()
+    guild_id, user_id = guild_with_member(simulator)
+    simulator.script(BANS, 503, {"message": "Service Unavailable"}, count=2)
+
+    async def main():
+        async with running_app(simulator, **FAST) as app:
+            await app.ban_user(inference.BanUserInput(guild_id=guild_id, user_id=user_id), Metadata())
+            return await app.outbox_status(inference.OutboxStatusInput(), Metadata())
+
+    status = asyncio.run(main())
+    assert simulator.route_counts[BANS] == 3
+    assert status.counts["moderation"] == {"done": 1}
+
+
+def test_retries_are_bounded(running_app, outbox_env):
+    simulator = DiscordSimulator()
+    guild_id, user_id = guild_with_member(simulator)
+    simulator.script(BANS, 503, {"message": "Service Unavailable"}, count=10)
+
+    async def main():
+        async with running_app(simulator, OUTBOX_MAX_ATTEMPTS=3, **FAST) as app:
+            with pytest.raises(inference.DiscordAPIError):
+                await app.ban_user(inference.BanUserInput(guild_id=guild_id, user_id=user_id), Metadata())
+            return await app.outbox_status(inference.OutboxStatusInput(), Metadata())
+
+    status = asyncio.run(main())
+    assert simulator.route_counts[BANS] == 3
+    assert status.counts["moderation"] == {"failed": 1}
+
+
+@pytest.mark.parametrize("operation, route, status", [
+    # Not transient
+    ("ban_user", BANS, 403),
+    # Sent, and not safe to send twice
+    ("send_message", MESSAGES, 503),
+])
+def test_other_failures_are_not_retried(running_app, outbox_env, operation, route, status):
+    simulator = DiscordSimulator()
+    guild_id, user_id = guild_with_member(simulator)
+    channel_id = next(c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id)
+    simulator.script(route, status, {"message": "nope"}, count=10)
+    inputs = {
+        "ban_user": inference.BanUserInput(guild_id=guild_id, user_id=user_id),
+        "send_message": inference.SendMessageInput(channel_id=channel_id, content="hi"),
+    }
+
+    async def main():
+        async with running_app(simulator, **FAST) as app:
+            with pytest.raises(inference.DiscordAPIError):
+                await getattr(app, operation)(inputs[operation], Metadata())
+
+    asyncio.run(main())
+    assert simulator.route_counts[route] == 1
+
+
+def test_items_take_a_slot_per_expected_request(running_app, outbox_env):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=8, roles=0, members=0)
+    channel_ids = [c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id]
+
+    async def main():
+        # The messages lane may use 6 slots
+        async with running_app(simulator, OUTBOX_CONCURRENCY=8, OUTBOX_RESERVED=1) as app:
+            broadcasts = [
+                inference.EnqueueInput(operation="broadcast_message", input={"channel_ids": ids, "content": "hi"})
+                for ids in (channel_ids[:4], channel_ids[4:])
+            ]
+            for data in broadcasts:
+                await app.enqueue(data, Metadata())
+            await asyncio.sleep(0)
+            active = app._outbox_active[2]
+            queued = len(app._outbox_queues[2])
+            return active, queued
+
+    # 4 + 4 slots do not fit in 6: the second broadcast waits
+    assert asyncio.run(main()) == (4, 1)
+
+
+def test_pool_parent_owns_the_outbox(running_app, outbox_env, monkeypatch):
+    monkeypatch.delenv("DISCORD_BOT_TOKEN")
+    monkeypatch.setenv("DISCORD_BOT_TOKENS", "pool-token-0,pool-token-1")
+    monkeypatch.setenv("DISCORD_WEBHOOK_VAULT_KEY", "pool-test-key")
+    simulator = DiscordSimulator()
+    guild_id, user_id = guild_with_member(simulator)
+
+    async def main():
+        async with running_app(simulator) as app:
+            queued = await app.enqueue(
+                inference.EnqueueInput(operation="ban_user", input={"guild_id": guild_id, "user_id": user_id}, wait=True),
+                Metadata(),
+            )
+            status = await app.outbox_status(inference.OutboxStatusInput(), Metadata())
+            with pytest.raises(ValueError, match="not enabled"):
+                await app.workers.call(0, "outbox_status", inference.OutboxStatusInput(), Metadata())
+            return queued, status
+
+    queued, status = asyncio.run(main())
+    assert queued.state == "done"
+    assert status.counts["moderation"] == {"done": 1}
+    assert simulator.route_counts[BANS] == 1
+
+
+def test_unload_fails_callers_of_unfinished_items(running_app, outbox_env, tmp_path):
+    simulator = DiscordSimulator(latency=0.3)
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    user_ids = [simulator.add_member(guild_id) for _ in range(3)]
+    # The first ban waits for a retry, the second is cut off, the third never starts
+    simulator.script(BANS, 503, {"message": "Service Unavailable"})
+    attributes = {"MAX_RETRIES": 0, "OUTBOX_RETRY_BASE_DELAY": 10.0, "OUTBOX_CONCURRENCY": 1,
+                  "OUTBOX_RESERVED": 0, "OUTBOX_DRAIN_TIMEOUT": 0.05}
+
+    async def main():
+        async with running_app(simulator, **attributes) as app:
+            callers = []
+            for user_id in user_ids:
+                callers.append(asyncio.ensure_future(
+                    app.ban_user(inference.BanUserInput(guild_id=guild_id, user_id=user_id), Metadata())
+                ))
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.45)
+        return await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 2)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(e, RuntimeError) and "persisted for replay" in str(e) for e in errors)
+
+    async def replay():
+        async with running_app(simulator, **FAST):
+            while len(simulator.bans[guild_id]) < len(user_ids):
+                await asyncio.sleep(0.05)
+
+    asyncio.run(asyncio.wait_for(replay(), 5))
@@ -0,0 +1,102 @@
+"""iter_* cursor pagination and the NDJSON exports built on it."""
+
+import asyncio
+import json
+
+from simulator import DiscordSimulator
+
+import inference
+from conftest import Metadata, record_requests
+
+PAGE = {"MEMBERS_PAGE_SIZE": 10, "BANS_PAGE_SIZE": 10, "MESSAGES_PAGE_SIZE": 10}
+
+
+def collect(running_app, simulator, iterate):
+    """Items from ``iterate(app)`` and the endpoints requested for them."""
+    async def main():
+        async with running_app(simulator, **PAGE) as app:
+            sent = record_requests(app)
+            return [item async for item in iterate(app)], [endpoint for _, endpoint in sent]
+
+    return asyncio.run(main())
+
+
+def test_members_follow_the_after_cursor_and_stop_on_a_short_page(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    user_ids = [simulator.add_member(guild_id) for _ in range(25)]
+
+    members, sent = collect(running_app, simulator, lambda app: app.iter_members(guild_id))
+    assert [m["user"]["id"] for m in members] == user_ids
+    assert sent == [
+        f"/guilds/{guild_id}/members?limit=10",
+        f"/guilds/{guild_id}/members?limit=10&after={user_ids[9]}",
+        f"/guilds/{guild_id}/members?limit=10&after={user_ids[19]}",
+    ]
+
+
+def test_a_full_last_page_costs_one_empty_request(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    user_ids = [simulator.add_member(guild_id) for _ in range(20)]
+
+    members, sent = collect(running_app, simulator, lambda app: app.iter_members(guild_id))
+    assert len(members) == 20
+    assert sent[-1] == f"/guilds/{guild_id}/members?limit=10&after={user_ids[19]}"
+    assert len(sent) == 3
+
+
+def test_limit_stops_mid_page(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    user_ids = [simulator.add_member(guild_id) for _ in range(25)]
+
+    members, _ = collect(running_app, simulator, lambda app: app.iter_members(guild_id, limit=12))
+    assert [m["user"]["id"] for m in members] == user_ids[:12]
+
+
+def test_messages_walk_backwards_and_stop_at_after(running_app):
+    simulator = DiscordSimulator()
+    simulator.add_guild(channels=1, roles=0, members=0)
+    channel_id = next(iter(simulator.channels))
+    message_ids = simulator.add_messages(channel_id, 30)
+
+    messages, sent = collect(
+        running_app, simulator,
+        lambda app: app.iter_messages(channel_id, before=message_ids[25], after=message_ids[4]),
+    )
+    assert [m["id"] for m in messages] == message_ids[24:4:-1]
+    assert sent == [
+        f"/channels/{channel_id}/messages?limit=10&before={message_ids[25]}",
+        f"/channels/{channel_id}/messages?limit=10&before={message_ids[15]}",
+        f"/channels/{channel_id}/messages?limit=10&before={message_ids[5]}",
+    ]
+
+
+def test_messages_after_only_walk_forwards(running_app):
+    simulator = DiscordSimulator()
+    simulator.add_guild(channels=1, roles=0, members=0)
+    channel_id = next(iter(simulator.channels))
+    message_ids = simulator.add_messages(channel_id, 15)
+
+    messages, sent = collect(running_app, simulator, lambda app: app.iter_messages(channel_id, after=message_ids[2]))
+    assert [m["id"] for m in messages] == message_ids[3:]
+    assert len(sent) == 2
+
+
+def test_export_bans_writes_one_ban_per_line(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    user_ids = [simulator.ids.next() for _ in range(15)]
+    for user_id in reversed(user_ids):
+        simulator.bans[guild_id][user_id] = {"user": {"id": user_id}, "reason": None}
+
+    async def main():
+        async with running_app(simulator, **PAGE) as app:
+            return await app.export_bans(inference.ExportBansInput(guild_id=guild_id), Metadata())
+
+    output = asyncio.run(main())
+    with open(output.file.path) as f:
+        bans = [json.loads(line) for line in f]
+    assert output.count == 15
+    assert [b["user"]["id"] for b in bans] == user_ids
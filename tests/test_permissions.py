@@ -0,0 +1,197 @@
+"""PermissionEngine, get_permissions and preflight checks against the simulator."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from simulator import DiscordSimulator
+
+import inference
+from conftest import Metadata
+
+FLAGS = inference.PERMISSION_FLAGS
+VIEW, SEND, KICK, BAN, MANAGE_ROLES = (
+    FLAGS[name] for name in ("VIEW_CHANNEL", "SEND_MESSAGES", "KICK_MEMBERS", "BAN_MEMBERS", "MANAGE_ROLES")
+)
+BANS = "PUT /guilds/{guild_id}/bans/{user_id}"
+ROLES = "PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}"
+
+
+class Guild:
+    """A simulator guild with one channel and roles made to order."""
+
+    def __init__(self, simulator: DiscordSimulator, everyone: int = VIEW):
+        self.simulator = simulator
+        self.id = simulator.add_guild(channels=1, roles=0, members=0)
+        self.channel_id = next(c for c in simulator.channels if simulator.channels[c]["guild_id"] == self.id)
+        simulator.roles[self.id][self.id]["permissions"] = str(everyone)
+
+    def role(self, permissions: int = 0, position: int = 1, managed: bool = False) -> str:
+        role_id = self.simulator.ids.next()
+        role = self.simulator._role(role_id, f"role-{position}", position, self.id, str(permissions))
+        role["managed"] = managed
+        self.simulator.roles[self.id][role_id] = role
+        return role_id
+
+    def member(self, *roles: str, **fields) -> str:
+        user_id = self.simulator.add_member(self.id, roles=list(roles))
+        self.simulator.members[self.id][user_id].update(fields)
+        return user_id
+
+    def bot(self, *roles: str) -> str:
+        return self.simulator.add_member(self.id, roles=list(roles), user=self.simulator.bot_user)
+
+    def overwrite(self, target_id: str, allow: int = 0, deny: int = 0, member: bool = False):
+        self.simulator.channels[self.channel_id]["permission_overwrites"].append(
+            {"id": target_id, "type": int(member), "allow": str(allow), "deny": str(deny)}
+        )
+
+
+def permissions(running_app, simulator, guild: Guild, user_ids: list) -> inference.GetPermissionsOutput:
+    async def main():
+        async with running_app(simulator) as app:
+            return await app.get_permissions(
+                inference.GetPermissionsInput(guild_id=guild.id, user_ids=user_ids, format="bits"), Metadata()
+            )
+
+    return asyncio.run(main())
+
+
+def bits(output, user_id: str, channel_id: str = None) -> int:
+    return int(output.guild[user_id] if channel_id is None else output.channels[user_id][channel_id])
+
+
+def test_base_permissions_are_everyone_or_member_roles(running_app):
+    simulator = DiscordSimulator()
+    guild = Guild(simulator)
+    user_id = guild.member(guild.role(SEND), guild.role(KICK, position=2))
+    guild.role(BAN, position=3)  # not the member's
+    output = permissions(running_app, simulator, guild, [user_id])
+    assert bits(output, user_id) == VIEW | SEND | KICK
+
+
+def test_overwrites_apply_everyone_then_roles_then_member(running_app):
+    simulator = DiscordSimulator()
+    guild = Guild(simulator, everyone=VIEW | SEND)
+    allowing, denying = guild.role(), guild.role(position=2)
+    guild.overwrite(guild.id, deny=SEND | KICK)
+    guild.overwrite(denying, deny=SEND)
+    # A role allow wins over another role's deny
+    guild.overwrite(allowing, allow=SEND | KICK)
+    role_only = guild.member(allowing, denying)
+    member_denied = guild.member(allowing)
+    guild.overwrite(member_denied, deny=SEND, member=True)
+    everyone_only = guild.member()
+    output = permissions(running_app, simulator, guild, [role_only, member_denied, everyone_only])
+    assert bits(output, role_only, guild.channel_id) == VIEW | SEND | KICK
+    assert bits(output, member_denied, guild.channel_id) == VIEW | KICK
+    assert bits(output, everyone_only, guild.channel_id) == VIEW
+
+
+def test_administrator_and_owner_have_everything(running_app):
+    simulator = DiscordSimulator()
+    guild = Guild(simulator)
+    guild.overwrite(guild.id, deny=VIEW | SEND)
+    admin = guild.member(guild.role(FLAGS["ADMINISTRATOR"]))
+    owner = guild.member()
+    simulator.guilds[guild.id]["owner_id"] = owner
+    guild.overwrite(owner, deny=VIEW, member=True)
+    output = permissions(running_app, simulator, guild, [admin, owner])
+    for user_id in (admin, owner):
+        assert bits(output, user_id) == inference.ALL_PERMISSIONS
+        assert bits(output, user_id, guild.channel_id) == inference.ALL_PERMISSIONS
+
+
+def test_channel_permissions_need_view_channel(running_app):
+    simulator = DiscordSimulator()
+    guild = Guild(simulator, everyone=VIEW | SEND | FLAGS["READ_MESSAGE_HISTORY"])
+    guild.overwrite(guild.id, deny=VIEW)
+    user_id = guild.member()
+    output = permissions(running_app, simulator, guild, [user_id])
+    assert bits(output, user_id) & SEND
+    assert bits(output, user_id, guild.channel_id) == 0
+
+
+def test_timed_out_members_keep_only_view_and_history(running_app):
+    simulator = DiscordSimulator()
+    guild = Guild(simulator, everyone=VIEW | SEND | FLAGS["READ_MESSAGE_HISTORY"])
+    until = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    user_id = guild.member(communication_disabled_until=until)
+    output = permissions(running_app, simulator, guild, [user_id])
+    assert bits(output, user_id) == inference.TIMEOUT_PERMISSIONS
+
+
+def test_role_hierarchy_is_enforced_for_role_assignment(running_app):
+    simulator = DiscordSimulator()
+    guild = Guild(simulator)
+    guild.bot(guild.role(MANAGE_ROLES, position=5))
+    below, above, managed = guild.role(position=2), guild.role(position=8), guild.role(position=1, managed=True)
+    level = guild.role(position=5)
+    user_id = guild.member()
+
+    async def main():
+        async with running_app(simulator) as app:
+            for role_id in (above, level, managed):
+                with pytest.raises(inference.MissingPermissions) as error:
+                    await app.add_role(
+                        inference.AddRoleInput(guild_id=guild.id, user_id=user_id, role_id=role_id, preflight=True),
+                        Metadata(),
+                    )
+                assert error.value.status == 403 and error.value.code == 50013
+            assert ROLES not in simulator.route_counts
+            await app.add_role(
+                inference.AddRoleInput(guild_id=guild.id, user_id=user_id, role_id=below, preflight=True), Metadata()
+            )
+            return await app.bulk_add_roles(
+                inference.BulkAddRolesInput(
+                    guild_id=guild.id,
+                    assignments=[{"user_id": user_id, "role_id": role_id} for role_id in (above, below)],
+                    preflight=True,
+                ),
+                Metadata(),
+            )
+
+    result = asyncio.run(main())
+    assert [r.success for r in result.results] == [False, True]
+    assert "not below the bot's highest role" in result.results[0].error
+    # One add_role and one bulk assignment reached Discord
+    assert simulator.route_counts[ROLES] == 2
+    assert simulator.members[guild.id][user_id]["roles"] == [below]
+
+
+def test_failed_preflight_sends_nothing(running_app):
+    simulator = DiscordSimulator()
+    guild = Guild(simulator)
+    guild.bot(guild.role(KICK, position=5))
+    user_id = guild.member()
+
+    async def main():
+        async with running_app(simulator) as app:
+            # Warm the guild, role, channel and bot member caches
+            await app.get_permissions(inference.GetPermissionsInput(guild_id=guild.id), Metadata())
+            requests = simulator.requests
+            with pytest.raises(inference.MissingPermissions) as error:
+                await app.ban_user(inference.BanUserInput(guild_id=guild.id, user_id=user_id, preflight=True), Metadata())
+            return requests, error.value
+
+    requests, error = asyncio.run(main())
+    assert error.missing == ["BAN_MEMBERS"]
+    assert simulator.requests == requests
+    assert BANS not in simulator.route_counts
+
+
+def test_members_ranked_at_or_above_the_bot_cannot_be_moderated(running_app):
+    simulator = DiscordSimulator()
+    guild = Guild(simulator)
+    guild.bot(guild.role(BAN, position=5))
+    peer = guild.member(guild.role(position=5))
+    junior = guild.member(guild.role(position=4))
+
+    async def main():
+        async with running_app(simulator) as app:
+            with pytest.raises(inference.MissingPermissions, match="not below the bot's"):
+                await app.ban_user(inference.BanUserInput(guild_id=guild.id, user_id=peer, preflight=True), Metadata())
+            await app.ban_user(inference.BanUserInput(guild_id=guild.id, user_id=junior, preflight=True), Metadata())
+
+    asyncio.run(main())
+    assert list(simulator.bans[guild.id]) == [junior]
@@ -0,0 +1,140 @@
+"""Pool mode (DISCORD_BOT_TOKENS): routing by guild, split calls and webhooks."""
+
+import asyncio
+
+import pytest
+from simulator import DiscordSimulator
+
+import inference
+from conftest import MESSAGES, Metadata
+
+TOKENS = [f"pool-token-{i}" for i in range(4)]
+
+
+@pytest.fixture
+def pool_env(monkeypatch):
+    monkeypatch.delenv("DISCORD_BOT_TOKEN")
+    monkeypatch.setenv("DISCORD_BOT_TOKENS", ",".join(TOKENS))
+    monkeypatch.setenv("DISCORD_WEBHOOK_VAULT_KEY", "pool-test-key")
+
+
+def channels_of(simulator: DiscordSimulator, guild_id: str) -> list:
+    return [c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id]
+
+
+def tokens_for(simulator: DiscordSimulator, route: str, majors: list) -> set:
+    return {
+        token for token, routes in simulator.token_routes.items()
+        if any((route, major) in routes for major in majors)
+    }
+
+
+def test_vault_key_is_required(running_app, pool_env, monkeypatch):
+    monkeypatch.delenv("DISCORD_WEBHOOK_VAULT_KEY")
+
+    async def main():
+        async with running_app(DiscordSimulator()):
+            pass
+
+    with pytest.raises(ValueError, match="DISCORD_WEBHOOK_VAULT_KEY"):
+        asyncio.run(main())
+
+
+def test_channel_calls_stay_on_their_guild_token(running_app, pool_env):
+    simulator = DiscordSimulator()
+    guild_ids = [simulator.add_guild(channels=6, roles=0, members=0) for _ in range(4)]
+
+    async def main():
+        async with running_app(simulator) as app:
+            assert app.session is None and app.webhooks is None
+            await asyncio.gather(*(
+                app.send_message(inference.SendMessageInput(channel_id=channel_id, content="hi"), Metadata())
+                for guild_id in guild_ids for channel_id in channels_of(simulator, guild_id)
+            ))
+            await asyncio.gather(*(
+                app.get_guild(inference.GetGuildInput(guild_id=guild_id), Metadata()) for guild_id in guild_ids
+            ))
+
+    asyncio.run(main())
+    for guild_id in guild_ids:
+        tokens = tokens_for(simulator, MESSAGES, channels_of(simulator, guild_id))
+        assert tokens == tokens_for(simulator, "GET /guilds/{guild_id}", [guild_id])
+        assert len(tokens) == 1
+
+
+def test_broadcast_and_edit_are_split_per_worker(running_app, pool_env):
+    simulator = DiscordSimulator()
+    guild_ids = [simulator.add_guild(channels=3, roles=0, members=0) for _ in range(8)]
+    channel_ids = channels_of(simulator, guild_ids[0])
+
+    async def main():
+        async with running_app(simulator) as app:
+            sent = await app.broadcast_message(
+                inference.BroadcastMessageInput(content="v1 {guild_id}", channel_ids=channel_ids,
+                                                guild_ids=guild_ids[1:]),
+                Metadata(),
+            )
+            edited = await app.edit_broadcast(
+                inference.EditBroadcastInput(messages=sent.messages, content="v2"), Metadata()
+            )
+            return sent, edited
+
+    sent, edited = asyncio.run(main())
+    assert len(sent.messages) == 24 and not sent.failed
+    assert edited.edited == list(sent.messages) and not edited.failed
+    for guild_id in guild_ids:
+        assert len(tokens_for(simulator, MESSAGES, channels_of(simulator, guild_id))) == 1
+    assert len(tokens_for(simulator, MESSAGES, list(simulator.channels))) > 1
+    for channel_id, message_id in sent.messages.items():
+        assert simulator.messages[channel_id][message_id]["content"] == "v2"
+
+
+def test_webhooks_work_across_workers(running_app, pool_env):
+    simulator = DiscordSimulator()
+    guild_ids = [simulator.add_guild(channels=2, roles=0, members=0) for _ in range(3)]
+
+    async def main():
+        async with running_app(simulator) as app:
+            webhooks = await asyncio.gather(*(
+                app.create_webhook(inference.CreateWebhookInput(channel_id=channel_id, name="hook"), Metadata())
+                for guild_id in guild_ids for channel_id in channels_of(simulator, guild_id)
+            ))
+            single = await asyncio.gather(*(
+                app.execute_webhook(inference.ExecuteWebhookInput(webhook_id=w.webhook_id, content="one"), Metadata())
+                for w in webhooks
+            ))
+            burst = await app.execute_webhooks(
+                inference.ExecuteWebhooksInput(
+                    webhook_ids=[w.webhook_id for w in webhooks], contents=[f"m{i}" for i in range(20)], wait=True
+                ),
+                Metadata(),
+            )
+            return webhooks, single, burst
+
+    webhooks, single, burst = asyncio.run(main())
+    assert all(result.sent for result in single)
+    assert burst.sent == 20 and not burst.errors
+    # Message i went through webhook i mod len(webhooks)
+    for i, message_id in enumerate(burst.message_ids):
+        channel_id = next(c for c in simulator.messages if message_id in simulator.messages[c])
+        message = simulator.messages[channel_id][message_id]
+        assert message["content"] == f"m{i}"
+        assert message["webhook_id"] == webhooks[i % len(webhooks)].webhook_id
+
+
+def test_run_batch_routes_each_step(running_app, pool_env):
+    simulator = DiscordSimulator()
+    guild_ids = [simulator.add_guild(channels=1, roles=0, members=0) for _ in range(6)]
+
+    async def main():
+        async with running_app(simulator) as app:
+            return await app.run_batch(inference.RunBatchInput(operations=[
+                {"op": "send_message", "args": {"channel_id": channels_of(simulator, guild_id)[0], "content": "b"}}
+                for guild_id in guild_ids
+            ]), Metadata())
+
+    result = asyncio.run(main())
+    assert result.succeeded == 6
+    for guild_id in guild_ids:
+        assert len(tokens_for(simulator, MESSAGES, channels_of(simulator, guild_id))) == 1
+    assert len(tokens_for(simulator, MESSAGES, list(simulator.channels))) > 1
@@ -0,0 +1,46 @@
+"""purge_messages: bulk-delete for young messages, single deletes for the rest."""
+
+import asyncio
+
+import simulator as discord_simulator
+from simulator import DiscordSimulator
+
+import inference
+from conftest import Metadata
+
+
+def purge(running_app, simulator, channel_id, **attributes) -> inference.PurgeMessagesOutput:
+    async def main():
+        async with running_app(simulator, **attributes) as app:
+            return await app.purge_messages(inference.PurgeMessagesInput(channel_id=channel_id), Metadata())
+
+    return asyncio.run(main())
+
+
+def test_young_messages_are_bulk_deleted_and_old_ones_singly(running_app):
+    simulator = DiscordSimulator()
+    simulator.add_guild(channels=1, roles=0, members=0)
+    channel_id = next(iter(simulator.channels))
+    simulator.add_messages(channel_id, 3, age=15 * 24 * 3600)
+    simulator.add_messages(channel_id, 5)
+
+    output = purge(running_app, simulator, channel_id, BULK_DELETE_SIZE=2)
+    assert output.bulk_deleted == 4
+    assert output.single_deleted == 4
+    assert output.failed == 0
+    assert simulator.messages[channel_id] == {}
+
+
+def test_chunks_are_checked_against_the_cutoff_when_flushed(running_app, monkeypatch):
+    # The scan takes about a second, so messages that were young enough when
+    # listed are too old for bulk-delete by the time the chunk is sent
+    monkeypatch.setattr(discord_simulator, "BULK_DELETE_MAX_AGE", 1.2)
+    simulator = DiscordSimulator(latency=0.2)
+    simulator.add_guild(channels=1, roles=0, members=0)
+    channel_id = next(iter(simulator.channels))
+    simulator.add_messages(channel_id, 8, age=0.5)
+
+    output = purge(running_app, simulator, channel_id, BULK_DELETE_MAX_AGE=1.0, MESSAGES_PAGE_SIZE=2)
+    assert output.failed == 0
+    assert output.single_deleted == 8
+    assert simulator.messages[channel_id] == {}
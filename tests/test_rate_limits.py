@@ -0,0 +1,111 @@
+"""RateLimiter behaviour against the simulator's buckets and scripted 429s."""
+
+import asyncio
+import time
+
+from simulator import DiscordSimulator
+
+from conftest import MESSAGES
+
+
+def channel_of(simulator: DiscordSimulator) -> str:
+    guild_id = simulator.add_guild(channels=1, roles=0, members=0)
+    return next(c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id)
+
+
+async def post_messages(app, channel_id: str, count: int) -> list:
+    return await asyncio.gather(*(
+        app._request("POST", f"/channels/{channel_id}/messages", {"content": f"message {i}"})
+        for i in range(count)
+    ))
+
+
+def test_bucket_waits_for_reset_instead_of_hitting_429(running_app):
+    simulator = DiscordSimulator(rate_limits={MESSAGES: (2, 0.5)})
+    channel_id = channel_of(simulator)
+
+    async def main():
+        async with running_app(simulator) as app:
+            started = time.perf_counter()
+            await post_messages(app, channel_id, 6)
+            return time.perf_counter() - started
+
+    elapsed = asyncio.run(main())
+    # Three windows of two requests each
+    assert elapsed >= 0.9
+    assert simulator.rate_limited == 0
+    assert simulator.route_counts[MESSAGES] == 6
+
+
+def test_unknown_bucket_sends_a_single_probe(running_app):
+    simulator = DiscordSimulator(latency=0.1)
+    channel_id = channel_of(simulator)
+    records = []
+
+    async def main():
+        async with running_app(simulator) as app:
+            app.metrics.hooks.append(records.append)
+            await post_messages(app, channel_id, 4)
+
+    asyncio.run(main())
+    queue_times = sorted(record.queue_time for record in records)
+    # The others wait for the probe's headers before they are sent
+    assert queue_times[0] < 0.05
+    assert all(queue_time >= 0.08 for queue_time in queue_times[1:])
+
+
+def test_route_429_holds_the_bucket_until_retry_after(running_app):
+    simulator = DiscordSimulator()
+    channel_id = channel_of(simulator)
+    simulator.script_rate_limit(MESSAGES, 0.3, scope="user")
+    records = []
+
+    async def main():
+        async with running_app(simulator) as app:
+            app.metrics.hooks.append(records.append)
+            await post_messages(app, channel_id, 3)
+
+    asyncio.run(main())
+    assert simulator.rate_limited == 1
+    assert simulator.route_counts[MESSAGES] == 4
+    assert all(record.status == 200 for record in records)
+    assert min(record.total_time for record in records) >= 0.28
+    assert sum(record.retries for record in records) == 1
+
+
+def test_shared_429_does_not_stall_the_probed_bucket(running_app):
+    simulator = DiscordSimulator()
+    channel_id = channel_of(simulator)
+    simulator.script_rate_limit(MESSAGES, 0.3, scope="shared")
+
+    async def main():
+        async with running_app(simulator) as app:
+            started = time.perf_counter()
+            await post_messages(app, channel_id, 3)
+            return time.perf_counter() - started, app.ratelimiter.PROBE_TIMEOUT
+
+    elapsed, probe_timeout = asyncio.run(main())
+    assert 0.28 <= elapsed < probe_timeout / 2
+    assert simulator.route_counts[MESSAGES] == 4
+
+
+def test_global_429_pauses_every_route(running_app):
+    simulator = DiscordSimulator()
+    channel_id = channel_of(simulator)
+    guild_id = simulator.channels[channel_id]["guild_id"]
+    simulator.script_rate_limit(MESSAGES, 0.4, scope="global")
+
+    async def main():
+        async with running_app(simulator) as app:
+            started = time.perf_counter()
+            messages = asyncio.ensure_future(post_messages(app, channel_id, 3))
+            await asyncio.sleep(0.1)
+            await app._request("GET", f"/guilds/{guild_id}")
+            guild_elapsed = time.perf_counter() - started
+            await messages
+            return guild_elapsed, time.perf_counter() - started, app.ratelimiter.PROBE_TIMEOUT
+
+    guild_elapsed, elapsed, probe_timeout = asyncio.run(main())
+    assert guild_elapsed >= 0.38
+    assert elapsed < probe_timeout / 2
+    assert simulator.rate_limited == 1
@@ -0,0 +1,120 @@
+"""Retries, Retry-After handling and DiscordAPIError surfacing in _send_request."""
+
+import asyncio
+import time
+
+import pytest
+from simulator import DiscordSimulator
+
+import inference
+from conftest import MESSAGES
+
+GUILD = "GET /guilds/{guild_id}"
+FAST_RETRIES = {"RETRY_BASE_DELAY": 0.01, "RETRY_MAX_DELAY": 0.05}
+
+
+def run(running_app, simulator, call, **attributes):
+    async def main():
+        async with running_app(simulator, **{**FAST_RETRIES, **attributes}) as app:
+            records = []
+            app.metrics.hooks.append(records.append)
+            try:
+                return await call(app), records
+            except inference.DiscordAPIError as e:
+                return e, records
+
+    return asyncio.run(main())
+
+
+def test_idempotent_request_is_retried_on_5xx(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    simulator.script(GUILD, 503, {"message": "Service Unavailable"}, count=2)
+
+    result, records = run(
+        running_app, simulator, lambda app: app._request("GET", f"/guilds/{guild_id}")
+    )
+    assert result["id"] == guild_id
+    assert simulator.route_counts[GUILD] == 3
+    assert records[0].retries == 2
+    assert records[0].status == 200
+
+
+def test_5xx_retries_stop_at_max_retries(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    simulator.script(GUILD, 500, {"message": "Internal Server Error", "code": 0}, count=20)
+
+    error, records = run(
+        running_app, simulator, lambda app: app._request("GET", f"/guilds/{guild_id}")
+    )
+    assert isinstance(error, inference.DiscordAPIError)
+    assert error.status == 500
+    assert simulator.route_counts[GUILD] == inference.App.MAX_RETRIES + 1
+    assert records[0].error == "DiscordAPIError"
+
+
+def test_post_is_not_retried_on_5xx(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=1, roles=0, members=0)
+    channel_id = next(c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id)
+    simulator.script(MESSAGES, 502, {"message": "Bad Gateway"})
+
+    error, _ = run(
+        running_app, simulator,
+        lambda app: app._request("POST", f"/channels/{channel_id}/messages", {"content": "hi"}),
+    )
+    assert isinstance(error, inference.DiscordAPIError)
+    assert error.status == 502
+    assert simulator.route_counts[MESSAGES] == 1
+    assert not simulator.messages[channel_id]
+
+
+def test_retry_after_header_is_honoured(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    # No retry_after in the body: the header alone sets the wait
+    simulator.script(GUILD, 429, {"message": "You are being rate limited."},
+                     {"Retry-After": "0.3", "X-RateLimit-Scope": "shared"})
+
+    async def call(app):
+        started = time.perf_counter()
+        await app._request("GET", f"/guilds/{guild_id}")
+        return time.perf_counter() - started
+
+    elapsed, records = run(running_app, simulator, call)
+    assert elapsed >= 0.28
+    assert simulator.route_counts[GUILD] == 2
+    assert records[0].retries == 1
+
+
+def test_429_beyond_retry_budget_raises_with_retry_after(running_app):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    simulator.script_rate_limit(GUILD, 0.2, scope="shared", count=5)
+
+    error, _ = run(
+        running_app, simulator, lambda app: app._request("GET", f"/guilds/{guild_id}"),
+        MAX_RATE_LIMIT_RETRIES=1,
+    )
+    assert isinstance(error, inference.DiscordAPIError)
+    assert error.status == 429
+    assert error.retry_after == pytest.approx(0.2)
+    assert simulator.route_counts[GUILD] == 2
+
+
+@pytest.mark.parametrize("status, code", [(403, 50013), (404, 10004), (400, 50035)])
+def test_4xx_is_raised_without_retry(running_app, status, code):
+    simulator = DiscordSimulator()
+    guild_id = simulator.add_guild(channels=0, roles=0, members=0)
+    simulator.script(GUILD, status, {"message": "Nope", "code": code, "errors": {"field": "bad"}})
+
+    error, records = run(
+        running_app, simulator, lambda app: app._request("GET", f"/guilds/{guild_id}")
+    )
+    assert isinstance(error, inference.DiscordAPIError)
+    assert (error.status, error.code, error.message) == (status, code, "Nope")
+    assert error.route == GUILD
+    assert error.errors == {"field": "bad"}
+    assert simulator.route_counts[GUILD] == 1
+    assert records[0].retries == 0
@@ -0,0 +1,84 @@
+"""Concurrent identical GETs sharing one request (_single_flight)."""
+
+import asyncio
+
+import pytest
+from simulator import DiscordSimulator
+
+CHANNEL = "GET /channels/{channel_id}"
+
+
+def first_channel(simulator: DiscordSimulator) -> str:
+    guild_id = simulator.add_guild(channels=1, roles=0, members=0)
+    return next(c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id)
+
+
+def test_identical_gets_share_one_request(running_app):
+    simulator = DiscordSimulator(latency=0.05)
+    channel_id = first_channel(simulator)
+
+    async def main():
+        async with running_app(simulator) as app:
+            results = await asyncio.gather(*(app._request("GET", f"/channels/{channel_id}") for _ in range(10)))
+            return results, app.flights, app.coalesced
+
+    results, flights, coalesced = asyncio.run(main())
+    assert simulator.route_counts[CHANNEL] == 1
+    assert (flights, coalesced) == (1, 9)
+    assert all(result is results[0] for result in results)
+
+
+def test_cancelled_caller_leaves_the_request_and_the_others_running(running_app):
+    simulator = DiscordSimulator(latency=0.1)
+    channel_id = first_channel(simulator)
+
+    async def main():
+        async with running_app(simulator) as app:
+            callers = [asyncio.ensure_future(app._request("GET", f"/channels/{channel_id}")) for _ in range(3)]
+            await asyncio.sleep(0.02)
+            # The caller that started the request goes away
+            callers[0].cancel()
+            results = await asyncio.gather(*callers[1:])
+            return callers[0], results
+
+    cancelled, results = asyncio.run(main())
+    assert cancelled.cancelled()
+    assert [result["id"] for result in results] == [channel_id, channel_id]
+    assert simulator.route_counts[CHANNEL] == 1
+
+
+def test_joiners_wait_at_most_their_own_deadline(running_app):
+    simulator = DiscordSimulator(latency=0.3)
+    channel_id = first_channel(simulator)
+
+    async def main():
+        async with running_app(simulator) as app:
+            first = asyncio.ensure_future(app._request("GET", f"/channels/{channel_id}"))
+            await asyncio.sleep(0.02)
+            with pytest.raises(asyncio.TimeoutError):
+                await app._request("GET", f"/channels/{channel_id}", deadline=0.05)
+            return await first
+
+    assert asyncio.run(main())["id"] == channel_id
+    assert simulator.route_counts[CHANNEL] == 1
+
+
+def test_pagination_does_not_reorder_a_shared_page(running_app):
+    simulator = DiscordSimulator(latency=0.05)
+    channel_id = first_channel(simulator)
+    oldest, *_ = simulator.add_messages(channel_id, 5)
+
+    async def main():
+        async with running_app(simulator) as app:
+            page = app._request("GET", f"/channels/{channel_id}/messages?limit=100&after={oldest}")
+
+            async def walk():
+                return [message["id"] async for message in app.iter_messages(channel_id, after=oldest)]
+
+            return await asyncio.gather(page, walk())
+
+    page, walked = asyncio.run(main())
+    assert simulator.route_counts["GET /channels/{channel_id}/messages"] == 1
+    # Discord's newest-first order for the raw caller, ascending for the iterator
+    assert [message["id"] for message in page] == walked[::-1]
+    assert walked == sorted(walked, key=int)
@@ -0,0 +1,109 @@
+"""WebhookVault and webhook execution."""
+
+import asyncio
+import os
+import sqlite3
+import stat
+
+import pytest
+from simulator import DiscordSimulator
+
+import inference
+from conftest import Metadata
+
+EXECUTE = "POST /webhooks/{webhook_id}/{token}"
+TOKEN = "webhook-token-" + "x" * 50
+
+
+def test_vault_round_trip_is_encrypted_at_rest(tmp_path):
+    path = str(tmp_path / "vault.db")
+    vault = inference.WebhookVault(path, "secret")
+    vault.put("1" * 18, TOKEN, channel_id="2" * 18, name="hook")
+    vault.close()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    with open(path, "rb") as f:
+        assert TOKEN.encode() not in f.read()
+    # A fresh instance has nothing in memory and decrypts from the file
+    assert inference.WebhookVault(path, "secret").get("1" * 18) == TOKEN
+    assert inference.WebhookVault(path, "secret").get("3" * 18) is None
+
+
+@pytest.mark.parametrize("offset", [0, 20, -1])
+def test_vault_rejects_tampered_entries(tmp_path, offset):
+    """A flipped byte in the nonce, ciphertext or tag fails authentication."""
+    path = str(tmp_path / "vault.db")
+    inference.WebhookVault(path, "secret").put("1" * 18, TOKEN)
+    db = sqlite3.connect(path)
+    sealed = bytearray(db.execute("SELECT token FROM webhooks").fetchone()[0])
+    sealed[offset] ^= 0x01
+    db.execute("UPDATE webhooks SET token = ?", (bytes(sealed),))
+    db.commit()
+    with pytest.raises(ValueError, match="failed authentication"):
+        inference.WebhookVault(path, "secret").get("1" * 18)
+
+
+def test_vault_rejects_the_wrong_key(tmp_path):
+    path = str(tmp_path / "vault.db")
+    inference.WebhookVault(path, "secret").put("1" * 18, TOKEN)
+    with pytest.raises(ValueError, match="failed authentication"):
+        inference.WebhookVault(path, "other").get("1" * 18)
+
+
+def webhook_guild(simulator: DiscordSimulator, channels: int = 1) -> list:
+    guild_id = simulator.add_guild(channels=channels, roles=0, members=0)
+    return [c for c in simulator.channels if simulator.channels[c]["guild_id"] == guild_id]
+
+
+async def create_webhooks(app, channel_ids: list) -> list:
+    webhooks = [
+        await app.create_webhook(inference.CreateWebhookInput(channel_id=c, name=f"hook-{c}"), Metadata())
+        for c in channel_ids
+    ]
+    return [webhook.webhook_id for webhook in webhooks]
+
+
+def test_execution_sends_no_bot_token_and_honours_wait(running_app):
+    simulator = DiscordSimulator()
+    (channel_id,) = webhook_guild(simulator)
+
+    async def main():
+        async with running_app(simulator) as app:
+            (webhook_id,) = await create_webhooks(app, [channel_id])
+            waited = await app.execute_webhook(
+                inference.ExecuteWebhookInput(webhook_id=webhook_id, content="one"), Metadata()
+            )
+            queued = await app.execute_webhook(
+                inference.ExecuteWebhookInput(webhook_id=webhook_id, content="two", wait=False), Metadata()
+            )
+            return webhook_id, waited, queued
+
+    webhook_id, waited, queued = asyncio.run(main())
+    messages = list(simulator.messages[channel_id].values())
+    assert [m["content"] for m in messages] == ["one", "two"]
+    assert waited.message_id == messages[0]["id"]
+    assert queued.sent and queued.message_id is None
+    # Webhook calls carry no Authorization header at all
+    assert simulator.token_routes[""] == {(EXECUTE, webhook_id): 2}
+    assert not any(route == EXECUTE for route, _ in simulator.token_routes["Bot test-token"])
+
+
+def test_execute_webhooks_fans_out_in_order_per_webhook(running_app):
+    simulator = DiscordSimulator()
+    channel_ids = webhook_guild(simulator, channels=3)
+    contents = [f"message {i}" for i in range(8)]
+
+    async def main():
+        async with running_app(simulator) as app:
+            webhook_ids = await create_webhooks(app, channel_ids)
+            result = await app.execute_webhooks(
+                inference.ExecuteWebhooksInput(webhook_ids=webhook_ids, contents=contents, wait=True), Metadata()
+            )
+            return webhook_ids, result
+
+    webhook_ids, result = asyncio.run(main())
+    assert (result.sent, result.failed) == (8, 0)
+    for lane, channel_id in enumerate(channel_ids):
+        messages = list(simulator.messages[channel_id].values())
+        assert [m["content"] for m in messages] == contents[lane::3]
+        assert [m["id"] for m in messages] == result.message_ids[lane::3]
+        assert {m["webhook_id"] for m in messages} == {webhook_ids[lane]}